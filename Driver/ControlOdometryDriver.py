@@ -23,6 +23,13 @@ from threading import Thread
 from Driver import DriverSerial as DsD
 from Driver import DriverMonitor as DM
 from Driver import Odometry as odo
+from Driver import DriverTransport as DT
+from Driver import Setpoint
+from Driver import PoseRing
+from Driver import TrajectoryStore
+from Driver import PoseFusion
+from Utils import RateScheduler
+from Utils import BinaryRecorder
 import matplotlib.pyplot as plt
 import serial
 import math
@@ -46,7 +53,9 @@ resource = os.path.abspath(
 
 class ControlDriver(Thread):
 
-    def __init__(self, radius_wheel=85.00, record_mode=False, radius=0, left_right=1):
+    def __init__(self, radius_wheel=85.00, record_mode=False, radius=0, left_right=1, poll_rate=None,
+                 ports=None, keep_alive=1.0, pose_history=1024, fusion=None,
+                 trajectory_size=10000, pipeline_depth=0, record_writer=None, control_rate=None):
         """
         :param radius_wheel:
         :param record_mode:
@@ -55,41 +64,67 @@ class ControlDriver(Thread):
             如果发现 左右轮数据反了
             将 0 改为 1
             或 1 改为 0
+        :param poll_rate: max encoder polling rate (Hz), None to poll as fast as the serial link allows,
+                          see self.scheduler.get_counters() for overruns and jitter
+        :param ports: (ser_l, ser_r) serial-like objects to use instead of the USB drivers,
+                      e.g. the SimulatedSerial pair from Driver/SimulatedServoDriver.py
+        :param keep_alive: resend the unchanged command after this many seconds
+        :param pose_history: poses kept in self.pose, read the pose there instead of the serial port
+        :param fusion: optional Driver/PoseFusion.YawFusion fed with every encoder poll,
+                       also fed by IMU.add_listener(fusion.imu_listener);
+                       the fused pose is in self.fused_pose and, in record_mode, in Fusion.rec
+        :param trajectory_size: points kept in self.trajectory
+        :param pipeline_depth: monitor requests kept in flight on each link (see DriverTransport.PipelinedMonitor),
+                               0 to wait for every reply before the next request
+        :param record_writer: Utils/AsyncWriter.AsyncWriter that writes Driver.rec, None to write in this thread
+        :param control_rate: old name of poll_rate, used when poll_rate is None
+                             (the old default of 20Hz is no longer applied, pass it to keep the old rate)
         """
         # radius_wheel = 52.55
         Thread.__init__(self)
         self.radius_wheel = radius_wheel
         self.record_mode = record_mode
-        self.radius = radius
-        self.speed = 0
-        self.omega = 0.0
+        self.record_writer = record_writer
+        # speed, omega, radius 都写在 setpoint 里，控制循环只在改变时发送指令
+        self.setpoint = Setpoint.Setpoint(speed=0, omega=0.0, radius=radius)
+        self.keep_alive = keep_alive
+        self.commands_sent = 0
+        self.commands_skipped = 0
+        """commands without a 2-byte ack from both wheels, resent on the next cycle"""
+        self.command_errors = 0
+        self._command = (-1, None, None)  # (setpoint version, left frame, right frame)
         self.position = [0.0, 0.0, 0.0, 0.0, 0.0]
         self.count = 0
-        driver = DsD.DigitalServoDriver(left_right=left_right)
+        if poll_rate is None:
+            poll_rate = control_rate
+        self.scheduler = RateScheduler.RateScheduler(poll_rate) if poll_rate else None
+        # 里程计位姿，最新值 self.pose.latest() 与历史 self.pose.last(n)
+        self.pose = PoseRing.PoseRing(pose_history)
+        self.polls = 0
+        self.fusion = fusion
+        """latest YawFusion pose (timestamp, X, Y, THETA) at the last encoder poll, None without fusion"""
+        self.fused_pose = None
         self.left_right = left_right
-        baud_rate = driver.baud_rate
-        self.ser_l = serial.Serial(driver.left, baud_rate, timeout=0.05)
-        self.ser_r = serial.Serial(driver.right, baud_rate, timeout=0.05)
+        self.running = True
+        self.monitor_errors = 0
+        self._error_print_time = 0.0
+        if ports is None:
+            driver = DsD.DigitalServoDriver(left_right=left_right)
+            baud_rate = driver.baud_rate
+            self.ser_l = serial.Serial(driver.left, baud_rate, timeout=0.05)
+            self.ser_r = serial.Serial(driver.right, baud_rate, timeout=0.05)
+        else:
+            self.ser_l, self.ser_r = ports
+        # 左右轮串口同时收发，往返时间见 self.transport.get_timings()
+        self.transport = DT.DualWheelTransport(self.ser_l, self.ser_r)
         self.monitor_l = DM.DriverMonitor()
         self.monitor_r = DM.DriverMonitor()
-        self.plot_x = [0.0]
-        self.plot_y = [0.0]
+        # 每隔 0.1m 保存一个轨迹点，满了覆盖最旧的点
+        self.trajectory = TrajectoryStore.TrajectoryStore(size=trajectory_size, min_distance=0.1)
+        self.trajectory.append(time.time(), 0.0, 0.0)
 
         # 初始化时读取一次驱动器监控信息，记录初始时encoder位置
-        # 读取左轮监控信息
-        self.ser_l.write(bytes([0x80, 0x00, 0x80]))
-        read_byte_l = self.ser_l.read(5)
-        if read_byte_l[4] == 0x80:
-            read_byte_l += self.ser_l.read(31)
-        else:
-            read_byte_l += self.ser_l.read(27)
-        # 读取右轮监控信息
-        self.ser_r.write(bytes([0x80, 0x00, 0x80]))
-        read_byte_r = self.ser_r.read(5)
-        if read_byte_r[4] == 0x80:
-            read_byte_r += self.ser_r.read(31)
-        else:
-            read_byte_r += self.ser_r.read(27)
+        read_byte_l, read_byte_r = self.transport.monitor()
 
         # 初始化Odometry
         self.motorStatus_l = self.monitor_l.processData(read_byte_l)
@@ -102,177 +137,207 @@ class ControlDriver(Thread):
         print('init: ', Odo_l_init, Odo_r_init)
         print('-------------------------------------------------------------------------------------------------------')
         self.odo = odo.Odometry(X=0.0, Y=0.0, THETA=0.0, Odo_l=Odo_l_init, Odo_r=Odo_r_init)
+        if pipeline_depth:
+            self.transport.enable_pipeline(pipeline_depth)
         # time.sleep(2)
 
+    @property
+    def speed(self):
+        return self.setpoint.speed
+
+    @speed.setter
+    def speed(self, value):
+        self.setpoint.set(speed=value)
+
+    @property
+    def omega(self):
+        return self.setpoint.omega
+
+    @omega.setter
+    def omega(self, value):
+        self.setpoint.set(omega=value)
+
+    @property
+    def radius(self):
+        return self.setpoint.radius
+
+    @radius.setter
+    def radius(self, value):
+        self.setpoint.set(radius=value)
+
+    @property
+    def plot_x(self):
+        return self.trajectory.plot_x
+
+    @property
+    def plot_y(self):
+        return self.trajectory.plot_y
+
+    def set_setpoint(self, speed=None, omega=None, radius=None):
+        """同时修改 speed, omega, radius，控制循环不会读到只改了一半的值"""
+        return self.setpoint.set(speed, omega, radius)
+
     def get_rpm_byte(self, rpm):
-        rpm_byte = [0x06, 0x00, 0x88, 0x8e]
-        rpm_hex = int(rpm / 6000 * 16384)
-        if rpm_hex >= 0:
-            rpm = [(rpm_hex & 0xFF00) >> 8, (rpm_hex & 0x00FF)]
-        else:
-            temp = 0xFFFF
-            rpm_hex = temp + rpm_hex
-            rpm = [(rpm_hex & 0xFF00) >> 8, (rpm_hex & 0x00FF)]
-        rpm_byte[1] = rpm[0]
-        rpm_byte[2] = rpm[1]
-        rpm_byte.pop(3)
-        last = 0
-        for item in rpm_byte:
-            last = last + item
-        if last > 256:
-            last = last & 0xFF
-        rpm_byte.append(last)
-        return rpm_byte
+        return list(DT.rpm_frame(rpm))
 
     def get_speed_rpm(self, w):
         rpm = w / (2 * math.pi * self.radius_wheel / 1000) * 60
         # print(int(rpm))
         return int(rpm)
 
-    def get_rpm_Omega(self):
+    def get_rpm_Omega(self, omega=None, radius=None):
         """
         r * w = v = l (vr + vl)
                     -----------
                     2 (vr - vl)
         :return:
         """
-        if self.omega > 0:
-            vl = (self.radius + (56 / 2)) / 100 * self.omega
-            vr = (self.radius - (56 / 2)) / 100 * self.omega
+        omega = self.omega if omega is None else omega
+        radius = self.radius if radius is None else radius
+        if omega > 0:
+            vl = (radius + (56 / 2)) / 100 * omega
+            vr = (radius - (56 / 2)) / 100 * omega
         else:
-            vl = -(self.radius - (56 / 2)) / 100 * self.omega
-            vr = -(self.radius + (56 / 2)) / 100 * self.omega
+            vl = -(radius - (56 / 2)) / 100 * omega
+            vr = -(radius + (56 / 2)) / 100 * omega
         # print(vl,vr)
         return vl, vr
 
+    def get_command(self):
+        """
+        当前设定值对应的左右轮转速指令，同一个 setpoint version 只计算一次
+        :return: (version, left frame, right frame)
+        """
+        version, speed, omega, radius = self.setpoint.get()
+        if version != self._command[0]:
+            vl, vr = self.get_rpm_Omega(omega, radius)
+            # 这里是个bug没修复，需要确保 self.speed 和 self.omega 只有一个有值（另一个需要为0）
+            left = DT.rpm_frame(self.get_speed_rpm(vl) + self.get_speed_rpm(speed))
+            right = DT.rpm_frame(-(self.get_speed_rpm(vr) + self.get_speed_rpm(speed)))
+            self._command = (version, left, right)
+        return self._command
+
     def control_part(self):
         print("\n===================================== Start control part! =====================================")
-        start = [0x00, 0x00, 0x01, 0x01]
-        pc_mode = [0x02, 0x00, 0xc4, 0xc6]
-        end = [0x00, 0x00, 0x00, 0x00]
-        self.ser_l.write(bytes(start))
-        self.ser_l.read(2)
-        self.ser_r.write(bytes(start))
-        self.ser_r.read(2)
-        self.ser_l.write(bytes(pc_mode))
-        self.ser_l.read(2)
-        self.ser_r.write(bytes(pc_mode))
-        self.ser_r.read(2)
+        self.transport.command(DT.START, DT.START)
+        self.transport.command(DT.PC_MODE, DT.PC_MODE)
 
         # 如果 record_mode 是 True，则停掉电机，只记录数据
+        recorder = None
+        fusion_recorder = None
         if self.record_mode:
             self.stopMotor()
-            Odo_data_path = resource + os.path.sep + "Driver.txt"
-            file_odo = open(Odo_data_path, "w")
-
-        while True:
-            # 读取驱动器监控信息
-            vl, vr = self.get_rpm_Omega()
-            # print("Omega: %f %f" %( vl, vr))
-            # print("Speed: %f " % self.speed)
+            Odo_data_path = resource + os.path.sep + "Driver.rec"
+            recorder = BinaryRecorder.BinaryRecorder(Odo_data_path, [(name, "<f8") for name in PoseRing.POSE_FIELDS],
+                                                     name="Driver", writer=self.record_writer)
+            if self.fusion is not None:
+                # 融合后的位姿与 Driver.rec 同一时间戳，可以直接与里程计比较
+                fusion_data_path = resource + os.path.sep + "Fusion.rec"
+                fusion_recorder = BinaryRecorder.BinaryRecorder(fusion_data_path,
+                                                                [(name, "<f8") for name in PoseFusion.FUSION_FIELDS],
+                                                                name="Fusion", writer=self.record_writer)
+        try:
+            self.odometry_loop(recorder, fusion_recorder)
+        finally:
+            # 结束 transport 的收发线程，之后的 stopMotor() 在调用者的线程中收发
+            self.transport.close()
+            if recorder is not None:
+                recorder.close()
+            if fusion_recorder is not None:
+                fusion_recorder.close()
+
+    def odometry_loop(self, recorder=None, fusion_recorder=None):
+        """
+        串口只由这个循环访问：不停读取监控信息更新里程计，发布到 self.pose，
+        设定值改变（或 keep-alive 超时）时在两次读取之间插入一次转速指令，
+        所以指令最多等一次读取，读取也不会被指令占满
+        """
+        sent_version = -1
+        sent_time = 0.0
+        if self.scheduler is not None:
+            self.scheduler.start()
+        while self.running:
+            # 设定值改变或 keep-alive 超时才发送转速指令，其余周期只读取监控信息
+            version, left, right = self.get_command()
+            now = time.monotonic()
+            if version != sent_version or now - sent_time >= self.keep_alive:
+                ack_l, ack_r = self.transport.command(left, right)
+                self.commands_sent += 1
+                if len(ack_l) == 2 and len(ack_r) == 2:
+                    sent_version = version
+                    sent_time = now
+                else:
+                    # 应答丢失或不完整，下一次循环重新发送
+                    self.command_errors += 1
+            else:
+                self.commands_skipped += 1
+            self.poll_odometry(recorder, fusion_recorder)
+            self.transport.reset_input_buffer()
+            if self.scheduler is not None:
+                # 限制读取频率，扣除串口收发所用的时间
+                self.scheduler.wait()
+
+    def poll_odometry(self, recorder=None, fusion_recorder=None):
+        """
+        读取一次左右轮监控信息，更新并发布位姿
+        有 fusion 时同时更新融合的位姿，self.fused_pose 为 (timestamp, X, Y, THETA)
+        """
+        try:
+            if self.transport.pipeline is not None:
+                # 回复对应的是之前发出的请求，时间取请求发出的时间
+                read_byte_l, read_byte_r, sample_time = self.transport.pipeline.poll()
+            else:
+                # 左右轮同时读取监控信息
+                read_byte_l, read_byte_r = self.transport.monitor()
+                sample_time = time.time()
 
-            # 这里是个bug没修复，需要确保 self.speed 和 self.omega 只有一个有值（另一个需要为0）
             if self.left_right == 1:
-                left = self.get_rpm_byte(self.get_speed_rpm(vl) + self.get_speed_rpm(self.speed))
-                right = self.get_rpm_byte(-(self.get_speed_rpm(vr) + self.get_speed_rpm(self.speed)))
+                self.motorStatus_l = self.monitor_l.processData(read_byte_r)
+                self.motorStatus_r = self.monitor_r.processData(read_byte_l)
             else:
-                # print((self.get_speed_rpm(vl) + self.get_speed_rpm(self.speed)))
-                left = self.get_rpm_byte(self.get_speed_rpm(vl) + self.get_speed_rpm(self.speed))
-                right = self.get_rpm_byte(-(self.get_speed_rpm(vr) + self.get_speed_rpm(self.speed)))
-            # print(left, right)
-            self.ser_l.write(bytes(left))
-            self.ser_l.flush()
-            self.ser_l.read(2)
-            self.ser_r.write(bytes(right))
-            self.ser_r.flush()
-            self.ser_r.read(2)
-            time.sleep(0.2)
-            try:
-                watch = [0x80, 0x00, 0x80]
-                # 左轮
-                self.ser_l.write(bytes(watch))
-                self.ser_l.flush()
-                read_byte_l = self.ser_l.read(5)
-                if read_byte_l[4] == 0x80:
-                    read_byte_l += self.ser_l.read(31)
-                else:
-                    read_byte_l += self.ser_l.read(27)
-
-                # 右轮
-                self.ser_r.write(bytes(watch))
-                self.ser_r.flush()
-                read_byte_r = self.ser_r.read(5)
-                if read_byte_r[4] == 0x80:
-                    read_byte_r += self.ser_r.read(31)
-                else:
-                    read_byte_r += self.ser_r.read(27)
-
-                if self.left_right == 1:
-                    self.motorStatus_l = self.monitor_l.processData(read_byte_r)
-                    self.motorStatus_r = self.monitor_r.processData(read_byte_l)
-                else:
-                    self.motorStatus_l = self.monitor_l.processData(read_byte_l)
-                    self.motorStatus_r = self.monitor_r.processData(read_byte_r)
-
-                self.odo.Odo_l = self.motorStatus_l['FeedbackPosition']
-                self.odo.Odo_r = self.motorStatus_r['FeedbackPosition']
-
-                # print('LEFT monitor: ', self.motorStatus_l)
-                # print('RIGHT monitor:', self.motorStatus_r)
-
-                # 更新位置
-                self.position = self.odo.updatePose(-self.odo.Odo_l, self.odo.Odo_r)
-                # print('Position:  X=', self.position[0], 'm;  Y=', self.position[1], 'm; THETA=', self.position[2] / math.pi * 180, '°;')
-
-                if math.sqrt((self.position[0] - self.plot_x[-1]) ** 2 + (self.position[1] - self.plot_y[-1]) ** 2) > 0.1:
-                    self.plot_x.append(self.position[0])
-                    self.plot_y.append(self.position[1])
-
-                # 若有故障
-                if self.motorStatus_l["Malfunction"] or self.motorStatus_r["Malfunction"]:
-                    # print('Left motor malfunction:  ' + self.motorStatus_l["Malfunction"])
-                    # print('Right motor malfunction: ' + self.motorStatus_r["Malfunction"])
-                    self.flag_end = 1
-
-
-                # print("\rdx:%.4f, dy:%.4f, X:%.4f, Y:%.4f"%
-                #       (self.position[5],self.position[6],self.position[0],self.position[1]), end='')
-                combine_data = list([time.time()]) + list(self.position)
-                # print(combine_data)
-                if self.record_mode:
-                    file_odo.write(str(combine_data) + "\n")
-                    file_odo.flush()
-            except IndexError as i:
-                print(i)
-
-            self.ser_l.reset_input_buffer()
-            self.ser_r.reset_input_buffer()
-        pass
+                self.motorStatus_l = self.monitor_l.processData(read_byte_l)
+                self.motorStatus_r = self.monitor_r.processData(read_byte_r)
+        except IndexError as i:
+            # 回复不完整（超时或丢包）
+            self.monitor_errors += 1
+            # 持续读取时每次失败都打印会占满输出，最多每秒打印一次
+            now = time.monotonic()
+            if now - self._error_print_time >= 1.0:
+                self._error_print_time = now
+                print("monitor error: %s (%d so far)" % (i, self.monitor_errors))
+            return
+
+        self.odo.Odo_l = self.motorStatus_l['FeedbackPosition']
+        self.odo.Odo_r = self.motorStatus_r['FeedbackPosition']
+
+        # 更新位置
+        self.position = self.odo.updatePose(-self.odo.Odo_l, self.odo.Odo_r, timestamp=sample_time)
+        self.pose.publish(sample_time, self.position)
+        if self.fusion is not None:
+            self.fusion.update_odometry(sample_time, self.odo.d_l, self.odo.d_r, self.odo.d_theta)
+            self.fused_pose = self.fusion.latest_pose
+            if fusion_recorder is not None:
+                fusion_recorder.append(*self.fused_pose)
+        self.polls += 1
+
+        self.trajectory.append(sample_time, self.position[0], self.position[1])
+
+        # 若有故障
+        if self.motorStatus_l["Malfunction"] or self.motorStatus_r["Malfunction"]:
+            self.flag_end = 1
+
+        if recorder is not None:
+            recorder.append(sample_time, *self.position)
 
     def stopMotor(self):    #关闭电机，同时关闭刹车
-        end = [0x00, 0x00, 0x00, 0x00]
-        self.ser_l.write(bytes(end))
-        self.ser_l.read(2)
-        self.ser_r.write(bytes(end))
-        self.ser_r.read(2)
+        self.transport.command(DT.END, DT.END)
 
         # 读取一帧驱动器监控信息
-        watch = [0x80, 0x00, 0x80]
-        # 左轮
-        self.ser_l.write(bytes(watch))
-        read_byte_l = self.ser_l.read(5)
-        if read_byte_l[4] == 0x80:
-            read_byte_l += self.ser_l.read(31)
-        else:
-            read_byte_l += self.ser_l.read(27)
+        read_byte_l, read_byte_r = self.transport.monitor()
 
-        # 右轮
-        self.ser_r.write(bytes(watch))
-        read_byte_r = self.ser_r.read(5)
-        if read_byte_r[4] == 0x80:
-            read_byte_r += self.ser_r.read(31)
-        else:
-            read_byte_r += self.ser_r.read(27)
+    def stop(self):
+        """结束控制循环，不会停电机，需要时先调用 stopMotor"""
+        self.running = False
 
     def run(self):
         self.control_part()
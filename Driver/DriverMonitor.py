@@ -10,84 +10,132 @@
 ------------
 发送监控指令[0x80, 0x00, 0x80]后，将电机驱动器返回的bytes型监控信息
 (包含电机状态、故障信息、母线电压、输出电流、转速、位置给定和位置反馈）
-处理并记录在一个dictionary中返回
+处理并记录在一个 MonitorStatus 中返回（可以像 dictionary 一样访问）
+decode_batch 可一次解码大量记录下来的回复
 
 """
+import struct
+import numpy as np
+
+"""
+回复的最后28个字节为7组 [指令, 高字节, 低字节, 校验]：
+母线电压、输出电流、转速、位置给定高16位、位置给定低16位、位置反馈高16位、位置反馈低16位
+36个字节的回复在第4~7个字节带有故障信息 [0x80, 0x00, 故障码, 校验]
+"""
+TAIL_SIZE = 28
+_TAIL = struct.Struct('>xHx' 'xHx' 'xhx' 'xhx' 'xHx' 'xhx' 'xHx')
+_TAIL_DTYPE = np.dtype([('c0', 'u1'), ('voltage', '>u2'), ('k0', 'u1'),
+                        ('c1', 'u1'), ('current', '>u2'), ('k1', 'u1'),
+                        ('c2', 'u1'), ('rpm', '>i2'), ('k2', 'u1'),
+                        ('c3', 'u1'), ('given_h', '>i2'), ('k3', 'u1'),
+                        ('c4', 'u1'), ('given_l', '>u2'), ('k4', 'u1'),
+                        ('c5', 'u1'), ('feedback_h', '>i2'), ('k5', 'u1'),
+                        ('c6', 'u1'), ('feedback_l', '>u2'), ('k6', 'u1')])
+MALFUNCTION = {
+    0x02: 'Over-current!',
+    0x04: 'Over-voltage!',
+    0x08: 'Encoder malfunction!',
+    0x10: 'Over-heat!',
+    0x20: 'Undervoltage!',
+    0x40: 'Overload!',
+}
+"""decode_batch 的输出格式"""
+MONITOR_DTYPE = np.dtype([('ONorOFF', '?'), ('MalfunctionCode', 'u1'), ('InputVoltage', 'i4'),
+                          ('OutputCurrent', 'f8'), ('RPM', 'f8'),
+                          ('GivenPosition', 'i4'), ('FeedbackPosition', 'i4')])
+
+
+class MonitorStatus(object):
+    """一个驱动器的监控信息，可以像原来的 dictionary 一样用 status["FeedbackPosition"] 访问"""
+    __slots__ = ("ONorOFF", "Malfunction", "InputVoltage", "OutputCurrent", "RPM",
+                 "GivenPosition", "FeedbackPosition")
+
+    def __init__(self):
+        self.ONorOFF = bool()  # 'ON'-True, 'OFF'-False
+        self.Malfunction = ''
+        self.InputVoltage = 0
+        self.OutputCurrent = 0.0
+        self.RPM = 0.0
+        self.GivenPosition = 0
+        self.FeedbackPosition = 0
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def keys(self):
+        return self.__slots__
+
+    def as_dict(self) -> dict:
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def __repr__(self):
+        return repr(self.as_dict())
+
+
+def decode_batch(packets) -> np.ndarray:
+    """
+    一次解码大量记录下来的监控回复，用于离线分析驱动器日志
+    :param packets: list of 32/36 bytes replies, or an (N, 32) / (N, 36) uint8 array
+    :return: structured array with MONITOR_DTYPE
+    """
+    if isinstance(packets, np.ndarray):
+        raw = np.ascontiguousarray(packets, dtype=np.uint8)
+        tail = raw[:, -TAIL_SIZE:]
+        on_off = raw[:, 2]
+        malfunction = raw[:, 6] if raw.shape[1] > 32 else np.zeros(raw.shape[0], np.uint8)
+    else:
+        tail = np.frombuffer(b''.join(bytes(p[-TAIL_SIZE:]) for p in packets), dtype=np.uint8)
+        tail = tail.reshape((-1, TAIL_SIZE))
+        on_off = np.fromiter((p[2] for p in packets), np.uint8, count=len(packets))
+        malfunction = np.fromiter((p[6] if len(p) > 32 else 0 for p in packets), np.uint8, count=len(packets))
+    fields = np.ascontiguousarray(tail).view(_TAIL_DTYPE).reshape(-1)
+    result = np.zeros(fields.shape[0], dtype=MONITOR_DTYPE)
+    result['ONorOFF'] = on_off != 0
+    result['MalfunctionCode'] = malfunction
+    result['InputVoltage'] = fields['voltage']
+    result['OutputCurrent'] = fields['current'] / 100
+    result['RPM'] = fields['rpm'] / 6000 * 16384
+    result['GivenPosition'] = fields['given_h'].astype(np.int32) * 65536 + fields['given_l']
+    result['FeedbackPosition'] = fields['feedback_h'].astype(np.int32) * 65536 + fields['feedback_l']
+    return result
 
 
 class DriverMonitor:
 
     def __init__(self):
         self.receivedByte = bytes()
-        self.monitorData = {
-            "ONorOFF": bool(),  # 'ON'-True, 'OFF'-False
-            "Malfunction": '',
-            "InputVoltage": 0,
-            "OutputCurrent": 0.0,
-            "RPM": 0.0,
-            "GivenPosition": 0,
-            "FeedbackPosition": 0
-        }
+        """每次解码都写入同一个 MonitorStatus"""
+        self.monitorData = MonitorStatus()
 
     def processData(self, receivedBytes):
-
         self.receivedByte = receivedBytes
-        data = list(self.receivedByte)
+        status = self.monitorData
+        if len(receivedBytes) < 32:
+            # 回复不完整，与原来逐字节取值时一样抛出 IndexError
+            raise IndexError("monitor reply is too short: %d" % len(receivedBytes))
 
         # 电机状态
-        self.monitorData["ONorOFF"] = bool(data[2])
+        status.ONorOFF = bool(receivedBytes[2])
 
         # 故障信息
-        self.monitorData["Malfunction"] = ''
-        if len(data) > 32:
-            malfunction = data[5:8]
-            if malfunction == [0x80, 0x00, 0x02, 0x82]:
-                self.monitorData["Malfunction"] = 'Over-current!'
-            elif malfunction == [0x80, 0x00, 0x04, 0x84]:
-                self.monitorData["Malfunction"] = 'Over-voltage!'
-            elif malfunction == [0x80, 0x00, 0x08, 0x88]:
-                self.monitorData["Malfunction"] = 'Encoder malfunction!'
-            elif malfunction == [0x80, 0x00, 0x10, 0x90]:
-                self.monitorData["Malfunction"] = 'Over-heat!'
-            elif malfunction == [0x80, 0x00, 0x20, 0x90]:
-                self.monitorData["Malfunction"] = 'Undervoltage!'
-            elif malfunction == [0x80, 0x00, 0x40, 0xC0]:
-                self.monitorData["Malfunction"] = 'Overload!'
-            else:
-                self.monitorData["Malfunction"] = None
-
-        # 母线电压
-        inputVoltage = data[-28:-24]
-        self.monitorData["InputVoltage"] = (inputVoltage[1] << 8) + inputVoltage[2]
-
-        # 输出电流
-        outputCurrent = data[-24:-20]
-        temp = (outputCurrent[1] << 8) + outputCurrent[2]
-        self.monitorData["OutputCurrent"] = temp / 100
-
-        # 转速
-        RPM = data[-20:-16]
-        temp = (RPM[1] << 8) + RPM[2]
-        temp = self.hex2int_8(temp)
-        self.monitorData["RPM"] = temp / 6000 * 16384
-
-        # 位置给定
-        GivenPosH = data[-16:-12]
-        GivenPosL = data[-12:-8]
-        temp_H = (GivenPosH[1] << 8) + GivenPosH[2]
-        temp_L = (GivenPosL[1] << 8) + GivenPosL[2]
-        temp = (temp_H << 16) + temp_L
-        self.monitorData["GivenPosition"] = self.hex2int(temp)
-
-        # 位置反馈
-        FeedbackPosH = data[-8:-4]
-        FeedbackPosL = data[-4:]
-        temp_H = (FeedbackPosH[1] << 8) + FeedbackPosH[2]
-        temp_L = (FeedbackPosL[1] << 8) + FeedbackPosL[2]
-        temp = (temp_H << 16) + temp_L
-        self.monitorData["FeedbackPosition"] = self.hex2int(temp)
-
-        return self.monitorData
+        if len(receivedBytes) > 32:
+            status.Malfunction = MALFUNCTION.get(receivedBytes[6])
+        else:
+            status.Malfunction = ''
+
+        # 母线电压, 输出电流, 转速, 位置给定, 位置反馈
+        voltage, current, rpm, given_h, given_l, feedback_h, feedback_l = \
+            _TAIL.unpack_from(receivedBytes, len(receivedBytes) - TAIL_SIZE)
+        status.InputVoltage = voltage
+        status.OutputCurrent = current / 100
+        status.RPM = rpm / 6000 * 16384
+        status.GivenPosition = (given_h << 16) + given_l
+        status.FeedbackPosition = (feedback_h << 16) + feedback_l
+
+        return status
 
     def getFeedbackPos(self):
         return self.monitorData["FeedbackPosition"]
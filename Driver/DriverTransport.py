@@ -0,0 +1,334 @@
+"""
+@File    :   DriverTransport.py
+
+@Description
+------------
+左右两个伺服驱动器的串口收发
+两个串口各由一个工作线程同时发送、同时等待回复，而不是先左后右，
+减少两轮之间的指令时差和每个周期的时间，并记录每个轮子的往返时间
+
+"""
+import os, sys
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Utils import LatencyHistogram
+
+START = bytes([0x00, 0x00, 0x01, 0x01])
+PC_MODE = bytes([0x02, 0x00, 0xc4, 0xc6])
+END = bytes([0x00, 0x00, 0x00, 0x00])
+WATCH = bytes([0x80, 0x00, 0x80])
+
+
+@functools.lru_cache(maxsize=1024)
+def rpm_frame(rpm: int) -> bytes:
+    """
+    0x06 转速指令 [0x06, 高字节, 低字节, 校验]，转速按 6000rpm = 16384 换算
+    负转速与 ControlDriver.get_rpm_byte 原先的换算相同 (0xFFFF + rpm)
+    """
+    rpm_hex = int(rpm / 6000 * 16384)
+    if rpm_hex < 0:
+        rpm_hex = 0xFFFF + rpm_hex
+    hi = (rpm_hex & 0xFF00) >> 8
+    lo = rpm_hex & 0x00FF
+    return bytes([0x06, hi, lo, (0x06 + hi + lo) & 0xFF])
+
+
+def read_ack(ser) -> bytes:
+    """指令的回复为2个字节"""
+    return ser.read(2)
+
+
+def read_monitor(ser) -> bytes:
+    """监控信息先读5个字节，第5个字节为0x80时带故障信息，共36个字节，否则32个字节"""
+    read_byte = ser.read(5)
+    if read_byte[4] == 0x80:
+        read_byte += ser.read(31)
+    else:
+        read_byte += ser.read(27)
+    return read_byte
+
+
+def monitor_reply_size(head) -> int:
+    """由回复的前5个字节得到监控信息的长度"""
+    return 36 if head[4] == 0x80 else 32
+
+
+def valid_monitor_reply(reply) -> bool:
+    """
+    检查一个完整的监控回复，只检查 DriverMonitor.processData 用到的：
+    长度与第5个字节一致 (32/36)，每组 [指令, 高字节, 低字节, 校验] 的校验正确
+    少了或多了字节的回复（错位）不会通过
+    """
+    size = len(reply)
+    if size < 5 or size != monitor_reply_size(reply):
+        return False
+    for group in range(0, size, 4):
+        cmd, hi, lo, checksum = reply[group:group + 4]
+        if (cmd + hi + lo) & 0xFF != checksum:
+            return False
+    return True
+
+
+class WheelLink(object):
+    """一个驱动器的串口，所有收发都在锁内完成"""
+
+    def __init__(self, ser, name: str = ""):
+        self.ser = ser
+        self.name = name
+        self.lock = threading.Lock()
+        self.round_trip = LatencyHistogram.LatencyHistogram()
+        self.last_round_trip = 0.0
+        self.last_write_time = 0.0
+
+    def transact(self, request: bytes, read_reply=read_ack) -> bytes:
+        with self.lock:
+            start = time.perf_counter()
+            self.last_write_time = start
+            self.ser.write(request)
+            self.ser.flush()
+            try:
+                return read_reply(self.ser)
+            finally:
+                # 超时或回复不完整时也记录，往返时间的尾部才包含超时
+                self.last_round_trip = time.perf_counter() - start
+                self.round_trip.record(self.last_round_trip)
+
+    def reset_input_buffer(self):
+        with self.lock:
+            self.ser.reset_input_buffer()
+
+
+class DualWheelTransport(object):
+
+    def __init__(self, ser_l, ser_r):
+        self.left = WheelLink(ser_l, "left")
+        self.right = WheelLink(ser_r, "right")
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="wheel")
+        """close() 之后两个驱动器在调用者的线程中依次收发，例如控制循环结束后的 stopMotor()"""
+        self.closed = False
+        """transact_both 与 pipeline.poll 互斥，指令发送前先读完流水线中的回复"""
+        self.lock = threading.RLock()
+        self.pipeline = None
+        """time between the left and right request being written"""
+        self.skew = LatencyHistogram.LatencyHistogram()
+        self.cycle = LatencyHistogram.LatencyHistogram()
+
+    def transact_both(self, request_l: bytes, request_r: bytes, read_reply=read_ack):
+        """
+        同时向两个驱动器发送并等待两个回复
+        :return: (reply_l, reply_r), the exception of either side is raised here
+        """
+        with self.lock:
+            if self.pipeline is not None:
+                self.pipeline.drain()
+            if self.closed:
+                return self.left.transact(request_l, read_reply), self.right.transact(request_r, read_reply)
+            start = time.perf_counter()
+            future_l = self.executor.submit(self.left.transact, request_l, read_reply)
+            future_r = self.executor.submit(self.right.transact, request_r, read_reply)
+            wait((future_l, future_r))
+            self.cycle.record(time.perf_counter() - start)
+            self.skew.record(abs(self.left.last_write_time - self.right.last_write_time))
+        return future_l.result(), future_r.result()
+
+    def command(self, request_l: bytes, request_r: bytes):
+        return self.transact_both(request_l, request_r, read_ack)
+
+    def monitor(self):
+        return self.transact_both(WATCH, WATCH, read_monitor)
+
+    def enable_pipeline(self, depth: int = 2, sync_interval: int = 4):
+        """之后用 self.pipeline.poll() 读取监控信息"""
+        with self.lock:
+            self.pipeline = PipelinedMonitor(self, depth, sync_interval)
+        return self.pipeline
+
+    def disable_pipeline(self):
+        with self.lock:
+            if self.pipeline is not None:
+                self.pipeline.drain()
+            self.pipeline = None
+
+    def reset_input_buffer(self):
+        with self.lock:
+            if self.pipeline is not None:
+                # 流水线中还有未读的回复，不能清空
+                return
+            self.left.reset_input_buffer()
+            self.right.reset_input_buffer()
+
+    def get_timings(self) -> dict:
+        timings = {"left": self.left.round_trip.summary(), "right": self.right.round_trip.summary(),
+                   "skew": self.skew.summary(), "cycle": self.cycle.summary()}
+        if self.pipeline is not None:
+            timings["pipeline"] = self.pipeline.get_counters()
+        return timings
+
+    def close(self):
+        """结束两个收发线程"""
+        with self.lock:
+            self.closed = True
+            self.executor.shutdown(wait=False)
+
+
+class PipelinedMonitor(object):
+    """
+    每个驱动器保持 depth 个已发送、未读取的监控请求：
+    读第 n 个回复时，第 n+1 个请求已经在驱动器上处理，串口不会空闲等待
+    左右两个请求都发出后再读回复，回复按到达的字节逐步拼接，前5个字节确定长度 (32/36)
+
+    流水线中不能清空输入缓冲区，所以每个回复都要检查长度和校验 (valid_monitor_reply)，
+    丢了一个字节后之后的回复都会错位，检查不通过时两个串口都重新同步；
+    监控请求都相同，回复只能按顺序对应到请求，整个回复丢失时之后的回复会对应到前一个请求的时间，
+    读回复时无法发现。所以回复按窗口确认：发送 sync_interval 个请求后停止发送，读完所有未读取的回复，
+    所有请求都收到回复时窗口内的回复才交给 poll() 的调用者；有回复丢失时最后一个请求超时，
+    整个窗口的回复都丢弃并重新同步，错配时间的回复不会被使用
+    """
+
+    def __init__(self, transport: DualWheelTransport, depth: int = 2, sync_interval: int = 4):
+        """
+        :param sync_interval: requests per confirmation window, replies are returned up to about
+                              this many polls late, larger windows idle the link less often
+        """
+        self.transport = transport
+        self.links = (transport.left, transport.right)
+        self.depth = depth
+        self.sync_interval = max(sync_interval, 1)
+        self.buffers = (bytearray(), bytearray())
+        """write time (time.time()) of the outstanding requests of each link"""
+        self.outstanding = (deque(), deque())
+        """requests written in the current window"""
+        self.window_requests = 0
+        """(reply_l, reply_r, request_time) read in the current window, not yet confirmed"""
+        self.pending = []
+        """confirmed replies, returned by poll() in order"""
+        self.ready = deque()
+
+        """counters"""
+        self.samples = 0
+        self.timeouts = 0
+        self.misframed = 0  # replies that failed valid_monitor_reply
+        self.resyncs = 0
+        self.syncs = 0  # windows confirmed without a missing reply
+        self.dropped = 0  # replies discarded with a window that had a missing or misframed reply
+        self.requests = 0
+        self.latency = LatencyHistogram.LatencyHistogram()  # request written -> reply returned
+
+    def _fill(self, i: int):
+        """窗口内的请求没有发完时补足 depth 个未回复的请求"""
+        link = self.links[i]
+        requests = self.window_requests
+        while len(self.outstanding[i]) < self.depth and requests < self.sync_interval:
+            self.outstanding[i].append(time.time())
+            link.ser.write(WATCH)
+            self.requests += 1
+            requests += 1
+        link.ser.flush()
+        return requests
+
+    def _read_reply(self, i: int):
+        """
+        读取第 i 个驱动器最早的一个请求的回复，串口超时返回 None
+        :return: reply bytes or None
+        """
+        ser = self.links[i].ser
+        buffer = self.buffers[i]
+        while True:
+            if len(buffer) >= 5:
+                size = monitor_reply_size(buffer)
+                if len(buffer) >= size:
+                    reply = bytes(buffer[:size])
+                    del buffer[:size]
+                    return reply
+            else:
+                size = 5
+            # 至少读到当前回复所需的字节，已经到达的字节一起读进来
+            chunk = ser.read(max(ser.in_waiting, size - len(buffer)))
+            if not chunk:
+                return None
+            buffer += chunk
+
+    def _resync(self):
+        """
+        超时或回复错位后两个串口都清空：等迟到的字节到达后清空输入缓冲区，丢弃窗口内未确认的回复
+        只清一个串口时另一个串口的请求数会不同，之后的左右回复不是同时的
+        """
+        self.resyncs += 1
+        self.dropped += len(self.pending)
+        self.pending = []
+        time.sleep(max(link.ser.timeout or 0.0 for link in self.links))
+        for i in range(2):
+            self.links[i].ser.reset_input_buffer()
+            self.buffers[i].clear()
+            self.outstanding[i].clear()
+        self.window_requests = 0
+
+    def _read_pair(self):
+        """
+        读左右各一个回复放入 pending，窗口的回复都读完时确认整个窗口
+        :raise IndexError: when a reply times out or is misframed, the window is dropped
+        """
+        replies = [self._read_reply(0), self._read_reply(1)]
+        request_time = min(self.outstanding[0].popleft(), self.outstanding[1].popleft())
+        if None in replies:
+            self.timeouts += 1
+            self._resync()
+            raise IndexError("monitor reply timed out")
+        if not (valid_monitor_reply(replies[0]) and valid_monitor_reply(replies[1])):
+            self.misframed += 1
+            self._resync()
+            raise IndexError("monitor reply misframed")
+        self.pending.append((replies[0], replies[1], request_time))
+        if self.window_requests >= self.sync_interval and not self.outstanding[0]:
+            self._confirm()
+
+    def _confirm(self):
+        """窗口的每个请求都收到了回复，回复与请求时间一一对应"""
+        self.syncs += 1
+        self.ready.extend(self.pending)
+        self.pending = []
+        self.window_requests = 0
+
+    def poll(self):
+        """
+        :return: (reply_l, reply_r, request_time), request_time is time.time() when the
+                 older of the two requests was written, i.e. about when the encoders were sampled
+        :raise IndexError: when a reply times out or is misframed, like an incomplete reply of read_monitor
+        """
+        with self.transport.lock:
+            with self.links[0].lock, self.links[1].lock:
+                while not self.ready:
+                    self._fill(0)
+                    self.window_requests = self._fill(1)
+                    self._read_pair()
+                reply_l, reply_r, request_time = self.ready.popleft()
+                self.latency.record(time.time() - request_time)
+                self.samples += 1
+                return reply_l, reply_r, request_time
+
+    def drain(self):
+        """读完窗口内未读取的回复，之后可以正常收发指令；确认的回复仍由 poll() 返回"""
+        with self.links[0].lock, self.links[1].lock:
+            # 不再发送新的请求，窗口在读完时确认
+            self.window_requests = max(self.window_requests, self.sync_interval)
+            while self.outstanding[0]:
+                try:
+                    self._read_pair()
+                except IndexError:
+                    return
+            if self.pending:
+                self._confirm()
+            self.buffers[0].clear()
+            self.buffers[1].clear()
+
+    def get_counters(self) -> dict:
+        return {"samples": self.samples, "requests": self.requests, "timeouts": self.timeouts,
+                "misframed": self.misframed, "resyncs": self.resyncs, "syncs": self.syncs,
+                "dropped": self.dropped, "ready": len(self.ready), "latency": self.latency.summary()}
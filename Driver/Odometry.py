@@ -27,9 +27,15 @@ class Odometry:
 
     # 更新里程计读取到的信息
     # Update Odometry message
-    def updatePose(self, *args):
-        currnt_time = time.time()
+    def updatePose(self, *args, timestamp=None):
+        """
+        :param args: Odo_l, Odo_r[, imu_yaw]
+        :param timestamp: time.time() when the encoders were read, default now
+        """
+        currnt_time = time.time() if timestamp is None else timestamp
         dt = currnt_time - self._previous_time
+        if dt <= 0:
+            dt = 1e-6
         self.Odo_l, self.Odo_r = args[0], args[1]
         if len(args) > 2:
             self.imu_yaw = args[-1]
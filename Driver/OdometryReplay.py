@@ -0,0 +1,162 @@
+"""
+@File    :   OdometryReplay.py
+
+@Description
+------------
+离线的里程计：一次输入整段的时间戳和左右轮 encoder 读数，用 numpy 向量化计算整条轨迹
+每一步与 Odometry.updatePose 的计算相同，包括：
+    dt <= 0 时取 1e-6
+    round(d_l, 3) == round(d_r, 3) 判断直行，round(d_l + d_r, 4) == 0 判断静止/原地转向
+    静止/原地转向时 dx, dy 保留上一步的值（updatePose 中没有重新赋值）
+    THETA 超过 (-pi, pi] 时加减 2pi
+可以换轮子半径、轮距重新计算已经记录的数据
+
+"""
+import ast
+import math
+import os, sys
+import numpy as np
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Utils import BinaryRecorder
+
+WHEEL_RADIUS = 0.085
+WHEEL_BASE = 0.54
+TICKS_PER_REVOLUTION = 4096
+
+
+def _forward_fill(values: np.ndarray, valid: np.ndarray, initial: float = 0.0) -> np.ndarray:
+    """valid 为 False 的位置沿用之前最近一个 valid 的值，之前没有时为 initial"""
+    index = np.where(valid, np.arange(1, len(values) + 1), 0)
+    np.maximum.accumulate(index, out=index)
+    return np.concatenate(([initial], values))[index]
+
+
+def replay(timestamps, odo_l, odo_r, X: float = 0.0, Y: float = 0.0, THETA: float = 0.0,
+           previous_l: int = 0, previous_r: int = 0, start_time: float = None,
+           wheel_radius: float = WHEEL_RADIUS, wheel_base: float = WHEEL_BASE,
+           tick_threshold: int = 0, ticks_per_revolution: int = TICKS_PER_REVOLUTION) -> dict:
+    """
+    :param timestamps: (N,) sample times (s)
+    :param odo_l, odo_r: (N,) encoder positions as passed to updatePose,
+                         ControlDriver passes -FeedbackPosition for the left wheel
+    :param previous_l, previous_r: encoder positions before the first sample,
+                                   Odometry starts from 0 (not from Odo_l / Odo_r)
+    :param start_time: time before the first sample, default timestamps[0] (dt = 1e-6 like a fresh Odometry)
+    :return: dict of (N,) arrays: X, Y, THETA, V, OMEGA, Radius, d_l, d_r, dX, dY, dx, dy
+             the first 9 of updatePose's return value are X, Y, THETA, d_l, d_r, dX, dY, dx, dy
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    odo_l = np.asarray(odo_l, dtype=np.float64)
+    odo_r = np.asarray(odo_r, dtype=np.float64)
+    n = len(timestamps)
+    if start_time is None:
+        start_time = timestamps[0] if n else 0.0
+
+    dt = np.diff(timestamps, prepend=start_time)
+    dt[dt <= 0] = 1e-6
+
+    # 两轮相对于上一时刻的位移
+    tick_l = np.diff(odo_l, prepend=previous_l)
+    tick_r = np.diff(odo_r, prepend=previous_r)
+    d_l = (tick_l / ticks_per_revolution) * 2 * math.pi * wheel_radius
+    d_r = (tick_r / ticks_per_revolution) * 2 * math.pi * wheel_radius
+    d_l[np.abs(tick_l) < tick_threshold] = 0
+    d_r[np.abs(tick_r) < tick_threshold] = 0
+
+    d_theta = (d_r - d_l) / wheel_base
+    OMEGA = d_theta / dt
+
+    # 转弯半径
+    turning = d_theta != 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        nearer = np.minimum(np.abs(d_l / d_theta), np.abs(d_r / d_theta))
+    Radius = np.where(d_l * d_r > 0, nearer + wheel_base / 2, wheel_base / 2 - nearer)
+    Radius[~turning | (d_l + d_r == 0)] = 0
+
+    # walker 坐标系下的位移，分支顺序与 updatePose 相同
+    straight = np.round(d_l, 3) == np.round(d_r, 3)
+    rest = ~straight
+    stationary = rest & (np.round(d_l + d_r, 4) == 0)
+    rest &= ~stationary
+    left_larger = np.abs(d_l) > np.abs(d_r)
+    right_larger = np.abs(d_r) > np.abs(d_l)
+    right_forward = rest & left_larger & (d_l > 0)
+    right_backward = rest & left_larger & (d_l <= 0)
+    left_forward = rest & right_larger & (d_r > 0)
+    left_backward = rest & right_larger & (d_r <= 0)
+
+    abs_theta = np.abs(d_theta)
+    one_minus_cos = Radius * (1 - np.cos(abs_theta))
+    sin_part = Radius * np.sin(abs_theta)
+    turn_speed = np.abs(Radius * OMEGA)
+
+    dx = np.zeros(n)
+    dy = np.zeros(n)
+    V = np.zeros(n)
+    dy[straight] = d_l[straight]
+    V[straight] = dy[straight] / dt[straight]
+    for mask, sign_x, sign_y in ((right_forward, 1, 1), (right_backward, 1, -1),
+                                 (left_forward, -1, 1), (left_backward, -1, -1)):
+        dx[mask] = sign_x * one_minus_cos[mask]
+        dy[mask] = sign_y * sin_part[mask]
+        V[mask] = sign_y * turn_speed[mask]
+
+    # 静止/原地转向（以及没有进入任何分支）时 dx, dy 沿用上一步，V 只在静止时为 0
+    moved = straight | right_forward | right_backward | left_forward | left_backward
+    dx = _forward_fill(dx, moved)
+    dy = _forward_fill(dy, moved)
+    V = _forward_fill(V, moved | stationary)
+
+    # 航向角，每一步都在 (-pi, pi] 内
+    theta_raw = THETA + np.cumsum(d_theta)
+    THETA_all = math.pi - np.mod(math.pi - theta_raw, 2 * math.pi)
+    theta_before = np.concatenate(([THETA], THETA_all[:-1]))
+
+    # 转到绝对坐标系
+    cos_theta = np.cos(theta_before)
+    sin_theta = np.sin(theta_before)
+    dX = dx * cos_theta - dy * sin_theta
+    dY = dx * sin_theta + dy * cos_theta
+
+    return {"timestamp": timestamps, "X": X + np.cumsum(dX), "Y": Y + np.cumsum(dY), "THETA": THETA_all,
+            "V": V, "OMEGA": OMEGA, "Radius": Radius, "d_l": d_l, "d_r": d_r,
+            "dX": dX, "dY": dY, "dx": dx, "dy": dy}
+
+
+def load_driver_record(file_path: str) -> np.ndarray:
+    """
+    读取 ControlDriver record_mode 保存的 Driver.rec（或以前的 Driver.txt）
+    每行为 [sample_time, X, Y, THETA, d_l, d_r, dX, dY, dx, dy]
+    :return: (N, 10) array
+    """
+    if BinaryRecorder.is_binary_record(file_path):
+        header, records = BinaryRecorder.load_record(file_path)
+        return BinaryRecorder.to_rows(records)
+    with open(file_path, "r") as f:
+        rows = [ast.literal_eval(line) for line in f if line.strip()]
+    return np.array(rows, dtype=np.float64)
+
+
+def ticks_from_record(d_l, d_r, wheel_radius: float = WHEEL_RADIUS,
+                      ticks_per_revolution: int = TICKS_PER_REVOLUTION):
+    """
+    Driver.rec / Driver.txt 中没有保存 encoder 读数，由每一步的 d_l, d_r 还原（tick_threshold 为 0 时是准确的）
+    :return: (odo_l, odo_r) encoder positions to pass to replay, starting from previous 0
+    """
+    scale = ticks_per_revolution / (2 * math.pi * wheel_radius)
+    odo_l = np.cumsum(np.round(np.asarray(d_l) * scale))
+    odo_r = np.cumsum(np.round(np.asarray(d_r) * scale))
+    return odo_l, odo_r
+
+
+def replay_record(file_path: str, **kwargs) -> dict:
+    """
+    用 Driver.rec / Driver.txt 的数据重新计算轨迹，kwargs 见 replay，例如 wheel_radius, wheel_base
+    录制时的轮子半径为 WHEEL_RADIUS
+    """
+    record = load_driver_record(file_path)
+    odo_l, odo_r = ticks_from_record(record[:, 4], record[:, 5])
+    return replay(record[:, 0], odo_l, odo_r, **kwargs)
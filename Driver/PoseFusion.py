@@ -0,0 +1,120 @@
+"""
+@File    :   PoseFusion.py
+
+@Description
+------------
+轮式里程计与 IMU 航向的互补滤波
+航向角：每个 IMU 样本用陀螺仪 w[2] 积分，再以时间常数 time_constant 向 IMU 的绝对航向 Angle[2] 修正，
+        IMU 数据超过 imu_timeout 没有更新时，改用里程计的 d_theta
+位置：每次读取 encoder 时按两轮平均位移和融合后的航向累加，两次读取之间（每个 IMU 样本）按最近的速度外推
+坐标与 Odometry 相同：THETA 逆时针为正，前进方向为 (-sin(THETA), cos(THETA))
+
+"""
+import math
+import threading
+
+"""Fusion.rec: timestamp, X, Y, THETA"""
+FUSION_FIELDS = ("X", "Y", "THETA")
+
+
+def wrap_angle(angle: float) -> float:
+    """转到 (-pi, pi]"""
+    return math.pi - (math.pi - angle) % (2 * math.pi)
+
+
+class YawFusion(object):
+
+    def __init__(self, X: float = 0.0, Y: float = 0.0, THETA: float = 0.0,
+                 time_constant: float = 2.0, imu_timeout: float = 0.2, imu_sign: int = 1):
+        """
+        :param time_constant: the gyro heading is pulled to the IMU angle within about this many seconds,
+                              larger trusts the gyro more
+        :param imu_timeout: fall back to the odometry heading after this many seconds without IMU data
+        :param imu_sign: -1 if the IMU yaw turns clockwise positive
+        """
+        self.time_constant = time_constant
+        self.imu_timeout = imu_timeout
+        self.imu_sign = imu_sign
+        self.lock = threading.Lock()
+
+        self.X, self.Y, self.THETA = X, Y, THETA
+        self.speed = 0.0  # m/s, along the heading
+        self.odometry_time = None
+        self.odometry_theta = THETA  # heading at the last encoder poll
+        self.imu_time = None
+        self.imu_offset = None  # odometry frame heading - IMU yaw
+
+        """counters"""
+        self.imu_samples = 0
+        self.odometry_samples = 0
+
+        """(timestamp, X, Y, THETA)，整体替换，读的时候不需要加锁"""
+        self.latest_pose = (0.0, X, Y, THETA)
+
+    def update_imu(self, timestamp: float, gyro_z: float, yaw: float):
+        """
+        :param gyro_z: IMU.w[2] (deg/s)
+        :param yaw: IMU.Angle[2] (deg)
+        """
+        gyro_z = math.radians(gyro_z) * self.imu_sign
+        yaw = math.radians(yaw) * self.imu_sign
+        with self.lock:
+            if self.imu_offset is None:
+                # 第一个样本时对齐 IMU 与里程计的航向
+                self.imu_offset = self.THETA - yaw
+            elif timestamp > self.imu_time:
+                dt = timestamp - self.imu_time
+                theta = self.THETA + gyro_z * dt
+                alpha = dt / (self.time_constant + dt)
+                theta += alpha * wrap_angle(yaw + self.imu_offset - theta)
+                self.THETA = wrap_angle(theta)
+            self.imu_time = timestamp
+            self.imu_samples += 1
+            self._publish(timestamp)
+
+    def imu_listener(self, timestamp: float, a, w, Angle):
+        """IMU.add_listener 的回调"""
+        self.update_imu(timestamp, w[2], Angle[2])
+
+    def update_odometry(self, timestamp: float, d_l: float, d_r: float, d_theta: float):
+        """
+        :param d_l, d_r: wheel displacement since the previous poll (m), Odometry.d_l / d_r
+        :param d_theta: Odometry.d_theta, used only when the IMU is stale
+        """
+        with self.lock:
+            if self.odometry_time is None:
+                # 第一次读取的位移是从 encoder 0 开始算的（Odometry 的 _p_l, _p_r 初始为0），不累加
+                self.odometry_time = timestamp
+                return
+            if self.imu_time is None or timestamp - self.imu_time > self.imu_timeout:
+                self.THETA = wrap_angle(self.THETA + d_theta)
+            distance = (d_l + d_r) / 2
+            # 用上一次读取与现在航向的中间值
+            theta = self.odometry_theta + wrap_angle(self.THETA - self.odometry_theta) / 2
+            self.X -= distance * math.sin(theta)
+            self.Y += distance * math.cos(theta)
+            if timestamp > self.odometry_time:
+                self.speed = distance / (timestamp - self.odometry_time)
+            self.odometry_time = timestamp
+            self.odometry_theta = self.THETA
+            self.odometry_samples += 1
+            self._publish(timestamp)
+
+    def _extrapolate(self, timestamp: float):
+        if self.odometry_time is None:
+            return self.X, self.Y, self.THETA
+        distance = self.speed * max(timestamp - self.odometry_time, 0.0)
+        return self.X - distance * math.sin(self.THETA), self.Y + distance * math.cos(self.THETA), self.THETA
+
+    def _publish(self, timestamp: float):
+        self.latest_pose = (timestamp,) + self._extrapolate(timestamp)
+
+    def get_pose(self, timestamp: float = None):
+        """
+        :param timestamp: extrapolate the position from the last encoder poll to this time, None for no extrapolation
+        :return: (X, Y, THETA)
+        """
+        with self.lock:
+            if timestamp is None:
+                return self.X, self.Y, self.THETA
+            return self._extrapolate(timestamp)
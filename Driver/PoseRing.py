@@ -0,0 +1,72 @@
+"""
+@File    :   PoseRing.py
+
+@Description
+------------
+里程计位姿的发布：一个线程写，多个线程读，读的时候不需要访问串口
+latest_pose 每次整体替换为新的 tuple，读最新位姿不需要加锁；
+历史位姿写在预先分配的环形缓冲区里，与 IRFrameRing 一样每行同时写在 i 和 i + size 两个位置
+
+"""
+import threading
+import numpy as np
+
+"""Odometry.updatePose 的返回值"""
+POSE_FIELDS = ("X", "Y", "THETA", "d_l", "d_r", "dX", "dY", "dx", "dy")
+
+
+class PoseRing(object):
+
+    def __init__(self, size: int = 1024):
+        """:param size: poses kept in the history"""
+        self.size = size
+        # 每行: timestamp, X, Y, THETA, d_l, d_r, dX, dY, dx, dy
+        self.data = np.zeros((2 * size, len(POSE_FIELDS) + 1))
+        self.count = 0
+        """(sequence number, timestamp, pose tuple)，sequence 0 表示还没有位姿"""
+        self.latest_pose = (0, 0.0, None)
+        self.condition = threading.Condition()
+
+    def publish(self, timestamp: float, pose):
+        index = self.count % self.size
+        row = self.data[index]
+        row[0] = timestamp
+        row[1:] = pose
+        self.data[index + self.size] = row
+        self.latest_pose = (self.count + 1, timestamp, tuple(pose))
+        with self.condition:
+            self.count += 1
+            self.condition.notify_all()
+
+    def latest(self):
+        """:return: (sequence number, timestamp, pose tuple)"""
+        return self.latest_pose
+
+    def last(self, n: int) -> np.ndarray:
+        """
+        最近的 n 个位姿，从旧到新，返回拷贝
+        :return: (n, 10) array, columns are timestamp and POSE_FIELDS
+        """
+        if n > self.size - 1:
+            raise ValueError("can only get %d poses from a ring of size %d" % (self.size - 1, self.size))
+        count = self.count
+        n = min(n, count)
+        end = (count - 1) % self.size + self.size + 1
+        return self.data[end - n:end].copy()
+
+    def pose_at(self, timestamp: float):
+        """
+        不晚于 timestamp 的最近一个位姿，用于把其他传感器的数据对齐到里程计
+        :return: (timestamp, pose tuple), None if the history has no pose that old
+        """
+        history = self.last(self.size - 1)
+        index = np.searchsorted(history[:, 0], timestamp, side='right') - 1
+        if index < 0:
+            return None
+        return history[index, 0], tuple(history[index, 1:])
+
+    def wait(self, sequence: int, timeout: float = None) -> int:
+        """等到有比 sequence 更新的位姿，返回最新位姿的序号"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.count > sequence, timeout)
+            return self.count
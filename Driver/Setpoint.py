@@ -0,0 +1,51 @@
+"""
+@File    :   Setpoint.py
+
+@Description
+------------
+ControlDriver 的速度设定值 (speed, omega, radius)
+三个值在锁内一起读写，每次实际改变时 version 加1，
+控制循环只在 version 变化（或 keep-alive 超时）时才重新编码并发送转速指令
+
+"""
+import threading
+
+
+class Setpoint(object):
+
+    def __init__(self, speed: float = 0.0, omega: float = 0.0, radius: float = 0.0):
+        self.lock = threading.Lock()
+        self._value = (speed, omega, radius)
+        self.version = 0
+
+    def set(self, speed: float = None, omega: float = None, radius: float = None) -> int:
+        """
+        同时修改多个值，None 表示不变，值没有变化时 version 不变
+        :return: the version after the change
+        """
+        with self.lock:
+            old_speed, old_omega, old_radius = self._value
+            value = (old_speed if speed is None else speed,
+                     old_omega if omega is None else omega,
+                     old_radius if radius is None else radius)
+            if value != self._value:
+                self._value = value
+                self.version += 1
+            return self.version
+
+    def get(self):
+        """:return: (version, speed, omega, radius)"""
+        with self.lock:
+            return (self.version,) + self._value
+
+    @property
+    def speed(self):
+        return self._value[0]
+
+    @property
+    def omega(self):
+        return self._value[1]
+
+    @property
+    def radius(self):
+        return self._value[2]
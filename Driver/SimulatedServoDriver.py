@@ -0,0 +1,196 @@
+"""
+@File    :   SimulatedServoDriver.py
+
+@Description
+------------
+不需要实物的伺服驱动器模拟，用于在没有驱动器时测试 ControlDriver / Odometry
+SimulatedSerial 提供与 serial.Serial 相同的 write/read/flush/in_waiting/reset_input_buffer，
+内部的 SimulatedServoDriver 处理 0x06 转速指令和 [0x80, 0x00, 0x80] 监控指令，
+按转速积分 encoder 位置 (4096 ticks/圈)，并可设置回复延迟、抖动、丢包和故障
+
+"""
+import random
+import threading
+import time
+
+TICKS_PER_REVOLUTION = 4096
+
+
+def _group(cmd, value):
+    """[指令, 高字节, 低字节, 校验]"""
+    hi = (value >> 8) & 0xFF
+    lo = value & 0xFF
+    return [cmd, hi, lo, (cmd + hi + lo) & 0xFF]
+
+
+class SimulatedServoDriver(object):
+
+    def __init__(self, time_constant: float = 0.05, input_voltage: int = 24, initial_position: int = 0,
+                 clock=time.monotonic):
+        """
+        :param time_constant: first order lag of the motor speed (s)
+        :param initial_position: encoder position at start (ticks)
+        """
+        self.time_constant = time_constant
+        self.input_voltage = input_voltage
+        self.clock = clock
+        self.enabled = False
+        self.target_rpm = 0.0
+        self.rpm = 0.0
+        self.position = float(initial_position)
+        self.given_position = 0
+        self.malfunction = 0
+        self._last_time = clock()
+
+    def advance(self, now: float = None):
+        """按转速积分到当前时间"""
+        now = self.clock() if now is None else now
+        dt = now - self._last_time
+        if dt <= 0:
+            return
+        target = self.target_rpm if self.enabled else 0.0
+        if self.time_constant > 0:
+            alpha = min(dt / self.time_constant, 1.0)
+        else:
+            alpha = 1.0
+        rpm_start = self.rpm
+        self.rpm += (target - self.rpm) * alpha
+        self.position += (rpm_start + self.rpm) / 2 / 60 * TICKS_PER_REVOLUTION * dt
+        self._last_time = now
+
+    def handle(self, request: bytes):
+        """:return: reply bytes of one request"""
+        self.advance()
+        cmd = request[0]
+        if cmd == 0x80 and len(request) == 3:
+            return self.monitor_reply()
+        value = (request[1] << 8) + request[2]
+        if cmd == 0x00:
+            self.enabled = value != 0
+        elif cmd == 0x06:
+            if value & 0x8000:
+                value -= 0xFFFF
+            self.target_rpm = value * 6000 / 16384
+        return bytes([cmd, (cmd + request[1] + request[2]) & 0xFF])
+
+    def monitor_reply(self) -> bytes:
+        rpm_raw = int(self.rpm / 6000 * 16384) & 0xFFFF
+        position = int(round(self.position)) & 0xFFFFFFFF
+        given = self.given_position & 0xFFFFFFFF
+        data = _group(0x80, int(self.enabled))
+        if self.malfunction:
+            data += _group(0x80, self.malfunction)
+        data += _group(0xE1, self.input_voltage)
+        data += _group(0xE2, 0)
+        data += _group(0xE4, rpm_raw)
+        data += _group(0xE5, given >> 16)
+        data += _group(0xE6, given & 0xFFFF)
+        data += _group(0xE7, position >> 16)
+        data += _group(0xE8, position & 0xFFFF)
+        return bytes(data)
+
+
+class SimulatedSerial(object):
+    """serial.Serial 的替代，请求交给 SimulatedServoDriver，回复在设定的延迟后才能读到"""
+
+    def __init__(self, driver: SimulatedServoDriver = None, timeout: float = 0.05, latency: float = 0.001,
+                 jitter: float = 0.0, loss: float = 0.0, baud_rate: int = 57600, seed: int = None,
+                 byte_loss: float = 0.0):
+        """
+        :param latency: delay before the reply starts (s)
+        :param jitter: extra uniform random delay up to this value (s)
+        :param loss: probability that a reply is lost
+        :param byte_loss: probability that a single byte of a reply is lost
+        :param baud_rate: bytes take 10 / baud_rate s each on the wire, 0 for no transfer time
+        """
+        self.driver = driver if driver is not None else SimulatedServoDriver()
+        self.timeout = timeout
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.byte_loss = byte_loss
+        self.baud_rate = baud_rate
+        self.random = random.Random(seed)
+        self.condition = threading.Condition()
+        self.pending = bytearray()  # 未处理完的请求
+        self.replies = []  # [(ready time, byte)]
+        self.lost = 0
+        self.lost_bytes = 0
+        self.requests = 0
+
+    def _byte_time(self) -> float:
+        return 10 / self.baud_rate if self.baud_rate else 0.0
+
+    def write(self, data) -> int:
+        now = time.monotonic()
+        with self.condition:
+            self.pending += bytes(data)
+            while self.pending:
+                size = 3 if self.pending[0] == 0x80 else 4
+                if len(self.pending) < size:
+                    break
+                request = bytes(self.pending[:size])
+                del self.pending[:size]
+                self.requests += 1
+                reply = self.driver.handle(request)
+                if self.random.random() < self.loss:
+                    self.lost += 1
+                    continue
+                ready = now + (len(request) * self._byte_time() + self.latency
+                               + self.random.uniform(0, self.jitter))
+                if self.replies:
+                    ready = max(ready, self.replies[-1][0])
+                for byte in reply:
+                    ready += self._byte_time()
+                    if self.byte_loss and self.random.random() < self.byte_loss:
+                        self.lost_bytes += 1
+                        continue
+                    self.replies.append((ready, byte))
+            self.condition.notify_all()
+        return len(data)
+
+    def _ready_count(self, now: float) -> int:
+        count = 0
+        for ready, byte in self.replies:
+            if ready > now:
+                break
+            count += 1
+        return count
+
+    @property
+    def in_waiting(self) -> int:
+        with self.condition:
+            return self._ready_count(time.monotonic())
+
+    def read(self, size: int = 1) -> bytes:
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                count = self._ready_count(now)
+                if count >= size:
+                    break
+                if deadline is not None and now >= deadline:
+                    size = count
+                    break
+                if len(self.replies) >= size:
+                    wake = self.replies[size - 1][0]
+                else:
+                    wake = now + 0.001 if deadline is None else deadline
+                if deadline is not None:
+                    wake = min(wake, deadline)
+                self.condition.wait(max(wake - now, 0))
+            data = bytes(byte for ready, byte in self.replies[:size])
+            del self.replies[:size]
+            return data
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        """只清掉已经到达的字节，还在路上的字节之后仍会到达"""
+        with self.condition:
+            del self.replies[:self._ready_count(time.monotonic())]
+
+    def close(self):
+        pass
@@ -0,0 +1,146 @@
+"""
+@File    :   TrajectoryStore.py
+
+@Description
+------------
+走过的轨迹 (timestamp, X, Y)，代替一直增长的 plot_x / plot_y 列表
+预先分配的环形缓冲区，满了以后覆盖最旧的点，长时间运行内存不变；
+与上一个保存的点距离超过 min_distance（或时间超过 min_interval）才保存；
+按 cell_size 的网格索引每个点，用于查询离某个位置最近的历史点
+
+"""
+import math
+import numpy as np
+
+
+class TrajectoryStore(object):
+
+    def __init__(self, size: int = 10000, min_distance: float = 0.1, min_interval: float = None,
+                 cell_size: float = 0.5):
+        """
+        :param size: points kept, the oldest are overwritten
+        :param min_distance: keep a point when it is farther than this from the last kept point (m)
+        :param min_interval: also keep a point after this many seconds, None for distance only
+        :param cell_size: grid size of the spatial index (m)
+        """
+        self.size = size
+        self.min_distance_sq = min_distance ** 2
+        self.min_interval = min_interval
+        self.cell_size = cell_size
+        self.data = np.zeros((size, 3))  # timestamp, X, Y
+        self.count = 0
+        """the last kept point, nan before the first point so that it is always kept"""
+        self.last_time = self.last_x = self.last_y = float("nan")
+
+        """grid cell -> set of ring slots"""
+        self.grid = {}
+        self.slot_cell = [None] * size
+        """cells ever used, [min_ix, max_ix, min_iy, max_iy]，只扩大不缩小，用于限制查找的圈数"""
+        self.cell_bounds = None
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def _cell(self, x: float, y: float):
+        return int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))
+
+    def append(self, timestamp: float, x: float, y: float, force: bool = False) -> bool:
+        """:return: True if the point was kept"""
+        dx = x - self.last_x
+        dy = y - self.last_y
+        if dx * dx + dy * dy <= self.min_distance_sq and not force and \
+                (self.min_interval is None or timestamp - self.last_time < self.min_interval):
+            return False
+        slot = self.count % self.size
+        old_cell = self.slot_cell[slot]
+        if old_cell is not None:
+            slots = self.grid[old_cell]
+            slots.discard(slot)
+            if not slots:
+                del self.grid[old_cell]
+        cell = self._cell(x, y)
+        self.grid.setdefault(cell, set()).add(slot)
+        bounds = self.cell_bounds
+        if bounds is None:
+            self.cell_bounds = [cell[0], cell[0], cell[1], cell[1]]
+        else:
+            if cell[0] < bounds[0]:
+                bounds[0] = cell[0]
+            elif cell[0] > bounds[1]:
+                bounds[1] = cell[0]
+            if cell[1] < bounds[2]:
+                bounds[2] = cell[1]
+            elif cell[1] > bounds[3]:
+                bounds[3] = cell[1]
+        self.slot_cell[slot] = cell
+        row = self.data[slot]
+        row[0] = timestamp
+        row[1] = x
+        row[2] = y
+        self.last_time, self.last_x, self.last_y = timestamp, x, y
+        self.count += 1
+        return True
+
+    def to_array(self) -> np.ndarray:
+        """:return: (n, 3) copy from the oldest to the newest point, columns timestamp, X, Y"""
+        if self.count <= self.size:
+            return self.data[:self.count].copy()
+        start = self.count % self.size
+        return np.concatenate((self.data[start:], self.data[:start]))
+
+    def save(self, file_path: str):
+        np.save(file_path, self.to_array())
+
+    @property
+    def plot_x(self) -> list:
+        return self.to_array()[:, 1].tolist()
+
+    @property
+    def plot_y(self) -> list:
+        return self.to_array()[:, 2].tolist()
+
+    def nearest(self, x: float, y: float, max_distance: float = None):
+        """
+        最近的历史点，从所在的网格向外逐圈查找
+        :return: (timestamp, X, Y, distance), None if no point within max_distance
+        """
+        if not self.grid:
+            return None
+        cx, cy = self._cell(x, y)
+        if max_distance is None:
+            min_ix, max_ix, min_iy, max_iy = self.cell_bounds
+            max_ring = max(cx - min_ix, max_ix - cx, cy - min_iy, max_iy - cy, 0)
+        else:
+            max_ring = int(math.ceil(max_distance / self.cell_size))
+        best_slot = -1
+        best_sq = float("inf")
+        for ring in range(max_ring + 1):
+            # 第 ring 圈的点距离至少 (ring - 1) * cell_size，已找到更近的点就可以停止
+            if best_slot >= 0 and ((ring - 1) * self.cell_size) ** 2 > best_sq:
+                break
+            candidates = []
+            for ix in range(cx - ring, cx + ring + 1):
+                if abs(ix - cx) == ring:
+                    rows = range(cy - ring, cy + ring + 1)
+                else:
+                    rows = (cy - ring, cy + ring)
+                for iy in rows:
+                    slots = self.grid.get((ix, iy))
+                    if slots:
+                        candidates.extend(slots)
+            if not candidates:
+                continue
+            candidates = np.array(candidates)
+            points = self.data[candidates]
+            distance_sq = (points[:, 1] - x) ** 2 + (points[:, 2] - y) ** 2
+            index = int(np.argmin(distance_sq))
+            if distance_sq[index] < best_sq:
+                best_sq = float(distance_sq[index])
+                best_slot = int(candidates[index])
+        if best_slot < 0:
+            return None
+        distance = math.sqrt(best_sq)
+        if max_distance is not None and distance > max_distance:
+            return None
+        timestamp, px, py = self.data[best_slot]
+        return timestamp, px, py, distance
@@ -5,6 +5,7 @@ import threading
 from Sensors import IRCamera
 from Preprocessing import Leg_detector
 from Driver import ControlOdometryDriver as cd
+from Utils import LatencyHistogram
 
 """portal num"""
 camera_portal = '/dev/ttyUSB0'
@@ -19,35 +20,47 @@ CD = cd.ControlDriver(record_mode=False, left_right=0)
 def position_calculation(left_leg: np.ndarray, right_leg: np.ndarray,
                          position_buffer: np.ndarray, weight_array: np.ndarray):
     """buffer used to average the position information with special weight
-    weight position is a 1 X buffer_length matrix to decide the weight"""
-    human_position = (left_leg + right_leg) / 2
-    new_buffer = np.copy(position_buffer)
-    new_buffer[0:new_buffer.shape[0] - 1, :] = position_buffer[1:position_buffer.shape[0], :]
-    new_buffer[-1, 0] = left_leg[0]
-    new_buffer[-1, 1] = left_leg[1]
-    new_buffer[-1, 2] = right_leg[0]
-    new_buffer[-1, 3] = right_leg[1]
-    new_buffer[-1, 4] = human_position[0]
-    new_buffer[-1, 5] = human_position[1]
-    current_position = np.matmul(weight_array, new_buffer)[0]
-    return current_position, new_buffer
+    weight position is a 1 X buffer_length matrix to decide the weight
+    the buffer is shifted in place, only the newest row is written"""
+    position_buffer[0:position_buffer.shape[0] - 1, :] = position_buffer[1:position_buffer.shape[0], :]
+    position_buffer[-1, 0] = left_leg[0]
+    position_buffer[-1, 1] = left_leg[1]
+    position_buffer[-1, 2] = right_leg[0]
+    position_buffer[-1, 3] = right_leg[1]
+    position_buffer[-1, 4] = (left_leg[0] + right_leg[0]) / 2
+    position_buffer[-1, 5] = (left_leg[1] + right_leg[1]) / 2
+    current_position = np.matmul(weight_array, position_buffer)[0]
+    return current_position, position_buffer
 
 
-def main_FFL(CD: cd.ControlDriver, LD: Leg_detector.Leg_detector):
+def main_FFL(CD: cd.ControlDriver, LD: Leg_detector.Leg_detector, turn_hold_time: float = 0.2):
+    """
+    每当 Leg_detector 有新的检测结果时运行一次，不再固定 sleep
+    :param turn_hold_time: a turning command is kept at least this long before deciding again
+    """
     buffer_length = 3
     position_buffer = np.zeros((buffer_length, 6))
     weight_array = np.array((range(1, buffer_length + 1))).reshape((1, 3))
     weight_array = weight_array / weight_array.sum()
-    CD.speed = 0
-    CD.omega = 0
-    CD.radius = 0
+    CD.set_setpoint(speed=0, omega=0, radius=0)
+    """scan timestamp -> command published"""
+    latency = LatencyHistogram.LatencyHistogram()
+    sequence = 0
+    turn_hold_until = 0.0
     # walker rear wheel distance = 56
     while True:
-        time.sleep(0.2)
-        current_left_leg = LD.left_leg
-        current_right_leg = LD.right_leg
+        new_sequence = LD.wait_for_detection(sequence, timeout=0.5)
+        if new_sequence == sequence:
+            """no scan for a while"""
+            CD.set_setpoint(speed=0, omega=0, radius=0)
+            continue
+        sequence = new_sequence
+        scan_time = LD.detection_time
+        current_left_leg, current_right_leg = LD.tracker.get_legs()
         current_position, position_buffer = position_calculation(current_left_leg, current_right_leg,
                                                                  position_buffer, weight_array)
+        if time.time() < turn_hold_until:
+            continue
 
         forward_boundry = 4
         backward_boundry = -8
@@ -56,40 +69,32 @@ def main_FFL(CD: cd.ControlDriver, LD: Leg_detector.Leg_detector):
         left_boundry = 8
         right_boundry = -7
         if backward_boundry > current_position[4] > -40:
-            CD.speed = -0.1
-            CD.omega = 0
-            CD.radius = 0
+            CD.set_setpoint(speed=-0.1, omega=0, radius=0)
             str1 = "backward"
         elif current_position[4] > forward_boundry:
             if current_position[5] > center_left_boundry \
                     and current_position[0] > current_position[2] \
                     and current_position[1] > left_boundry:
-                CD.speed = 0
-                CD.omega = 0.15
-                CD.radius = 80
+                CD.set_setpoint(speed=0, omega=0.15, radius=80)
                 str1 = "left"
-                time.sleep(0.2)
+                turn_hold_until = time.time() + turn_hold_time
             elif current_position[5] < center_right_boundry \
                     and current_position[2] > current_position[0] \
                     and current_position[3] < right_boundry:
-                CD.speed = 0
-                CD.omega = -0.15
-                CD.radius = 80
+                CD.set_setpoint(speed=0, omega=-0.15, radius=80)
                 str1 = "right"
-                time.sleep(0.2)
+                turn_hold_until = time.time() + turn_hold_time
             else:
-                CD.speed = 0.1
-                CD.omega = 0
-                CD.radius = 0
+                CD.set_setpoint(speed=0.1, omega=0, radius=0)
                 str1 = "forward"
         else:
-            CD.speed = 0
-            CD.omega = 0
-            CD.radius = 0
+            CD.set_setpoint(speed=0, omega=0, radius=0)
             str1 = "stop"
-        print("\rleft leg:%.2f,%.2f  right:%.2f,%.2f  human:%.2f,%.2f choice:%s,%.2f,%.2f,%2f"
+        latency.record(time.time() - scan_time)
+        print("\rleft leg:%.2f,%.2f  right:%.2f,%.2f  human:%.2f,%.2f choice:%s,%.2f,%.2f,%2f  latency:%s"
              %(current_position[0], current_position[1], current_position[2],
-               current_position[3], current_position[4], current_position[5],str1,CD.speed,CD.omega,CD.radius),end="")
+               current_position[3], current_position[4], current_position[5],str1,CD.speed,CD.omega,CD.radius,
+               latency),end="")
 
 thread_leg = threading.Thread(target=LD.scan_procedure, args=())
 thread_cd = threading.Thread(target=CD.control_part, args=())
@@ -57,11 +57,16 @@ if __name__ == "__main__":
     # thread_control_driver = threading.Thread(target=cd.control_part, args=())
     # thread_control_driver.start()
 
+    """IR camera frames are read by a background thread, the loop only takes the newest one"""
+    IRCamera.start_acquisition()
+    frame_sequence = 0
+
     while True:
         # present_time = time.time()
-        IRCamera.get_irdata_once()
-        if len(IRCamera.temperature) == 768:
-            normalized_temperature = np.array(IRCamera.temperature).reshape((ir_data_width, 1))
+        frame_sequence = IRCamera.wait_frame(frame_sequence)
+        frame_sequence, ir_frame, _ = IRCamera.latest_frame()
+        if ir_frame is not None:
+            normalized_temperature = np.array(ir_frame, dtype=np.float64).reshape((ir_data_width, 1))
             idx = normalized_temperature < ir_threshold
             normalized_temperature[idx] = 0
             idx = normalized_temperature >= ir_threshold
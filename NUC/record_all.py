@@ -10,6 +10,8 @@ sys.path.append(father_path)
 from Sensors import IMU, IRCamera, softskin
 from Preprocessing import Leg_detector
 from Driver import ControlOdometryDriver as CD
+from Driver import PoseFusion
+from Utils import AsyncWriter
 
 resource = os.path.abspath(
     os.path.dirname(os.path.abspath(__file__)) + os.path.sep + ".."  +
@@ -20,6 +22,9 @@ camera_portal = '/dev/ttyUSB0'
 lidar_portal = '/dev/ttyUSB1'
 IMU_walker_portal = '/dev/ttyUSB2'
 
+"""all recorders hand their chunks to one writer thread, sensor threads never wait for the disk
+queue depth, drops and write latency: Writer.get_counters()"""
+Writer = AsyncWriter.AsyncWriter().start()
 """IMU part"""
 # IMU_human = IMU.IMU()
 # IMU_human.open_serial("/dev/ttyUSB1")
@@ -29,8 +34,11 @@ IMU_walker.open_serial(IMU_walker_portal)
 Camera = IRCamera.IRCamera()
 """skin part"""
 Skin = softskin.SoftSkin()
+"""odometry + IMU heading, Fusion.latest_pose is updated at the IMU rate, Cd records it at every encoder poll in Fusion.rec"""
+Fusion = PoseFusion.YawFusion()
+IMU_walker.add_listener(Fusion.imu_listener)
 """control driver(record mode)"""
-Cd = CD.ControlDriver(record_mode=True)
+Cd = CD.ControlDriver(record_mode=True, fusion=Fusion, record_writer=Writer)
 """leg detector part"""
 Ld = Leg_detector.Leg_detector(lidar_portal)
 """initiate skin part"""
@@ -40,12 +48,13 @@ Skin.build_base_line_data()
 seperately_recording = True
 
 if seperately_recording:
-    thread_skin = threading.Thread(target=Skin.read_and_record, args=(True,))
-    thread_camera = threading.Thread(target=Camera.record_write, args=(True, True, True))
+    # daemon：串口读取卡住的线程不会让程序无法退出，退出前在 finally 中结束各循环并等写线程写完
+    thread_skin = threading.Thread(target=Skin.read_and_record, args=(True,), kwargs={"writer": Writer}, daemon=True)
+    thread_camera = threading.Thread(target=Camera.record_write, args=(True, True, True), kwargs={"writer": Writer}, daemon=True)
     # thread_IMU_human = threading.Thread(target=IMU_human.read_record,args=())
-    thread_IMU_walker = threading.Thread(target=IMU_walker.read_record, args=(resource,))
-    thread_cd = threading.Thread(target=Cd.control_part, args=())
-    thread_leg = threading.Thread(target=Ld.scan_procedure, args=(False, True))
+    thread_IMU_walker = threading.Thread(target=IMU_walker.read_record, args=(), kwargs={"writer": Writer}, daemon=True)
+    thread_cd = threading.Thread(target=Cd.control_part, args=(), daemon=True)
+    thread_leg = threading.Thread(target=Ld.scan_procedure, args=(False, True), kwargs={"writer": Writer}, daemon=True)
 
     thread_skin.start()
     thread_camera.start()
@@ -54,6 +63,22 @@ if seperately_recording:
     thread_cd.start()
     thread_leg.start()
 
+    threads = [thread_skin, thread_camera, thread_IMU_walker, thread_cd, thread_leg]
+    try:
+        # Ctrl+C 结束记录
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # 各传感器的循环结束并关闭 recorder（最后的 chunk 交给写线程），再等写线程写完队列中所有的数据
+        for sensor in (Skin, Camera, IMU_walker, Cd, Ld):
+            sensor.stop()
+        for thread in threads:
+            thread.join(timeout=2.0)
+        Writer.stop()
+        print("writer:", Writer.get_counters())
+
 else:
     pass
     # thread_skin = threading.Thread(target=Skin.read_and_record, args=())
@@ -0,0 +1,173 @@
+"""
+@File    :   LegTracker.py
+
+@Description
+------------
+Leg_detector 之后的跟踪：每条腿一个匀速模型的 Kalman filter
+检测结果按最近邻与预测位置关联，短时间丢失检测时继续预测，
+输出平滑后的位置和速度（单位与 Leg_detector.left_leg 相同，cm 与 cm/s）
+
+"""
+import numpy as np
+
+infinite_far = np.array([-180, -180])
+
+
+class LegKalman(object):
+    """state: [x, y, vx, vy]"""
+
+    def __init__(self, position, acceleration_noise: float = 300.0, measurement_noise: float = 2.0):
+        self.x = np.array([position[0], position[1], 0.0, 0.0], dtype=np.float64)
+        self.P = np.diag([measurement_noise ** 2, measurement_noise ** 2, 100.0 ** 2, 100.0 ** 2])
+        self.q = acceleration_noise ** 2
+        self.R = np.eye(2) * measurement_noise ** 2
+        self.H = np.array([[1.0, 0.0, 0.0, 0.0],
+                           [0.0, 1.0, 0.0, 0.0]])
+
+    def predict(self, dt: float):
+        F = np.eye(4)
+        F[0, 2] = dt
+        F[1, 3] = dt
+        dt2 = dt * dt
+        dt3 = dt2 * dt / 2
+        dt4 = dt2 * dt2 / 4
+        Q = self.q * np.array([[dt4, 0, dt3, 0],
+                               [0, dt4, 0, dt3],
+                               [dt3, 0, dt2, 0],
+                               [0, dt3, 0, dt2]])
+        self.x = F @ self.x
+        self.P = F @ self.P @ F.T + Q
+
+    def update(self, z):
+        y = np.asarray(z, dtype=np.float64) - self.H @ self.x
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(4) - K @ self.H) @ self.P
+
+    @property
+    def position(self):
+        return self.x[0:2]
+
+    @property
+    def velocity(self):
+        return self.x[2:4]
+
+
+class LegTracker(object):
+
+    def __init__(self, gate: float = 30.0, max_dropout: float = 0.5,
+                 acceleration_noise: float = 300.0, measurement_noise: float = 2.0):
+        """
+        :param gate: max distance between a detection and a predicted leg to be associated
+        :param max_dropout: seconds to keep predicting without detection before the track is lost
+        """
+        self.gate = gate
+        self.max_dropout = max_dropout
+        self.acceleration_noise = acceleration_noise
+        self.measurement_noise = measurement_noise
+        self.tracks = [None, None]  # left, right
+        self.last_seen = [0.0, 0.0]
+        self.previous_time = None
+
+        """
+        output (left_leg, right_leg, left_velocity, right_velocity, timestamp)，timestamp 为 None 表示没有跟踪
+        整体替换，其它线程读的时候不需要加锁，也不会读到不同 scan 的左右腿
+        """
+        self.legs = (infinite_far, infinite_far, np.zeros(2), np.zeros(2), None)
+
+    @staticmethod
+    def is_detected(leg) -> bool:
+        return leg is not None and not np.array_equal(leg, infinite_far)
+
+    def reset(self):
+        self.tracks = [None, None]
+        self.previous_time = None
+
+    def update(self, left_leg, right_leg, timestamp: float):
+        """
+        :param left_leg, right_leg: output of Leg_detector.detect_leg, infinite_far when missed
+        :param timestamp: time of the scan
+        :return: (left_leg, right_leg) smoothed positions
+        """
+        detections = [np.asarray(leg, dtype=np.float64) for leg in (left_leg, right_leg)
+                      if self.is_detected(leg)]
+        if self.previous_time is not None:
+            dt = timestamp - self.previous_time
+            for track in self.tracks:
+                if track is not None and dt > 0:
+                    track.predict(dt)
+        self.previous_time = timestamp
+
+        if self.tracks[0] is None or self.tracks[1] is None:
+            """没有跟踪时，需要同时检测到两条腿才开始"""
+            if len(detections) == 2:
+                self.tracks = [LegKalman(d, self.acceleration_noise, self.measurement_noise) for d in detections]
+                self.last_seen = [timestamp, timestamp]
+        else:
+            for track_index, detection in self.associate(detections):
+                self.tracks[track_index].update(detection)
+                self.last_seen[track_index] = timestamp
+            for i in range(2):
+                if timestamp - self.last_seen[i] > self.max_dropout:
+                    self.tracks = [None, None]
+                    break
+
+        self.publish(timestamp)
+        return self.left_leg, self.right_leg
+
+    def associate(self, detections):
+        """最近邻关联，两个检测时选总距离最小的配对，超过 gate 的不关联"""
+        predicted = [track.position for track in self.tracks]
+        if len(detections) == 2:
+            straight = [np.linalg.norm(detections[0] - predicted[0]), np.linalg.norm(detections[1] - predicted[1])]
+            crossed = [np.linalg.norm(detections[1] - predicted[0]), np.linalg.norm(detections[0] - predicted[1])]
+            if sum(straight) <= sum(crossed):
+                pairs = [(0, detections[0], straight[0]), (1, detections[1], straight[1])]
+            else:
+                pairs = [(0, detections[1], crossed[0]), (1, detections[0], crossed[1])]
+        elif len(detections) == 1:
+            distance = [np.linalg.norm(detections[0] - p) for p in predicted]
+            i = int(distance[1] < distance[0])
+            pairs = [(i, detections[0], distance[i])]
+        else:
+            pairs = []
+        return [(i, detection) for i, detection, distance in pairs if distance <= self.gate]
+
+    def publish(self, timestamp: float):
+        if self.tracks[0] is None:
+            self.legs = (infinite_far, infinite_far, np.zeros(2), np.zeros(2), None)
+        else:
+            self.legs = (self.tracks[0].position.copy(), self.tracks[1].position.copy(),
+                         self.tracks[0].velocity.copy(), self.tracks[1].velocity.copy(), timestamp)
+
+    @property
+    def left_leg(self):
+        return self.legs[0]
+
+    @property
+    def right_leg(self):
+        return self.legs[1]
+
+    @property
+    def left_velocity(self):
+        return self.legs[2]
+
+    @property
+    def right_velocity(self):
+        return self.legs[3]
+
+    @property
+    def is_valid(self) -> bool:
+        return self.legs[4] is not None
+
+    def get_legs(self, timestamp: float = None):
+        """
+        :param timestamp: extrapolate the legs to this time with their velocities, None for the last scan
+        :return: (left_leg, right_leg)
+        """
+        left_leg, right_leg, left_velocity, right_velocity, scan_time = self.legs
+        if scan_time is None or timestamp is None:
+            return left_leg, right_leg
+        dt = timestamp - scan_time
+        return left_leg + left_velocity * dt, right_leg + right_velocity * dt
@@ -1,24 +1,87 @@
 import numpy as np
 import math
+import itertools
 import cv2
 from PIL import Image
 from rplidar import RPLidar
-import time
-from sklearn.cluster import KMeans
+import threading
 import os, sys
 
 pwd = os.path.abspath(os.path.abspath(__file__))
 father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
 sys.path.append(father_path)
+from Preprocessing import LegTracker, ScanPipeline
+from Utils import BinaryRecorder
+
+
+class LegClusterer(object):
+    """
+    两条腿的 2-means 聚类，接口与 sklearn KMeans(n_clusters=2) 相同 (fit, cluster_centers_, labels_)
+    以上一帧的腿部位置作为初始中心，失败时按列中位数把点分成左右两组重新开始，结果是确定的
+    """
+
+    def __init__(self, max_iter: int = 20, warm_start: bool = True):
+        self.max_iter = max_iter
+        self.warm_start = warm_start
+        self.cluster_centers_ = None
+        self.labels_ = None
+        self.n_iter_ = 0
+
+    def initial_centers(self, sample: np.ndarray) -> np.ndarray:
+        """按列（左右方向）排序，从中位数处分为两组"""
+        order = np.argsort(sample[:, 1], kind="stable")
+        half = sample.shape[0] // 2
+        return np.array([sample[order[:half]].mean(axis=0), sample[order[half:]].mean(axis=0)])
+
+    def fit(self, sample: np.ndarray):
+        sample = np.asarray(sample, dtype=np.float64)
+        if self.warm_start and self.cluster_centers_ is not None:
+            if self._lloyd(sample, self.cluster_centers_):
+                return self
+        if not self._lloyd(sample, self.initial_centers(sample)):
+            """点全部分到了同一类，直接按列中位数分组"""
+            order = np.argsort(sample[:, 1], kind="stable")
+            labels = np.zeros(sample.shape[0], dtype=np.int32)
+            labels[order[sample.shape[0] // 2:]] = 1
+            self.cluster_centers_ = self.initial_centers(sample)
+            self.labels_ = labels
+        return self
+
+    def _lloyd(self, sample: np.ndarray, centers: np.ndarray) -> bool:
+        labels = None
+        for self.n_iter_ in range(1, self.max_iter + 1):
+            d0 = ((sample - centers[0]) ** 2).sum(axis=1)
+            d1 = ((sample - centers[1]) ** 2).sum(axis=1)
+            new_labels = d1 < d0
+            count = new_labels.sum()
+            if count == 0 or count == sample.shape[0]:
+                return False
+            if labels is not None and np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+            centers = np.array([sample[~labels].mean(axis=0), sample[labels].mean(axis=0)])
+        self.cluster_centers_ = centers
+        self.labels_ = labels.astype(np.int32)
+        return True
 
 
 class Leg_detector(object):
 
     def __init__(self, portal: str = '/dev/ttyUSB2', is_show:bool=False):
-        self.rplidar = RPLidar(portal)  # '/dev/ttyUSB1'
-        self.kmeans = KMeans(n_clusters=2)
+        """
+        :param portal: lidar port, None to run without lidar (e.g. replaying recorded scans)
+        """
+        self.rplidar = RPLidar(portal) if portal is not None else None  # '/dev/ttyUSB1'
+        self.kmeans = LegClusterer()
         self.left_leg = np.zeros((1, 2))
         self.right_leg = np.zeros((1, 2))
+        """smoothed legs with velocity, read them together with tracker.get_legs() or tracker.legs"""
+        self.tracker = LegTracker.LegTracker()
+        self.pipeline = None
+        """new detection event, see wait_for_detection"""
+        self.detection_condition = threading.Condition()
+        self.detection_sequence = 0
+        self.detection_time = 0.0
 
         self.scope = 1
         self.size = 300
@@ -30,21 +93,58 @@ class Leg_detector(object):
         self.center_point = np.array([self.half_size+45,self.half_size])
         self.is_show = is_show
 
-    def turn_to_img(self, original_list: list, show: bool = False):
-        """turn the scan data list into a ndarray"""
-        img = np.zeros((self.size, self.size))
-        for i in range(len(original_list)):
-            theta = original_list[i][1]
-            theta = -theta / 180 * math.pi
-            distance = original_list[i][2] / 10  # unit: mm
-            index_x = int(distance * math.cos(theta) + self.half_size)
-            index_y = int(distance * math.sin(theta) + self.half_size)
-            # print(index_x,index_y)
-            index_x = min(max(index_x, 0), self.size - 1)
-            index_y = min(max(index_y, 0), self.size - 1)
-            img[index_x, index_y] = 1
+        """rasterization: reusable grid and cos/sin tables"""
+        self.grid = np.zeros((self.size, self.size), np.uint8)
+        # RPLidar 的角度为 raw / 64，raw 为15位，用 math.cos/sin 打表保证与逐点计算逐位一致
+        self.angle_resolution = 64
+        angle_index = np.arange(1 << 15)
+        self.cos_table = np.array([math.cos(-(k / self.angle_resolution) / 180 * math.pi) for k in angle_index])
+        self.sin_table = np.array([math.sin(-(k / self.angle_resolution) / 180 * math.pi) for k in angle_index])
+
+        """region of interest, see get_roi_mask"""
+        self._roi_key = None
+        self._roi_mask = None
+
+    def scan_to_index(self, original_list):
+        """
+        一次算出整个scan中每个点在图像中的下标
+        :param original_list: scan as a list of (quality, angle, distance) or an (N, 3) array
+        :return: index_x, index_y
+        """
+        if isinstance(original_list, np.ndarray):
+            scan = original_list.reshape((-1, 3)).astype(np.float64, copy=False)
+        else:
+            scan = np.fromiter(itertools.chain.from_iterable(original_list), np.float64,
+                               count=3 * len(original_list)).reshape((-1, 3))
+        angle = scan[:, 1]
+        distance = scan[:, 2] / 10  # unit: mm
+        angle_index = angle * self.angle_resolution
+        table_index = angle_index.astype(np.int64)
+        if scan.shape[0] and (table_index == angle_index).all() \
+                and table_index.min() >= 0 and table_index.max() < self.cos_table.shape[0]:
+            cos_theta = self.cos_table[table_index]
+            sin_theta = self.sin_table[table_index]
+        else:
+            theta = -angle / 180 * math.pi
+            cos_theta = np.cos(theta)
+            sin_theta = np.sin(theta)
+        index_x = (distance * cos_theta + self.half_size).astype(np.int64)
+        index_y = (distance * sin_theta + self.half_size).astype(np.int64)
+        np.clip(index_x, 0, self.size - 1, out=index_x)
+        np.clip(index_y, 0, self.size - 1, out=index_y)
+        return index_x, index_y
+
+    def turn_to_img(self, original_list, show: bool = False):
+        """
+        turn the scan data list into a ndarray
+        返回的是 self.grid，下一次调用会被覆盖，需要保留时请拷贝
+        """
+        index_x, index_y = self.scan_to_index(original_list)
+        img = self.grid
+        img.fill(0)
+        img[index_x, index_y] = 1
         if show:
-            im = np.copy(img)
+            im = img.astype(np.float64)
             im[self.half_size - 1:self.half_size + 1, self.half_size - 1:self.half_size + 1] = 1
             size = int(self.size * self.scope)
             im = Image.fromarray(im)
@@ -54,33 +154,69 @@ class Leg_detector(object):
             cv2.waitKey(1)
         return img
 
-    def detect_leg(self, kmeans: KMeans, img: np.ndarray, theta: float = 160, show: bool = False):
-        theta = theta / 180 * math.pi
-        tan_theta = math.tan(theta / 2)
-        im = np.copy(img)
-        im[0:self.half_size, :] = 0
-        column_boundry = self.column_boundry
-        im[:, 0:column_boundry] = 0
-        im[:, self.size - column_boundry:self.size] = 0
-        row_boundary = self.bottom_boundary
-        im[self.size - row_boundary:self.size, :] = 0
-        for i in range(self.half_size, self.size):
-            for j in range(self.size):
-                if (i - self.half_size) * tan_theta < abs(j - self.half_size):
-                    im[i, j] = 0
-        if im.sum() >= 2:
-            index = np.where(im == 1)
-            sample = np.c_[index[0], index[1]]
+    def get_roi_mask(self, theta: float = 160):
+        """
+        检测区域：前方 theta 角的扇形内，并去掉左右两侧和远处的区域
+        mask 按 (size, theta, 边界) 缓存，参数改变时重新计算
+        :return: boolean mask, True for the pixels kept
+        """
+        key = (self.size, self.half_size, theta, self.column_boundry, self.bottom_boundary)
+        if self._roi_key != key:
+            theta = theta / 180 * math.pi
+            tan_theta = math.tan(theta / 2)
+            mask = np.ones((self.size, self.size), dtype=bool)
+            mask[0:self.half_size, :] = False
+            column_boundry = self.column_boundry
+            mask[:, 0:column_boundry] = False
+            mask[:, self.size - column_boundry:self.size] = False
+            row_boundary = self.bottom_boundary
+            mask[self.size - row_boundary:self.size, :] = False
+            i = np.arange(self.half_size, self.size).reshape((-1, 1))
+            j = np.arange(self.size).reshape((1, -1))
+            mask[self.half_size:self.size, :] &= ~((i - self.half_size) * tan_theta < abs(j - self.half_size))
+            self._roi_mask = mask
+            self._roi_key = key
+        return self._roi_mask
+
+    def invalidate_roi_mask(self):
+        self._roi_key = None
+        self._roi_mask = None
+
+    def detect_leg(self, kmeans: LegClusterer, img: np.ndarray, theta: float = 160, show: bool = False):
+        im = img * self.get_roi_mask(theta)
+        index = np.where(im == 1)
+        sample = np.c_[index[0], index[1]]
+        return self.locate_legs(kmeans, sample, im if show else None)
+
+    def detect_leg_scan(self, scan, theta: float = 160, show: bool = False):
+        """
+        直接用scan中落在检测区域内的点聚类，不生成图像
+        同一像素内的多个点只算一次，与 detect_leg(turn_to_img(scan)) 的结果相同
+        """
+        if show:
+            return self.detect_leg(self.kmeans, self.turn_to_img(scan), theta, show=True)
+        index_x, index_y = self.scan_to_index(scan)
+        keep = self.get_roi_mask(theta)[index_x, index_y]
+        flat_index = np.unique(index_x[keep] * self.size + index_y[keep])
+        sample = np.c_[flat_index // self.size, flat_index % self.size]
+        return self.locate_legs(self.kmeans, sample)
+
+    def locate_legs(self, kmeans: LegClusterer, sample: np.ndarray, im: np.ndarray = None):
+        """
+        :param sample: (N, 2) pixel index of the points in the region
+        :param im: the region image, only needed for showing
+        """
+        if sample.shape[0] >= 2:
             kmeans.fit(sample)
             center_1 = np.around(kmeans.cluster_centers_[0]).astype(int)
             center_2 = np.around(kmeans.cluster_centers_[1]).astype(int)
-            if show:
+            if im is not None:
                 # im = np.copy(img)
                 im[center_1[0] - 3: center_1[0] + 3, center_1[1] - 3:center_1[1] + 3] = 1
                 im[center_2[0] - 3:center_2[0] + 3, center_2[1] - 3:center_2[1] + 3] = 1
                 im[self.half_size - 1:self.half_size + 1, self.half_size - 1:self.half_size + 1] = 1
                 # im_show = im + img
-                im_show = im
+                im_show = im.astype(np.float64)
                 size = int(self.size * self.scope)
                 im_show = Image.fromarray(im_show)
                 im_show = im_show.resize((size, size), Image.BILINEAR)
@@ -100,33 +236,71 @@ class Leg_detector(object):
             self.right_leg = infinite_far
             return infinite_far, infinite_far
 
-    def scan_procedure(self, file_path: str = "", show: bool = False, is_record: bool = False):
+    def publish_detection(self, timestamp: float):
+        """通知等待新检测结果的线程"""
+        with self.detection_condition:
+            self.detection_time = timestamp
+            self.detection_sequence += 1
+            self.detection_condition.notify_all()
+
+    def wait_for_detection(self, sequence: int, timeout: float = None) -> int:
+        """
+        等待比 sequence 更新的检测结果
+        :return: the newest detection sequence, unchanged on timeout
+        """
+        with self.detection_condition:
+            self.detection_condition.wait_for(lambda: self.detection_sequence > sequence, timeout)
+            return self.detection_sequence
+
+    def stop(self):
+        """scan_procedure 处理完当前的 scan 后结束"""
+        if self.pipeline is not None:
+            self.pipeline.stop()
+
+    def scan_procedure(self, file_path: str = "", show: bool = False, is_record: bool = False,
+                       queue_size: int = 2, max_buf_meas: int = 500, writer=None, reader_timeout: float = 2.0):
+        """
+        雷达由单独的线程读取，本线程每次只处理最新的 scan，处理不过来时旧的 scan 被丢弃
+        丢弃数、队列深度、scan 的延迟见 self.pipeline.get_counters()
+        :param writer: Utils/AsyncWriter.AsyncWriter that writes leg.rec, None to write in this thread
+        :param reader_timeout: time to wait for the reader thread before disconnecting the lidar (s)
+        """
         info = self.rplidar.get_info()
         print(info)
         health = self.rplidar.get_health()
         print(health)
         if is_record:
-            data_path = file_path + os.path.sep + "leg.txt"
-            file_leg = open(data_path, 'w')
+            data_path = file_path + os.path.sep + "leg.rec"
+            recorder = BinaryRecorder.BinaryRecorder(data_path, [("left_leg", "<f8", (2,)), ("right_leg", "<f8", (2,))],
+                                                     name="Leg_detector", writer=writer)
+        self.pipeline = ScanPipeline.ScanPipeline(self.rplidar.iter_scans(max_buf_meas=max_buf_meas),
+                                                  queue_size=queue_size).start()
         try:
-            for i, scan in enumerate(self.rplidar.iter_scans(max_buf_meas=5000)):
+            for time_index, scan in self.pipeline.scans():
                 # print('%d: Got %d measurments' % (i, len(scan)))
                 # print(scan)
-                img = self.turn_to_img(scan)
-                self.detect_leg(self.kmeans, img, show=show)
+                self.detect_leg_scan(scan, show=show)
+                self.tracker.update(self.left_leg, self.right_leg, time_index)
+                self.publish_detection(time_index)
                 # print(self.left_leg, self.right_leg)
                 if is_record:
-                    time_index = time.time()
-                    leg_data = np.r_[self.left_leg, self.right_leg]
-                    write_data = leg_data.tolist()
-                    write_data.insert(0, time_index)
-                    file_leg.write(str(write_data) + '\n')
-                    file_leg.flush()
-
-        except KeyboardInterrupt as e:
-            self.rplidar.stop()
-            self.rplidar.stop_motor()
-            self.rplidar.disconnect()
+                    recorder.append(time_index, self.left_leg, self.right_leg)
+
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # 异常（包括读取线程的异常）、KeyboardInterrupt、stop() 都要停下雷达：
+            # 先等读取线程退出 iter_scans，再停止电机、断开串口
+            self.pipeline.stop()
+            if not self.pipeline.join(reader_timeout):
+                print("lidar reader did not stop within %.1f s" % reader_timeout)
+            try:
+                self.rplidar.stop()
+                self.rplidar.stop_motor()
+                self.rplidar.disconnect()
+            finally:
+                if is_record:
+                    recorder.close()
 
 
 if __name__ == "__main__":
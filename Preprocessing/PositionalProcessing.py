@@ -1,8 +1,14 @@
 import cv2 as cv
 import numpy as np
 import math
+import os, sys
 from typing import List, Tuple, NoReturn
 
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Utils import LogLoader
+
 
 class CC_matrix(object):
 
@@ -234,31 +240,10 @@ if __name__ == '__main__':
     # print(np.matmul(tr.Mext, np.transpose(tr.Mext)), '\n')
     #
     # print(np.matmul(tr.Mext[0:3,0:3],np.transpose(tr.Mext[0:3,0:3])))
-    def get_data(direction):
-        # 原始信息获取
-        file = open(direction)
-        list_ir_data = file.readlines()
-        lists = []
-        for lines in list_ir_data:
-            lines = lines.strip("\n")
-            lines = lines.strip('[')
-            lines = lines.strip(']')
-            lines = lines.split(", ")
-            lists.append(lines)
-        file.close()
-        array_data = np.array(lists)
-        rows_data = array_data.shape[0]
-        columns_data = array_data.shape[1]
-        data = np.zeros((rows_data, columns_data))
-        for i in range(rows_data):
-            for j in range(columns_data):
-                data[i][j] = float(array_data[i][j])
-        return data
-
 
-    """load the data"""
-    direction_ir_data = "./Record_data/data/ir_data.txt"
-    ir_data = get_data(direction_ir_data)
+    """load the data, 以前的 .txt 记录没有 .rec 时也可以读取 (LogLoader.find_record)"""
+    direction_ir_data = "./Record_data/data/ir_data.rec"
+    ir_data = LogLoader.load_log(direction_ir_data)
     img = np.zeros((24, 32))
     UP = User_Postition_Estimate(img)
     for i in range(ir_data.shape[0]):
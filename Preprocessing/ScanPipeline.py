@@ -0,0 +1,144 @@
+"""
+@File    :   ScanPipeline.py
+
+@Description
+------------
+RPLidar 读取与腿部检测分开在两个线程：
+读取线程只负责从雷达取 scan 并放入有界队列，队列满时丢弃最旧的 scan；
+处理线程每次只取最新的 scan，保证控制总是基于最新的数据
+
+"""
+import threading
+import time
+from collections import deque
+
+
+class DropOldestQueue(object):
+    """有界队列，满了以后丢掉最旧的元素，put 永远不会阻塞"""
+
+    def __init__(self, maxsize: int = 2):
+        self.items = deque(maxlen=maxsize)
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item):
+        with self.condition:
+            if len(self.items) == self.items.maxlen:
+                self.dropped += 1
+            self.items.append(item)
+            self.condition.notify()
+
+    def get(self, timeout: float = None):
+        """取最旧的元素，超时或队列关闭时返回 None"""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.items or self.closed, timeout):
+                return None
+            return self.items.popleft() if self.items else None
+
+    def get_latest(self, timeout: float = None):
+        """取最新的元素，更旧的元素都丢弃"""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.items or self.closed, timeout):
+                return None
+            if not self.items:
+                return None
+            self.dropped += len(self.items) - 1
+            item = self.items.pop()
+            self.items.clear()
+            return item
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def __len__(self):
+        return len(self.items)
+
+
+class ScanPipeline(object):
+
+    def __init__(self, scan_source, queue_size: int = 2):
+        """
+        :param scan_source: iterable of scans, e.g. RPLidar.iter_scans(), iterated in the reader thread
+        :param queue_size: scans kept when processing falls behind
+        """
+        self.scan_source = scan_source
+        self.queue = DropOldestQueue(queue_size)
+        self.reader_thread = None
+        self.running = False
+        """读取线程中的异常，scans() 读完队列后在处理线程中抛出"""
+        self.error = None
+
+        """counters"""
+        self.received = 0
+        self.processed = 0
+        self.max_queue_depth = 0
+        self.last_scan_age = 0.0
+        self.max_scan_age = 0.0
+        self.total_scan_age = 0.0
+
+    def start(self):
+        self.running = True
+        self.reader_thread = threading.Thread(target=self.read_loop, daemon=True)
+        self.reader_thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self.queue.close()
+
+    def join(self, timeout: float = None) -> bool:
+        """
+        等读取线程退出（读完当前的 scan），之后才能断开雷达
+        :return: False if the reader is still running after timeout
+        """
+        if self.reader_thread is None:
+            return True
+        self.reader_thread.join(timeout)
+        return not self.reader_thread.is_alive()
+
+    def read_loop(self):
+        try:
+            for scan in self.scan_source:
+                if not self.running:
+                    break
+                self.queue.put((time.time(), scan))
+                self.received += 1
+                self.max_queue_depth = max(self.max_queue_depth, len(self.queue))
+        except Exception as e:
+            self.error = e
+        finally:
+            # 在读取线程中结束 iter_scans 的生成器，之后才能停止雷达
+            if hasattr(self.scan_source, "close"):
+                self.scan_source.close()
+            self.queue.close()
+
+    def scans(self, timeout: float = None):
+        """
+        处理线程中使用：依次给出 (timestamp, scan)，每次都是当前最新的 scan
+        :raise: the exception of the reader thread, after the scans read before it
+        """
+        while self.running or len(self.queue):
+            item = self.queue.get_latest(timeout)
+            if item is None:
+                if self.queue.closed:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                continue
+            timestamp, scan = item
+            age = time.time() - timestamp
+            self.last_scan_age = age
+            self.max_scan_age = max(self.max_scan_age, age)
+            self.total_scan_age += age
+            self.processed += 1
+            yield timestamp, scan
+
+    def get_counters(self):
+        return {"received": self.received, "processed": self.processed,
+                "dropped": self.queue.dropped, "queue_depth": len(self.queue),
+                "max_queue_depth": self.max_queue_depth,
+                "last_scan_age": self.last_scan_age, "max_scan_age": self.max_scan_age,
+                "mean_scan_age": self.total_scan_age / self.processed if self.processed else 0.0}
@@ -5,10 +5,18 @@ import time
 import numpy as np
 import threading
 
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Utils import BinaryRecorder
+
 resource = os.path.abspath(
     os.path.dirname(os.path.abspath(__file__)) + os.path.sep + ".."
     )
 
+"""IMU.rec: timestamp, acceleration (g), angular velocity (deg/s), angle (deg)"""
+IMU_FIELDS = [("a", "<f8", (3,)), ("w", "<f8", (3,)), ("Angle", "<f8", (3,))]
+
 class IMU(object):
 
     def __init__(self, baud_rate=115200):
@@ -31,6 +39,22 @@ class IMU(object):
         self.Angle = [0.0] * 3
 
         self.one_flame_data = []
+
+        """callbacks(timestamp, a, w, Angle) after every sample, e.g. Driver/PoseFusion.YawFusion.imu_listener"""
+        self.listeners = []
+        """read_record 在 stop() 之后结束"""
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def notify_listeners(self, timestamp):
+        for callback in self.listeners:
+            callback(timestamp, self.a, self.w, self.Angle)
+
     """Print the port information"""
 
     def print_serial(self, port):
@@ -205,26 +229,29 @@ class IMU(object):
             angle_z -= 2 * k_angle
         return angle_x, angle_y, angle_z
 
-    def read_record(self,time_delay=0,show=False):
+    def read_record(self,time_delay=0,show=False,writer=None):
+        """:param writer: Utils/AsyncWriter.AsyncWriter that writes IMU.rec, None to write in this thread"""
         portnameprint = str(self.port_name)
         portnameprint = portnameprint[-4:len(portnameprint)]
-        IMU_data_path = resource +os.path.sep+"data"+ os.path.sep + "IMU.txt"
+        IMU_data_path = resource +os.path.sep+"data"+ os.path.sep + "IMU.rec"
         print(IMU_data_path)
-        file_IMU = open(IMU_data_path, "w")
-        while True:
-            self.collect_all(show)
-            # Add time stamp
-            combine_data = list([time.time()]) + list(self.a) + list(self.w) + list(self.Angle)
-            # print(combine_data)
-            file_IMU.write(str(combine_data) + "\n")
-            file_IMU.flush()
-            time.sleep(time_delay)
+        # 退出（异常、KeyboardInterrupt）时写入 chunk 中还没写的记录
+        with BinaryRecorder.BinaryRecorder(IMU_data_path, IMU_FIELDS, name="IMU", writer=writer) as recorder:
+            while self.running:
+                self.collect_all(show)
+                # Add time stamp
+                sample_time = time.time()
+                self.notify_listeners(sample_time)
+                recorder.append(sample_time, self.a, self.w, self.Angle)
+                time.sleep(time_delay)
 
     def collect_data(self,time_delay=0,show=False):
         while True:
             self.collect_all(show)
             # Add time stamp
-            self.one_flame_data = list([time.time()]) + list(self.a) + list(self.w) + list(self.Angle)
+            sample_time = time.time()
+            self.notify_listeners(sample_time)
+            self.one_flame_data = list([sample_time]) + list(self.a) + list(self.w) + list(self.Angle)
             # print(self.one_flame_data)
             time.sleep(time_delay)
 
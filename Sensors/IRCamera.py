@@ -12,9 +12,15 @@
 import serial.tools.list_ports
 import os,sys
 import time
+import threading
 import numpy as np
-import cv2
-from PIL import Image
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Sensors import IRFrame, IRViewer
+from Utils import BinaryRecorder
+
 resource = os.path.abspath(
     os.path.dirname(os.path.abspath(__file__)) + os.path.sep + ".."
     )
@@ -35,13 +41,24 @@ class IRCamera(object):
 
         """data processing"""
         self.head_size = 4
-        self.head_self = []
         self.data_self = []
+        self.reader = IRFrame.IRFrameReader(self.serial)
 
         """data output"""
         self.temperature = []
+        self.frame = np.zeros((IRFrame.FRAME_HEIGHT, IRFrame.FRAME_WIDTH), np.float32)
+
+        """background acquisition"""
+        self.ring = None
+        self.acquisition_thread = None
+        self.viewer = None
+        """record_write 在 stop() 之后的下一帧结束"""
+        self.running = True
         return
 
+    def stop(self):
+        self.running = False
+
     """Print the port information"""
     def print_serial(self, port):
         print("---------------[ %s ]---------------" % port.name)
@@ -99,123 +116,69 @@ class IRCamera(object):
 
         return True
 
-    def __fix_pixel(self, ir_list=[]):
+    def decode_data(self, ir_data):
         """
-        存在可能，某个pixel的数据因为坏掉丢失，用周围的数据进行插值
-        :param ir_list: temperature list, the ir data source
-        :param x: the position x from 1
-        :param y: the position y from 1
-        :return: the average temperature to fix one pixel
-
+        将一帧原始字节解码，更新 self.frame
+        :param ir_data: the 1540 bytes after the frame head
+        :return: temperature list with 768 pixels (环境温度已去掉，坏点已修复)
         """
-        # 768个像素依次排列的坐标，经验所得：坏的像素会因环境变化突出，在白背景下
-        # 坏的像素的值会超过600
-        need_fix_index = [183, 202, 303, 601]
-        for i in need_fix_index:
-            x = i % 32
-            y = i // 32
-            temp = (ir_list[x - 1 + (y - 1) * 32] +
-                    ir_list[x + (y - 1) * 32] +
-                    ir_list[x + 1 + (y - 1) * 32] +
-                    ir_list[x - 1 + y * 32] +
-                    ir_list[x + 1 + y * 32] +
-                    ir_list[x - 1 + (y + 1) * 32] +
-                    ir_list[x + (y + 1) * 32] +
-                    ir_list[x + 1 + (y + 1) * 32]) / 8
-            ir_list.insert(x + y * 32, temp)
-            ir_list.pop(x + y * 32 + 1)
-        return ir_list
+        frame = IRFrame.decode_frame(ir_data, dtype=np.float64)
+        self.frame[...] = frame
+        return frame.ravel().tolist()
 
     def get_irdata_once(self, time_index=False):
         temperature = []
         rest_num = 5
 
-        while True:
-            s = self.serial.read(1).hex()
-            if s != "":
-                s = int(s, 16)
-            self.head_self.append(s)
-            # 对头数据必须如此嵌套，否则无法区分上一帧的数据
-            if len(self.head_self) == self.head_size:
-                if self.check_head_data(self.head_self):
-                    temp = self.serial.read(1540)
-                    self.data_self.append(temp.hex())
-                    self.head_self.clear()
-                else:
-                    self.head_self.pop(0)
-
-                if len(self.data_self) == rest_num:
-                    ir_data = self.data_self[rest_num - 1]
-                    if len(ir_data) != 1540 * 2:
-                        # 正常传过来一个字节 0xa5 是一个字节，一个元素表示4位， 然后用string表示一个字母就是一个字节
-                        print("the array of ir_data is not 1540", len(ir_data))
-
-                    for i in range(769):
-                        t = (int(ir_data[i * 4 + 2:i * 4 + 4], 16) * 256 + int(ir_data[i * 4:i * 4 + 2], 16)) / 100
-                        temperature.append(t)
-
-                    """环境温度"""
-                    temperature.pop()
-                    temperature = self.__fix_pixel(temperature)
-                    """插入时间戳"""
-                    if time_index:
-                        time_index = time.time()
-                        temperature.insert(0, time_index)
-                    # print(str(temperature))
-                    self.data_self.pop(rest_num - 1)
-                    self.data_self.pop(0)
-                if len(temperature) > 0:
-                    self.temperature = temperature
-                    # time.sleep(0.2)
-                    break
-            self.demonstrate_data()
+        while len(temperature) == 0:
+            ir_data = self.reader.next_frame()
+            if ir_data is None:
+                break
+            self.data_self.append(ir_data)
+
+            if len(self.data_self) == rest_num:
+                ir_data = self.data_self[rest_num - 1]
+                temperature = self.decode_data(ir_data)
+                """插入时间戳"""
+                if time_index:
+                    time_index = time.time()
+                    temperature.insert(0, time_index)
+                # print(str(temperature))
+                self.data_self.pop(rest_num - 1)
+                self.data_self.pop(0)
+                self.temperature = temperature
+                # time.sleep(0.2)
         return temperature
 
-    def record_write(self, write = False, time_index=False, demo=False):
-        head = []
+    def record_write(self, write = False, time_index=False, demo=False, writer=None):
+        """:param writer: Utils/AsyncWriter.AsyncWriter that writes ir_data.rec, None to write in this thread"""
         data = []
         rest_num = 5
-        ir_data_path = resource + os.path.sep + "ir_data.txt"
+        ir_data_path = resource + os.path.sep + "ir_data.rec"
         if write:
-            file_ir = open(ir_data_path, "w")
+            # 每帧保存为 float32 的 (24, 32) 温度矩阵，时间戳总是保存
+            recorder = BinaryRecorder.BinaryRecorder(
+                ir_data_path, [("temperature", "<f4", (IRFrame.FRAME_HEIGHT, IRFrame.FRAME_WIDTH))],
+                name="IRCamera", chunk_size=32, writer=writer)
+        if demo:
+            self.start_viewer()
         # time_previous = time.time()
-        while True:
-            s = self.serial.read(1).hex()
-            if s != "":
-                s = int(s, 16)
-            head.append(s)
-
-            if len(head) == self.head_size:
-                if self.check_head_data(head):
-                    temp = self.serial.read(1540)
-                    data.append(temp.hex())
-                    head.clear()
-                else:
-                    head.pop(0)
+        try:
+            for ir_data in self.reader:
+                if not self.running:
+                    break
+                data.append(ir_data)
 
                 # 将读到的数据进行展示
                 if len(data) == rest_num:
                     ir_data = data[rest_num - 1]
-                    if len(ir_data) != 1540 * 2:
-                        # 正常传过来一个字节 0xa5 是一个字节，一个元素表示4位， 然后用string表示一个字母就是一个字节
-                        print("the array of ir_data is not 1540", len(ir_data))
-
-                    temperature = []
-
-                    for i in range(769):
-                        t = (int(ir_data[i * 4 + 2:i * 4 + 4], 16) * 256 + int(ir_data[i * 4:i * 4 + 2], 16)) / 100
-                        temperature.append(t)
-
-                    """环境温度"""
-                    temperature.pop()
-                    temperature = self.__fix_pixel(temperature)
+                    temperature = self.decode_data(ir_data)
+                    frame_time = time.time()
                     """插入时间戳"""
                     if time_index:
-                        time_index = time.time()
-                        temperature.insert(0, time_index)
+                        temperature.insert(0, frame_time)
                     if write:
-                        file_ir.write(str(temperature) + "\n")
-                        file_ir.flush()
+                        recorder.append(frame_time, self.frame)
                     self.temperature = temperature
                     data.pop(rest_num - 1)
                     data.pop(0)
@@ -224,47 +187,58 @@ class IRCamera(object):
                     # print("frequency:",1/(time_new-time_previous))
                     # time_previous = time_new
                     if demo:
-                        self.demonstrate_data()
-        if write:
-            file_ir.close()
+                        self.ring.write_slot()[...] = self.frame
+                        self.ring.publish(time.time())
+        finally:
+            # 退出（异常、KeyboardInterrupt）时写入 chunk 中还没写的记录
+            if write:
+                recorder.close()
+
+    def start_acquisition(self, ring_size=16):
+        """
+        后台线程读取并解码每一帧，写入预先分配的环形缓冲区
+        之后用 latest_frame / last_frames / wait_frame 取数据，不要再调用 get_irdata_once
+        :param ring_size: number of frames kept, last_frames can return up to ring_size - 1
+        """
+        if self.acquisition_thread is not None:
+            return self.ring
+        if self.ring is None:
+            self.ring = IRFrame.IRFrameRing(ring_size)
+        self.acquisition_thread = threading.Thread(target=self.acquisition_loop, daemon=True)
+        self.acquisition_thread.start()
+        return self.ring
+
+    def acquisition_loop(self):
+        ring = self.ring
+        for ir_data in self.reader:
+            IRFrame.decode_frame(ir_data, out=ring.write_slot())
+            ring.publish(time.time())
+
+    def latest_frame(self):
+        """:return: (sequence number, (24, 32) view of the newest frame, timestamp)"""
+        return self.ring.latest()
+
+    def last_frames(self, n):
+        """:return: (sequence number, (n, 24, 32) view of the last n frames, timestamps)"""
+        return self.ring.last(n)
+
+    def wait_frame(self, sequence=0, timeout=None):
+        """等待比 sequence 更新的帧，返回最新帧的序号"""
+        return self.ring.wait(sequence, timeout)
+
+    def start_viewer(self, max_fps=10, scope=10):
+        """在单独的线程里显示最新帧，采集线程不做GUI操作"""
+        if self.ring is None:
+            self.ring = IRFrame.IRFrameRing()
+        if self.viewer is None:
+            self.viewer = IRViewer.IRViewer(self.ring, max_fps=max_fps, scope=scope).start()
+        return self.viewer
 
     def demonstrate_data(self, scope=10):
-        temperature = []
-
-        if len(self.temperature) != 0:
-            for i in self.temperature:
-                temperature.append(i)
-            if len(self.temperature) == 769:
-                """leave time stamp"""
-                temperature.pop(0)
-            # maxtemp = max(temperature)
-            # mintemp = min(temperature)
-            # maxtemp = 36
-            # mintemp = 15
-            # for i in range(len(temperature)):
-                # temperature[i] = (temperature[i] - mintemp) / (maxtemp - mintemp)
-            for i in range(len(temperature)):
-                if temperature[i] <= 25:
-                    temperature[i] = 0
-                else:
-                    temperature[i] = 1
-            # npdata = np.array(self.temperature).reshape(24, 32)
-            # threshold0 = 28
-            # threshold1 = 27
-            # for i in range(len(temperature)):
-            #     if temperature[i] >= threshold0:
-            #         temperature[i] = 1
-            #     elif temperature[i] >= threshold1:
-            #         temperature[i] = 0.5
-            #     else:
-            #         temperature[i] = 0
-            temperature = np.array(temperature, np.float32).reshape(24, 32)
-            im = Image.fromarray(temperature)
-            im = im.resize((32 * scope, 24 * scope), Image.BILINEAR)
-            im = np.array(im)
-            cv2.imshow("Foot", im)
-            cv2.waitKey(1)
-            return temperature
+        """显示一次 self.frame，只用于调试；采集循环中请使用 start_viewer"""
+        viewer = IRViewer.IRViewer(self.ring, scope=scope)
+        viewer.show(self.frame)
+        return IRViewer.binarize_frame(self.frame)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+"""
+@File    :   IRFrame.py
+
+@Description
+------------
+IR Camera 帧解码
+一帧数据为帧头 5A 5A 02 06 之后的1540个字节，
+小端uint16，前768个为像素温度，第769个为环境温度，单位0.01°C
+
+"""
+import threading
+import numpy as np
+
+FRAME_HEAD = bytes([0x5A, 0x5A, 0x02, 0x06])
+FRAME_DATA_SIZE = 1540
+FRAME_HEIGHT = 24
+FRAME_WIDTH = 32
+PIXEL_NUM = FRAME_HEIGHT * FRAME_WIDTH
+
+"""坏点及其8邻域在768像素中的下标，与 IRCamera.__fix_pixel 一致"""
+DEAD_PIXEL_INDEX = np.array([183, 202, 303, 601])
+_NEIGHBOUR_OFFSET = np.array([-FRAME_WIDTH - 1, -FRAME_WIDTH, -FRAME_WIDTH + 1,
+                              -1, 1,
+                              FRAME_WIDTH - 1, FRAME_WIDTH, FRAME_WIDTH + 1])
+DEAD_PIXEL_NEIGHBOUR = DEAD_PIXEL_INDEX[:, None] + _NEIGHBOUR_OFFSET[None, :]
+
+
+def fix_dead_pixel(pixels: np.ndarray) -> np.ndarray:
+    """
+    用8邻域均值替换坏点，in place
+    :param pixels: flat array with 768 temperatures
+    :return: pixels
+    """
+    neighbour = pixels[DEAD_PIXEL_NEIGHBOUR]
+    # 按列依次相加，保证与原来逐项相加的结果逐位一致
+    temp = neighbour[:, 0]
+    for k in range(1, neighbour.shape[1]):
+        temp = temp + neighbour[:, k]
+    pixels[DEAD_PIXEL_INDEX] = temp / 8
+    return pixels
+
+
+def decode_frame(frame_data: bytes, out: np.ndarray = None, dtype=np.float32):
+    """
+    将一帧原始字节直接解码为温度矩阵
+    :param frame_data: the 1540 bytes after the frame head
+    :param out: optional preallocated (24, 32) array to write into
+    :param dtype: output dtype when out is not given
+    :return: (24, 32) temperature array, unit: °C
+    """
+    if len(frame_data) < (PIXEL_NUM + 1) * 2:
+        raise ValueError("the array of ir_data is not 1540: %d" % len(frame_data))
+    raw = np.frombuffer(frame_data, dtype='<u2', count=PIXEL_NUM)
+    pixels = raw / 100
+    fix_dead_pixel(pixels)
+    if out is None:
+        return pixels.astype(dtype).reshape(FRAME_HEIGHT, FRAME_WIDTH)
+    out[...] = pixels.reshape(FRAME_HEIGHT, FRAME_WIDTH)
+    return out
+
+
+def decode_ambient(frame_data: bytes) -> float:
+    """环境温度"""
+    return int.from_bytes(frame_data[PIXEL_NUM * 2:PIXEL_NUM * 2 + 2], 'little') / 100
+
+
+
+class IRFrameReader(object):
+    """
+    从串口（或任意有 read(n) 的 file-like 对象）成块读取数据，
+    在缓冲区里用 bytes.find 查找帧头，依次给出完整的一帧数据
+    """
+
+    def __init__(self, source, chunk_size: int = 4096):
+        """
+        :param source: serial.Serial or any file-like object with read(n),
+                       e.g. open(dump_path, 'rb') to replay a recorded byte dump
+        :param chunk_size: read size when the source has no in_waiting
+        """
+        self.source = source
+        self.chunk_size = chunk_size
+        self.frame_size = len(FRAME_HEAD) + FRAME_DATA_SIZE
+        self.buffer = bytearray()
+        self.start = 0
+
+        """counters"""
+        self.frames = 0
+        self.dropped_bytes = 0
+        self.resyncs = 0
+        self.read_calls = 0
+        self.__lost_sync = False
+
+    def fill(self) -> int:
+        """读一块数据放入缓冲区，返回读到的字节数，0表示数据源已结束"""
+        in_waiting = getattr(self.source, "in_waiting", None)
+        if in_waiting is None:
+            size = self.chunk_size
+        else:
+            # 串口上至少等一帧的数据，避免逐字节读取
+            size = max(in_waiting, self.frame_size)
+        chunk = self.source.read(size)
+        self.read_calls += 1
+        if chunk:
+            if self.start > len(self.buffer) // 2:
+                del self.buffer[:self.start]
+                self.start = 0
+            self.buffer += chunk
+        return len(chunk)
+
+    def next_frame(self):
+        """
+        :return: the 1540 bytes after the next frame head, None when the source is exhausted
+        """
+        while True:
+            index = self.buffer.find(FRAME_HEAD, self.start)
+            if index < 0:
+                # 保留末尾可能是半个帧头的字节
+                keep = max(len(self.buffer) - len(FRAME_HEAD) + 1, self.start)
+                self._drop(keep)
+            else:
+                self._drop(index)
+                end = index + self.frame_size
+                if end <= len(self.buffer):
+                    frame = bytes(self.buffer[index + len(FRAME_HEAD):end])
+                    self.start = end
+                    self.frames += 1
+                    if self.__lost_sync:
+                        self.resyncs += 1
+                        self.__lost_sync = False
+                    return frame
+            if self.fill() == 0:
+                return None
+
+    def _drop(self, index):
+        if index > self.start:
+            self.dropped_bytes += index - self.start
+            self.__lost_sync = True
+            self.start = index
+
+    def __iter__(self):
+        while True:
+            frame = self.next_frame()
+            if frame is None:
+                return
+            yield frame
+
+    def get_counters(self):
+        return {"frames": self.frames, "dropped_bytes": self.dropped_bytes,
+                "resyncs": self.resyncs, "read_calls": self.read_calls}
+
+
+class IRFrameRing(object):
+    """
+    预先分配好的帧环形缓冲区，一个线程写，多个线程读
+    每帧同时写在 i 和 i + size 两个位置，所以最近的 n 帧总是一段连续的内存，
+    取最新帧或最近 n 帧都直接返回 view，不需要拷贝
+    """
+
+    def __init__(self, size: int = 16):
+        self.size = size
+        self.frames = np.zeros((2 * size, FRAME_HEIGHT, FRAME_WIDTH), np.float32)
+        self.timestamps = np.zeros(2 * size)
+        self.count = 0  # 已经写入的帧数，即最新帧的序号
+        self.condition = threading.Condition()
+
+    def write_slot(self) -> np.ndarray:
+        """下一帧要写入的位置，写完之后调用 publish"""
+        return self.frames[self.count % self.size]
+
+    def publish(self, timestamp: float):
+        index = self.count % self.size
+        self.frames[index + self.size] = self.frames[index]
+        self.timestamps[index] = timestamp
+        self.timestamps[index + self.size] = timestamp
+        with self.condition:
+            self.count += 1
+            self.condition.notify_all()
+
+    def latest(self):
+        """
+        :return: (sequence number, (24, 32) view, timestamp), sequence 0 means no frame yet
+        """
+        count = self.count
+        if count == 0:
+            return 0, None, 0.0
+        index = (count - 1) % self.size + self.size
+        return count, self.frames[index], self.timestamps[index]
+
+    def last(self, n: int):
+        """
+        最近的 n 帧，从旧到新
+        写线程只会覆盖最旧的一帧，所以 n 不能超过 size - 1
+        :return: (sequence number, (n, 24, 32) view, (n,) timestamps)
+        """
+        if n > self.size - 1:
+            raise ValueError("can only get %d frames from a ring of size %d" % (self.size - 1, self.size))
+        count = self.count
+        n = min(n, count)
+        end = (count - 1) % self.size + self.size + 1
+        return count, self.frames[end - n:end], self.timestamps[end - n:end]
+
+    def wait(self, sequence: int, timeout: float = None) -> int:
+        """等到有比 sequence 更新的帧，返回最新帧的序号"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.count > sequence, timeout)
+            return self.count
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+"""
+@File    :   IRViewer.py
+
+@Description
+------------
+IR Camera 数据的显示窗口
+在单独的线程里从 IRFrameRing 取最新帧显示，并限制刷新频率，
+采集线程本身不做任何GUI操作；没有显示器的NUC上不启动即可
+
+"""
+import os, sys
+import threading
+import time
+import numpy as np
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Sensors import IRFrame
+
+
+def binarize_frame(frame: np.ndarray, threshold: float = 25) -> np.ndarray:
+    """温度高于 threshold 的像素为1，其余为0"""
+    return (frame > threshold).astype(np.float32)
+
+
+class IRViewer(object):
+
+    def __init__(self, ring: IRFrame.IRFrameRing, max_fps: float = 10, scope: int = 10,
+                 threshold: float = 25, window_name: str = "Foot"):
+        """
+        :param ring: the frame ring written by the acquisition thread
+        :param max_fps: upper limit of the refresh rate, frames in between are skipped
+        :param scope: zoom factor of the window
+        """
+        self.ring = ring
+        self.period = 1 / max_fps
+        self.scope = scope
+        self.threshold = threshold
+        self.window_name = window_name
+        self.shown_frames = 0
+        self.skipped_frames = 0
+        self.thread = None
+        self.running = False
+
+    def render(self, frame: np.ndarray) -> np.ndarray:
+        """二值化并放大，返回用于显示的图像"""
+        import cv2
+        img = binarize_frame(frame, self.threshold)
+        size = (IRFrame.FRAME_WIDTH * self.scope, IRFrame.FRAME_HEIGHT * self.scope)
+        return cv2.resize(img, size, interpolation=cv2.INTER_LINEAR)
+
+    def show(self, frame: np.ndarray):
+        import cv2
+        cv2.imshow(self.window_name, self.render(frame))
+        cv2.waitKey(1)
+
+    def start(self):
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self.view_loop, daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def view_loop(self):
+        sequence = 0
+        next_time = time.monotonic()
+        while self.running:
+            new_sequence = self.ring.wait(sequence, timeout=0.5)
+            if new_sequence == sequence:
+                continue
+            now = time.monotonic()
+            if now < next_time:
+                time.sleep(next_time - now)
+            new_sequence, frame, _ = self.ring.latest()
+            self.skipped_frames += max(new_sequence - sequence - 1, 0)
+            sequence = new_sequence
+            self.show(frame)
+            self.shown_frames += 1
+            next_time = max(next_time + self.period, time.monotonic())
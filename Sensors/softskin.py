@@ -12,6 +12,7 @@ import matplotlib.pyplot as plt
 pwd = os.path.abspath(os.path.abspath(__file__))
 father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
 sys.path.append(father_path)
+from Utils import BinaryRecorder
 
 
 def print_serial(port):
@@ -53,9 +54,14 @@ class SoftSkin(object):
         self.base_data = []  # 建立一组基准值用于初始化
         self.temp_data = []
         self.port_num = 32
+        """read_and_record(record=True) 在 stop() 之后结束"""
+        self.running = True
 
         pass
 
+    def stop(self):
+        self.running = False
+
     def read_data(self, is_shown=1):
         try:
             one_line_data = self.serial.readline().decode("utf-8")
@@ -101,24 +107,23 @@ class SoftSkin(object):
         print("base line data: ", self.base_data)
         pass
 
-    def read_and_record(self, record=False, show=False, plot=False, plot_num=30):
+    def read_and_record(self, record=False, show=False, plot=False, plot_num=30, writer=None):
+        """:param writer: Utils/AsyncWriter.AsyncWriter that writes softskin.rec, None to write in this thread"""
         data_path = self.father_path + os.path.sep + \
-                    "data"+os.path.sep + "softskin.txt"
+                    "data"+os.path.sep + "softskin.rec"
         plot_array = np.zeros((plot_num, self.port_num))
         if record:
 
-            with open(data_path, 'w') as file:
-                while True:
+            with BinaryRecorder.BinaryRecorder(data_path, [("pressure", "<i2", (self.port_num,))],
+                                               name="SoftSkin", writer=writer) as recorder:
+                while self.running:
                     # self.serial.flushInput()
                     self.read_data(0)
                     if len(self.raw_data) == len(self.base_data):
                         temp_data = np.array(self.raw_data) - np.array(self.base_data)
                         if show == True: print(temp_data)
                         time_index = time.time()
-                        write_data = temp_data.tolist()
-                        write_data.insert(0,time_index)
-                        file.write(str(write_data) + '\n')
-                        file.flush()
+                        recorder.append(time_index, temp_data)
                         self.temp_data = temp_data
                         # time.sleep(0.08)
                         if plot == True:
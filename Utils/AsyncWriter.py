@@ -0,0 +1,180 @@
+"""
+@File    :   AsyncWriter.py
+
+@Description
+------------
+后台写文件的线程，传感器线程只把数据放入有界队列，不会等待磁盘
+队列满时丢弃新的数据并计数，不阻塞传感器线程；
+写线程等数据量达到 batch_bytes 或最早的数据等了 batch_window 秒后，一次写入所有数据，
+每个文件只 flush 一次；记录从放入队列到写完的延迟和队列深度
+
+与 Utils/BinaryRecorder 一起使用：BinaryRecorder(..., writer=AsyncWriter().start())
+
+"""
+import os, sys
+import threading
+import time
+from collections import deque
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Utils import LatencyHistogram
+
+
+class AsyncWriter(object):
+
+    def __init__(self, max_queue: int = 1024, batch_bytes: int = 1 << 20, batch_window: float = 0.5):
+        """
+        :param max_queue: chunks waiting to be written, more are dropped
+        :param batch_bytes: write as soon as this many bytes are waiting
+        :param batch_window: otherwise write when the oldest chunk has waited this long (s)
+        """
+        self.max_queue = max_queue
+        self.batch_bytes = batch_bytes
+        self.batch_window = batch_window
+        """(file, data, enqueue time, records, stream)，data 为 None 表示关闭文件"""
+        self.queue = deque()
+        self.queued_bytes = 0
+        """只在放入/取出队列时持有，写文件时不持有"""
+        self.condition = threading.Condition()
+        self.thread = None
+        self.running = False
+        """写线程已经退出（或没有启动），之后的数据在调用者的线程中直接写入"""
+        self.finished = True
+
+        """counters"""
+        self.written_bytes = 0
+        self.written_chunks = 0
+        self.batches = 0
+        self.dropped_chunks = 0
+        self.dropped_records = 0
+        self.max_queue_depth = 0
+        self.write_errors = 0
+        """enqueue -> written and flushed"""
+        self.latency = LatencyHistogram.LatencyHistogram()
+        """time of one batch write"""
+        self.batch_time = LatencyHistogram.LatencyHistogram()
+
+    def start(self):
+        self.running = True
+        self.finished = False
+        self.thread = threading.Thread(target=self.write_loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, timeout: float = None):
+        """写完队列中剩下的数据后结束"""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def submit(self, file, data: bytes, records: int = 0, stream=None) -> bool:
+        """
+        传感器线程调用，不会等待磁盘
+        :param stream: object with a 'dropped' counter, e.g. the BinaryRecorder, None to skip
+        :return: False if the queue is full and the data was dropped
+        """
+        with self.condition:
+            if self.finished:
+                self._write_inline(file, data, stream)
+                return True
+            if len(self.queue) >= self.max_queue:
+                self.dropped_chunks += 1
+                self.dropped_records += records
+                if stream is not None:
+                    stream.dropped += records
+                return False
+            self.queue.append((file, data, time.monotonic(), records, stream))
+            self.queued_bytes += len(data)
+            self.max_queue_depth = max(self.max_queue_depth, len(self.queue))
+            if self.queued_bytes >= self.batch_bytes or len(self.queue) == 1:
+                self.condition.notify()
+        return True
+
+    def close_file(self, file):
+        """队列中这个文件的数据写完之后关闭，不会因为队列满而丢弃；写线程已经退出时直接关闭"""
+        with self.condition:
+            if self.finished:
+                file.close()
+                return
+            self.queue.append((file, None, time.monotonic(), 0, None))
+            self.condition.notify()
+
+    def _write_inline(self, file, data: bytes, stream=None):
+        """stop() 之后提交的数据"""
+        file.write(data)
+        file.flush()
+        self.written_bytes += len(data)
+        self.written_chunks += 1
+        if stream is not None:
+            stream.bytes_written += len(data)
+
+    def _take_batch(self) -> list:
+        """等到数据足够多或最早的数据等了 batch_window，取出队列中所有的数据"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.queue or not self.running)
+            while self.running and self.queued_bytes < self.batch_bytes:
+                remaining = self.queue[0][2] + self.batch_window - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            batch = list(self.queue)
+            self.queue.clear()
+            self.queued_bytes = 0
+            if not batch and not self.running:
+                # 在锁内标记，之后的 submit / close_file 不会再放入没人处理的队列
+                self.finished = True
+        return batch
+
+    def write_loop(self):
+        while True:
+            batch = self._take_batch()
+            if not batch and not self.running:
+                break
+            self.write_batch(batch)
+
+    def write_batch(self, batch: list):
+        """所有数据写入后每个文件只 flush 一次"""
+        start = time.monotonic()
+        touched = []
+        closing = []
+        enqueue_times = []
+        for file, data, enqueue_time, records, stream in batch:
+            if data is None:
+                closing.append(file)
+                continue
+            try:
+                file.write(data)
+            except (OSError, ValueError):
+                self.write_errors += 1
+                continue
+            self.written_bytes += len(data)
+            self.written_chunks += 1
+            if stream is not None:
+                stream.bytes_written += len(data)
+            enqueue_times.append(enqueue_time)
+            if file not in touched:
+                touched.append(file)
+        for file in touched:
+            try:
+                file.flush()
+            except (OSError, ValueError):
+                self.write_errors += 1
+        for file in closing:
+            file.close()
+        end = time.monotonic()
+        for enqueue_time in enqueue_times:
+            self.latency.record(end - enqueue_time)
+        self.batch_time.record(end - start)
+        self.batches += 1
+
+    def get_counters(self) -> dict:
+        return {"queue_depth": len(self.queue), "max_queue_depth": self.max_queue_depth,
+                "queued_bytes": self.queued_bytes, "written_bytes": self.written_bytes,
+                "written_chunks": self.written_chunks, "batches": self.batches,
+                "dropped_chunks": self.dropped_chunks, "dropped_records": self.dropped_records,
+                "write_errors": self.write_errors,
+                "latency": self.latency.summary(), "batch_time": self.batch_time.summary()}
@@ -0,0 +1,159 @@
+"""
+@File    :   BinaryRecorder.py
+
+@Description
+------------
+传感器数据的二进制记录，代替每个样本 str(list) + flush 的文本文件
+每个传感器一个文件：
+    MAGIC (8 bytes) | header 长度 (uint32, little endian) | header (json, 补空格到8字节对齐) | records
+header 中记录 numpy dtype（第一列总是 timestamp），每条记录的长度固定，
+先写入内存中的 chunk，chunk 满了或超过 flush_interval 才写一次文件
+给出 writer (Utils/AsyncWriter) 时 chunk 交给写线程，调用 append 的传感器线程不会等待磁盘
+
+读取: load_record(path) -> (header, structured array)，to_rows 转为与原来文本每行相同的二维数组
+
+"""
+import json
+import struct
+import time
+import numpy as np
+
+MAGIC = b"SWREC1\n\x00"
+TIMESTAMP_FIELD = ("timestamp", "<f8")
+
+
+def _descr_from_json(descr):
+    """json 中 dtype.descr 的 list 转回 tuple"""
+    return [tuple(field[:2]) + ((tuple(field[2]),) if len(field) > 2 else ()) for field in descr]
+
+
+class BinaryRecorder(object):
+
+    def __init__(self, file_path: str, fields, name: str = "", chunk_size: int = 256,
+                 flush_interval: float = 1.0, meta: dict = None, writer=None):
+        """
+        :param fields: numpy dtype fields after the timestamp, e.g. [("a", "<f8", (3,)), ("label", "<i4")]
+        :param chunk_size: records kept in memory before writing
+        :param flush_interval: also write when the oldest unwritten record is older than this (s)
+        :param meta: extra information saved in the header
+        :param writer: AsyncWriter that writes the chunks in its own thread, None to write inline
+        """
+        self.file_path = file_path
+        self.dtype = np.dtype([TIMESTAMP_FIELD] + list(fields))
+        self.chunk = np.zeros(chunk_size, self.dtype)
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.index = 0
+        self.count = 0
+        self.bytes_written = 0
+        """records dropped because the writer queue was full"""
+        self.dropped = 0
+        self.writer = writer
+        self.chunk_start = 0.0
+        self.header = {"name": name, "dtype": self.dtype.descr, "record_size": self.dtype.itemsize,
+                       "created": time.time(), "meta": meta or {}}
+        self.closed = False
+        self.file = open(file_path, "wb")
+        self._write_header()
+
+    def _write_header(self):
+        header = json.dumps(self.header).encode()
+        # records 从8字节对齐的位置开始
+        padding = -(len(MAGIC) + 4 + len(header)) % 8
+        header += b" " * padding
+        data = MAGIC + struct.pack("<I", len(header)) + header
+        # header 总是直接写入，不能因为写线程的队列满而丢弃
+        self.file.write(data)
+        self.bytes_written += len(data)
+
+    def _write(self, data: bytes, records: int = 0):
+        if self.writer is not None:
+            self.writer.submit(self.file, data, records, self)
+            return
+        self.file.write(data)
+        self.file.flush()
+        self.bytes_written += len(data)
+
+    def append(self, timestamp: float, *values):
+        """
+        :param values: one value per field after the timestamp, in order
+        """
+        if self.index == 0:
+            self.chunk_start = time.monotonic()
+        self.chunk[self.index] = (timestamp,) + values
+        self.index += 1
+        if self.index == self.chunk_size or time.monotonic() - self.chunk_start > self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.index == 0:
+            return
+        self._write(self.chunk[:self.index].tobytes(), self.index)
+        self.count += self.index
+        self.index = 0
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        if self.writer is not None:
+            self.writer.close_file(self.file)
+        else:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_header(file_path: str):
+    """:return: (header dict, offset of the first record)"""
+    with open(file_path, "rb") as f:
+        magic = f.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError("%s is not a binary record" % file_path)
+        length, = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(length).decode())
+    return header, len(MAGIC) + 4 + length
+
+
+def is_binary_record(file_path: str) -> bool:
+    with open(file_path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def load_record(file_path: str, mmap: bool = False):
+    """
+    最后一条不完整的记录（例如程序中断时）会被忽略
+    :param mmap: return a read-only memmap instead of reading the file
+    :return: (header dict, structured array)
+    """
+    header, offset = read_header(file_path)
+    dtype = np.dtype(_descr_from_json(header["dtype"]))
+    with open(file_path, "rb") as f:
+        f.seek(0, 2)
+        count = (f.tell() - offset) // dtype.itemsize
+    if mmap:
+        return header, np.memmap(file_path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+    return header, np.fromfile(file_path, dtype=dtype, count=count, offset=offset)
+
+
+def to_rows(records: np.ndarray) -> np.ndarray:
+    """
+    :return: (N, 1 + values) float64 array, timestamp then every field flattened,
+             the same columns as one line of the old text records
+    """
+    columns = [np.asarray(records[name], dtype=np.float64).reshape(len(records), -1)
+               for name in records.dtype.names]
+    return np.concatenate(columns, axis=1)
+
+
+def export_text(file_path: str, text_path: str):
+    """转成原来 str(list) 每行一个样本的文本格式，给还在读文本的脚本使用"""
+    header, records = load_record(file_path)
+    with open(text_path, "w") as f:
+        for row in to_rows(records).tolist():
+            f.write(str(row) + "\n")
@@ -0,0 +1,74 @@
+"""
+@File    :   LatencyHistogram.py
+
+@Description
+------------
+延迟/抖动统计：对数分桶的直方图，记录时不分配内存，可随时取分位数
+
+"""
+import threading
+import numpy as np
+
+
+class LatencyHistogram(object):
+
+    def __init__(self, min_value: float = 1e-5, max_value: float = 10.0, bins_per_decade: int = 20):
+        """
+        :param min_value: smallest latency resolved (s), smaller values go to the first bin
+        :param max_value: largest latency resolved (s), larger values go to the last bin
+        """
+        decades = np.log10(max_value / min_value)
+        self.edges = min_value * 10 ** (np.arange(int(np.ceil(decades * bins_per_decade)) + 1) / bins_per_decade)
+        self.log_min = np.log10(min_value)
+        self.bins_per_decade = bins_per_decade
+        self.counts = np.zeros(self.edges.shape[0] + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.min = float("inf")
+        self.lock = threading.Lock()
+
+    def record(self, value: float):
+        """:param value: latency in seconds"""
+        if value > 0:
+            index = int((np.log10(value) - self.log_min) * self.bins_per_decade) + 1
+            index = min(max(index, 0), self.counts.shape[0] - 1)
+        else:
+            index = 0
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+            self.min = min(self.min, value)
+
+    def reset(self):
+        with self.lock:
+            self.counts[:] = 0
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+            self.min = float("inf")
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q: float) -> float:
+        """:return: upper edge of the bin containing the q-th percentile (s)"""
+        if self.count == 0:
+            return 0.0
+        cumulative = np.cumsum(self.counts)
+        index = int(np.searchsorted(cumulative, q / 100 * self.count))
+        if index >= self.edges.shape[0]:
+            return self.max
+        return min(self.edges[index], self.max)
+
+    def summary(self) -> dict:
+        return {"count": self.count, "mean": self.mean(), "min": self.min if self.count else 0.0,
+                "p50": self.percentile(50), "p90": self.percentile(90),
+                "p99": self.percentile(99), "max": self.max}
+
+    def __str__(self):
+        s = self.summary()
+        return "n=%d mean=%.2fms p50=%.2fms p90=%.2fms p99=%.2fms max=%.2fms" % (
+            s["count"], s["mean"] * 1e3, s["p50"] * 1e3, s["p90"] * 1e3, s["p99"] * 1e3, s["max"] * 1e3)
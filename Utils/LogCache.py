@@ -0,0 +1,190 @@
+"""
+@File    :   LogCache.py
+
+@Description
+------------
+解析后的传感器记录缓存为 .npy，再次运行时用 np.load(mmap_mode='r') 直接映射，不用重新解析文本
+每个记录由 路径、大小、mtime、内容 hash 标识：
+    路径、大小、mtime 都没变时直接使用缓存，不读原文件
+    大小或 mtime 变了时重新计算 hash，内容相同（例如只是被 touch/复制）仍然使用缓存
+    内容变了时重新解析
+.npy 以内容 hash 命名，内容相同的文件共用一个缓存；缓存总大小超过 max_bytes 时删除最久没用的
+index.json 记录所有缓存，命中时只在内存中更新 last_used，写入、删除缓存时或退出时再保存
+只删除 index 记录过的 .npy，cache_dir 中的其他文件不会被删除
+
+"""
+import atexit
+import hashlib
+import json
+import os, sys
+import time
+import numpy as np
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Utils import LogLoader
+
+CACHE_DIR = father_path + os.path.sep + "data" + os.path.sep + ".log_cache"
+
+
+def file_hash(file_path: str, block_size: int = 1 << 22) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+class LogCache(object):
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = 4 << 30, loader=LogLoader.load_log):
+        """
+        :param max_bytes: total size of the .npy files, the least recently used are removed above it
+        :param loader: file_path, **kwargs -> ndarray, kwargs are part of the cache key
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self.index_path = os.path.join(cache_dir, "index.json")
+        """key -> {path, size, mtime_ns, hash, npy, bytes, last_used}"""
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        """index 中有没有保存的修改（命中时的 last_used、mtime_ns）"""
+        self.dirty = False
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+        atexit.register(self.save)
+
+    @staticmethod
+    def _key(file_path: str, kwargs: dict) -> str:
+        return json.dumps([os.path.abspath(file_path), sorted((k, repr(v)) for k, v in kwargs.items())])
+
+    def _save_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.index_path)
+        self.dirty = False
+
+    def save(self):
+        """保存命中时更新的 last_used，退出时自动调用"""
+        if self.dirty:
+            self._save_index()
+
+    def load(self, file_path: str, **kwargs) -> np.ndarray:
+        """
+        :param kwargs: passed to the loader, e.g. skip_bad=True, dtype=np.float32
+        :return: read-only memmap of the parsed record
+        """
+        file_path = LogLoader.find_record(file_path)
+        key = self._key(file_path, kwargs)
+        stat = os.stat(file_path)
+        entry = self.entries.get(key)
+        npy_path = os.path.join(self.cache_dir, entry["npy"]) if entry else None
+        if entry and not os.path.exists(npy_path):
+            entry = None
+        if entry and (entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns):
+            if entry["size"] == stat.st_size and file_hash(file_path) == entry["hash"]:
+                entry["mtime_ns"] = stat.st_mtime_ns
+            else:
+                entry = None
+        if entry is None:
+            self.misses += 1
+            entry = self._store(file_path, key, stat, kwargs)
+        else:
+            self.hits += 1
+            entry["last_used"] = time.time()
+            self.dirty = True
+        return np.load(os.path.join(self.cache_dir, entry["npy"]), mmap_mode="r")
+
+    def _store(self, file_path: str, key: str, stat, kwargs: dict) -> dict:
+        content_hash = file_hash(file_path)
+        options = hashlib.blake2b(repr(sorted((k, repr(v)) for k, v in kwargs.items())).encode(),
+                                  digest_size=4).hexdigest()
+        npy = "%s_%s.npy" % (content_hash, options)
+        npy_path = os.path.join(self.cache_dir, npy)
+        if not os.path.exists(npy_path):
+            data = self.loader(file_path, **kwargs)
+            # 先写临时文件再改名，中断时不会留下不完整的缓存
+            tmp_path = npy_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, np.ascontiguousarray(data))
+            os.replace(tmp_path, npy_path)
+        entry = {"path": os.path.abspath(file_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                 "hash": content_hash, "npy": npy, "bytes": os.path.getsize(npy_path), "last_used": time.time()}
+        # 内容变了时旧的 .npy 不再被这个 key 使用
+        replaced = self.entries.get(key)
+        self.entries[key] = entry
+        if replaced is not None:
+            self._remove_unused([replaced["npy"]])
+        self.evict(keep=npy)
+        return entry
+
+    def invalidate(self, file_path: str = None):
+        """删除 file_path 的缓存，None 时删除所有缓存"""
+        path = None if file_path is None else os.path.abspath(file_path)
+        removed = []
+        for key in [key for key, entry in self.entries.items() if path is None or entry["path"] == path]:
+            removed.append(self.entries.pop(key)["npy"])
+        self._remove_unused(removed)
+        self._save_index()
+
+    def evict(self, keep: str = None):
+        """删除最久没用的缓存直到总大小不超过 max_bytes，keep 为刚写入的 .npy，不会被删除"""
+        sizes = {}
+        last_used = {}
+        for entry in self.entries.values():
+            sizes[entry["npy"]] = entry["bytes"]
+            last_used[entry["npy"]] = max(last_used.get(entry["npy"], 0), entry["last_used"])
+        total = sum(sizes.values())
+        removed = []
+        for npy in sorted(last_used, key=last_used.get):
+            if total <= self.max_bytes:
+                break
+            if npy == keep:
+                continue
+            for key in [key for key, entry in self.entries.items() if entry["npy"] == npy]:
+                del self.entries[key]
+            removed.append(npy)
+            total -= sizes[npy]
+        self._remove_unused(removed)
+        self._save_index()
+
+    def _remove_unused(self, removed: list):
+        """
+        删除 removed 中不再被 index 使用的 .npy（已经 mmap 的数组在 linux 上仍然可以使用）
+        :param removed: .npy names of the entries just removed from the index
+        """
+        used = set(entry["npy"] for entry in self.entries.values())
+        for name in set(removed) - used:
+            npy_path = os.path.join(self.cache_dir, name)
+            if os.path.exists(npy_path):
+                os.remove(npy_path)
+
+    def size(self) -> int:
+        """total bytes of the .npy files, shared files counted once"""
+        return sum(dict((entry["npy"], entry["bytes"]) for entry in self.entries.values()).values())
+
+    def get_counters(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries), "bytes": self.size()}
+
+
+_default_cache = None
+
+
+def load_cached(file_path: str, **kwargs) -> np.ndarray:
+    """LogLoader.load_log 的结果，缓存在 CACHE_DIR"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = LogCache()
+    return _default_cache.load(file_path, **kwargs)
@@ -0,0 +1,153 @@
+"""
+@File    :   LogLoader.py
+
+@Description
+------------
+读取传感器记录，代替各个脚本中复制的 get_data
+文本记录每行为 str(list)，例如 "[1620000000.1, 25.5, 26.0]"：
+    每次读 chunk_bytes 的完整行，去掉 "[],"，用 np.loadtxt 一次解析整块，解析失败时逐行解析
+    先数行数，结果数组只分配一次，内存为结果 + 一块文本
+二进制记录 (Utils/BinaryRecorder, *.rec) 直接读取，列与文本记录相同
+find_record: 给出的文件不存在时找同名的 .rec / .txt（不区分大小写），新旧记录都可以用同一个路径读取
+
+"""
+import os, sys
+import io
+import numpy as np
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Utils import BinaryRecorder
+
+_DELETE = b"[],"
+RECORD_EXTENSIONS = (".rec", ".txt")
+
+
+def find_record(file_path: str) -> str:
+    """
+    :return: file_path if it exists, otherwise the same name with a .rec or .txt extension
+             in the same directory (case-insensitive, e.g. driver.txt -> Driver.rec)
+    """
+    if os.path.exists(file_path):
+        return file_path
+    directory, name = os.path.split(file_path)
+    stem = os.path.splitext(name)[0].lower()
+    candidates = [stem + extension for extension in RECORD_EXTENSIONS]
+    if os.path.isdir(directory or "."):
+        names = dict((entry.lower(), entry) for entry in os.listdir(directory or "."))
+        for candidate in candidates:
+            if candidate in names:
+                return os.path.join(directory, names[candidate])
+    raise FileNotFoundError("no record %s (also tried %s)" % (file_path, ", ".join(candidates)))
+
+
+def count_lines(file_path: str, block_size: int = 1 << 20) -> int:
+    """非空行的上限：换行符的个数，最后一行没有换行符时加一"""
+    count = 0
+    last = b"\n"
+    with open(file_path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            count += block.count(b"\n")
+            last = block[-1:]
+    return count + (last != b"\n")
+
+
+def _parse_block(text: bytes, columns: int) -> np.ndarray:
+    """
+    去掉 "[]," 后用 np.loadtxt 解析整块
+    :raise ValueError: when a line has another number of values or a value is not a number, e.g. "2.5e"
+    """
+    return np.loadtxt(io.BytesIO(text.translate(None, _DELETE)), dtype=np.float64, comments=None,
+                      ndmin=2).reshape(-1, columns)
+
+
+def _parse_line(line: bytes) -> np.ndarray:
+    """:raise ValueError: when a value is not a number"""
+    return np.array(line.translate(None, _DELETE).split(), dtype=np.float64)
+
+
+def _parse_lines(text: bytes, columns: int, first_line: int, skip_bad: bool) -> np.ndarray:
+    """逐行解析一块，找出列数不对的行"""
+    rows = []
+    for i, line in enumerate(text.split(b"\n")):
+        if not line.strip():
+            continue
+        try:
+            row = _parse_line(line)
+        except ValueError:
+            row = None
+        if row is None or row.shape[0] != columns or line.count(b",") != columns - 1:
+            if skip_bad:
+                continue
+            raise ValueError("line %d: expected %d values, got %r" % (first_line + i + 1, columns, line[:80]))
+        rows.append(row)
+    return np.array(rows, dtype=np.float64).reshape(-1, columns)
+
+
+def iter_chunks(file_path: str, chunk_bytes: int = 1 << 22, skip_bad: bool = False):
+    """
+    :param chunk_bytes: text parsed at once, whole lines only
+    :param skip_bad: drop lines with a different number of values (e.g. the last line of an interrupted record)
+                     instead of raising ValueError
+    :return: generator of (rows, columns) float64 arrays
+    """
+    with open(file_path, "rb") as f:
+        columns = None
+        line_number = 0
+        rest = b""
+        while True:
+            block = f.read(chunk_bytes)
+            text = rest + block
+            if block:
+                # 只解析完整的行，剩下的部分留到下一块
+                end = text.rfind(b"\n") + 1
+                text, rest = text[:end], text[end:]
+            if not text.strip():
+                line_number += text.count(b"\n")
+                if not block:
+                    break
+                continue
+            if columns is None:
+                first = next(line for line in text.split(b"\n", 64) if line.strip())
+                columns = first.count(b",") + 1
+            try:
+                values = _parse_block(text, columns)
+            except ValueError:
+                values = None
+            # 每行一个 "["，行数和逗号的个数都对上时整块有效，否则逐行找出有问题的行
+            rows = text.count(b"[")
+            if values is not None and values.shape[0] == rows \
+                    and text.count(b",") == rows * (columns - 1) and text.count(b"]") == rows:
+                yield values
+            else:
+                yield _parse_lines(text, columns, line_number, skip_bad)
+            line_number += text.count(b"\n")
+            if not block:
+                break
+
+
+def load_log(file_path: str, chunk_bytes: int = 1 << 22, skip_bad: bool = False, dtype=np.float64) -> np.ndarray:
+    """
+    :param file_path: text record (one str(list) per line) or binary record (Utils/BinaryRecorder),
+                      see find_record when it does not exist
+    :param dtype: e.g. np.float32 to halve the memory of long ir_data logs (timestamps lose precision)
+    :return: (N, columns) array, timestamp in column 0
+    """
+    file_path = find_record(file_path)
+    if BinaryRecorder.is_binary_record(file_path):
+        header, records = BinaryRecorder.load_record(file_path)
+        return BinaryRecorder.to_rows(records).astype(dtype, copy=False)
+    data = None
+    count = 0
+    for chunk in iter_chunks(file_path, chunk_bytes, skip_bad):
+        if data is None:
+            data = np.empty((count_lines(file_path), chunk.shape[1]), dtype=dtype)
+        data[count:count + chunk.shape[0]] = chunk
+        count += chunk.shape[0]
+    if data is None:
+        return np.zeros((0, 0), dtype=dtype)
+    return data[:count]
@@ -0,0 +1,65 @@
+"""
+@File    :   RateScheduler.py
+
+@Description
+------------
+固定频率循环：按 time.monotonic() 的截止时间等待，自动扣除本周期已用掉的时间（串口收发等），
+记录超时次数和唤醒抖动
+
+"""
+import os, sys
+import time
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Utils import LatencyHistogram
+
+
+class RateScheduler(object):
+
+    def __init__(self, rate: float = 20):
+        """:param rate: target loop rate (Hz)"""
+        self.period = 1 / rate
+        self.next_deadline = None
+        self.last_tick = None
+        self.cycles = 0
+        self.overruns = 0
+        """wake-up time minus deadline"""
+        self.jitter = LatencyHistogram.LatencyHistogram()
+        """real time between two ticks"""
+        self.interval = LatencyHistogram.LatencyHistogram()
+
+    def set_rate(self, rate: float):
+        self.period = 1 / rate
+
+    def start(self):
+        self.last_tick = time.monotonic()
+        self.next_deadline = self.last_tick + self.period
+        return self
+
+    def wait(self) -> float:
+        """
+        等到下一个周期开始；本周期已超时则不等待，并从当前时间重新对齐
+        :return: the real time since the previous tick (s)
+        """
+        if self.next_deadline is None:
+            self.start()
+        now = time.monotonic()
+        if now < self.next_deadline:
+            time.sleep(self.next_deadline - now)
+            now = time.monotonic()
+            self.jitter.record(now - self.next_deadline)
+            self.next_deadline += self.period
+        else:
+            self.overruns += 1
+            self.next_deadline = now + self.period
+        dt = now - self.last_tick
+        self.last_tick = now
+        self.cycles += 1
+        self.interval.record(dt)
+        return dt
+
+    def get_counters(self) -> dict:
+        return {"cycles": self.cycles, "overruns": self.overruns,
+                "jitter": self.jitter.summary(), "interval": self.interval.summary()}
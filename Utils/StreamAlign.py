@@ -0,0 +1,113 @@
+"""
+@File    :   StreamAlign.py
+
+@Description
+------------
+把多个传感器记录对齐到同一组参考时间（例如 ir_data 的时间戳），代替 combine 脚本中的 select_data
+每个记录为 (N, 1 + C) 数组，第0列为时间戳，与 LogLoader.load_log 的结果相同
+每个记录只做一次 np.searchsorted，结果直接写入一次分配好的输出 (M, 1 + sum C)：
+    nearest:  时间最近的样本
+    previous: 参考时间之前（含）最近的样本，之前没有样本时无效
+    linear:   前后两个样本线性插值，超出记录范围时取第一个/最后一个样本
+              角度等会跳变的列（例如 -180/180）插值没有意义，这些记录用 nearest 或 previous
+max_staleness: 所用样本与参考时间相差超过它时该行该记录无效，填 fill
+
+原先的 select_data 在时间差开始变大后才停下，取的是最近样本之后的样本（通常是下一个），
+nearest 取的是真正最近的样本，所以合并结果与原先的一般差一个样本
+
+"""
+import numpy as np
+
+MODES = ("nearest", "previous", "linear")
+
+
+def _sorted_stream(stream: np.ndarray) -> np.ndarray:
+    """时间戳不是递增时（例如系统时间被调整）按时间稳定排序"""
+    times = stream[:, 0]
+    if times.shape[0] > 1 and np.any(times[1:] < times[:-1]):
+        return stream[np.argsort(times, kind="stable")]
+    return stream
+
+
+def output_columns(streams) -> list:
+    """:return: (start, end) columns of every stream in the output, column 0 is the reference time"""
+    columns = []
+    start = 1
+    for stream in streams:
+        end = start + stream.shape[1] - 1
+        columns.append((start, end))
+        start = end
+    return columns
+
+
+def align(reference_times, streams, mode="nearest", max_staleness=None, out: np.ndarray = None,
+          fill: float = np.nan):
+    """
+    :param reference_times: (M,) sorted times to align to
+    :param streams: list of (N_i, 1 + C_i) arrays, timestamp in column 0
+    :param mode: one of MODES, or one per stream
+    :param max_staleness: seconds, or one per stream (None for no limit)
+    :param out: (M, 1 + sum C_i) array to write into, allocated when None
+    :return: (out, valid), valid is an (M, len(streams)) bool array
+    """
+    reference_times = np.asarray(reference_times, dtype=np.float64)
+    num = reference_times.shape[0]
+    modes = [mode] * len(streams) if isinstance(mode, str) else list(mode)
+    staleness = max_staleness if isinstance(max_staleness, (list, tuple)) else [max_staleness] * len(streams)
+    if len(modes) != len(streams) or len(staleness) != len(streams):
+        raise ValueError("need one mode and one max_staleness per stream")
+    columns = output_columns(streams)
+    width = columns[-1][1] if columns else 1
+    if out is None:
+        out = np.empty((num, width), dtype=np.float64)
+    elif out.shape != (num, width):
+        raise ValueError("out should be %s, got %s" % ((num, width), out.shape))
+    out[:, 0] = reference_times
+    valid = np.ones((num, len(streams)), dtype=bool)
+
+    for k, (stream, mode, limit, (start, end)) in enumerate(zip(streams, modes, staleness, columns)):
+        if mode not in MODES:
+            raise ValueError("mode should be one of %s, got %r" % (MODES, mode))
+        target = out[:, start:end]
+        stream = _sorted_stream(np.asarray(stream))
+        if stream.shape[0] == 0:
+            target[:] = fill
+            valid[:, k] = False
+            continue
+        times = np.asarray(stream[:, 0], dtype=np.float64)
+        # np.take(out=...) 只接受与输出相同的 dtype，例如 load_log(dtype=np.float32) 的记录先转换
+        values = np.asarray(stream[:, 1:], dtype=out.dtype)
+
+        if mode == "previous":
+            index = np.searchsorted(times, reference_times, side="right") - 1
+            valid[:, k] = index >= 0
+            np.take(values, index, axis=0, out=target, mode="clip")
+            age = reference_times - times[np.maximum(index, 0)]
+        elif mode == "nearest":
+            after = np.searchsorted(times, reference_times, side="left")
+            before = np.maximum(after - 1, 0)
+            after = np.minimum(after, times.shape[0] - 1)
+            # 相同距离时取之前的样本
+            use_after = np.abs(times[after] - reference_times) < np.abs(reference_times - times[before])
+            index = np.where(use_after, after, before)
+            np.take(values, index, axis=0, out=target, mode="clip")
+            age = np.abs(reference_times - times[index])
+        else:
+            if times.shape[0] == 1:
+                before = after = np.zeros(num, dtype=np.intp)
+            else:
+                before = np.clip(np.searchsorted(times, reference_times, side="right") - 1, 0, times.shape[0] - 2)
+                after = before + 1
+            span = times[after] - times[before]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                weight = np.where(span > 0, (reference_times - times[before]) / span, 0.0)
+            np.clip(weight, 0.0, 1.0, out=weight)
+            np.take(values, before, axis=0, out=target, mode="clip")
+            target += weight[:, None] * (values[after] - target)
+            age = np.minimum(np.abs(reference_times - times[before]), np.abs(times[after] - reference_times))
+
+        if limit is not None:
+            valid[:, k] &= age <= limit
+        if not valid[:, k].all():
+            target[~valid[:, k]] = fill
+    return out, valid
@@ -0,0 +1,122 @@
+"""
+慢磁盘（每次 flush 卡住一段时间）时传感器线程中 BinaryRecorder.append 的耗时
+直接写: 传感器线程自己写文件并 flush
+AsyncWriter: chunk 交给写线程，多个 recorder 共用一个写线程，每批每个文件只 flush 一次
+队列够大时读回的数据必须与写入的相同；队列太小时丢弃的记录数必须与文件中缺少的记录数相同
+"""
+import os, sys
+import time
+import tempfile
+import numpy as np
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Utils import BinaryRecorder
+from Utils import AsyncWriter
+from Utils import LatencyHistogram
+
+num_samples = 3000
+num_streams = 3
+flush_stall = 0.02
+sample_period = 0.0005
+FIELDS = [("a", "<f8", (3,)), ("w", "<f8", (3,)), ("Angle", "<f8", (3,))]
+
+
+class SlowFile(object):
+    """flush 时 sleep，模拟 SD 卡 / 繁忙的磁盘"""
+
+    def __init__(self, file):
+        self.file = file
+        self.flushes = 0
+
+    def write(self, data):
+        return self.file.write(data)
+
+    def flush(self):
+        self.flushes += 1
+        time.sleep(flush_stall)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    @property
+    def closed(self):
+        return self.file.closed
+
+
+def make_recorders(directory, writer):
+    recorders = []
+    for i in range(num_streams):
+        recorder = BinaryRecorder.BinaryRecorder(os.path.join(directory, "stream%d.rec" % i), FIELDS,
+                                                 chunk_size=16, writer=writer)
+        recorder.file = SlowFile(recorder.file)
+        recorders.append(recorder)
+    return recorders
+
+
+def run(directory, samples, writer=None):
+    """:return: (append latency histogram, recorders)"""
+    recorders = make_recorders(directory, writer)
+    histogram = LatencyHistogram.LatencyHistogram()
+    next_time = time.perf_counter()
+    for i, sample in enumerate(samples):
+        for recorder in recorders:
+            start = time.perf_counter()
+            recorder.append(float(i), sample[0], sample[1], sample[2])
+            histogram.record(time.perf_counter() - start)
+        next_time += sample_period
+        time.sleep(max(0.0, next_time - time.perf_counter()))
+    for recorder in recorders:
+        recorder.close()
+    if writer is not None:
+        writer.stop()
+    return histogram, recorders
+
+
+def check(directory, samples, recorders):
+    for i, recorder in enumerate(recorders):
+        header, records = BinaryRecorder.load_record(os.path.join(directory, "stream%d.rec" % i))
+        assert len(records) + recorder.dropped == num_samples, (len(records), recorder.dropped)
+        index = records["timestamp"].astype(int)
+        assert np.array_equal(records["a"], samples[index, 0])
+        assert np.array_equal(records["Angle"], samples[index, 2])
+
+
+if __name__ == "__main__":
+    samples = np.random.default_rng(0).normal(0, 1, (num_samples, 3, 3))
+    print("%d streams, %d samples each, flush stalls %.0f ms" % (num_streams, num_samples, flush_stall * 1e3))
+    print("%-22s %10s %10s %10s %8s %8s" % ("", "p50 us", "p99 us", "max ms", "flushes", "dropped"))
+    results = {}
+    for name, writer in (("inline", None),
+                         ("AsyncWriter", AsyncWriter.AsyncWriter(batch_window=0.1).start()),
+                         ("AsyncWriter queue 2", AsyncWriter.AsyncWriter(max_queue=2, batch_window=0.1).start())):
+        directory = tempfile.mkdtemp()
+        histogram, recorders = run(directory, samples, writer)
+        check(directory, samples, recorders)
+        dropped = sum(recorder.dropped for recorder in recorders)
+        flushes = sum(recorder.file.flushes for recorder in recorders)
+        results[name] = (histogram.percentile(99), dropped)
+        print("%-22s %10.1f %10.1f %10.2f %8d %8d" % (name, histogram.percentile(50) * 1e6,
+                                                    histogram.percentile(99) * 1e6,
+                                                    histogram.max * 1e3,
+                                                    flushes, dropped))
+        if writer is not None:
+            counters = writer.get_counters()
+            print("%22s batches %d, max queue depth %d, write latency %s" % (
+                "", counters["batches"], counters["max_queue_depth"], writer.latency))
+    # stop() 之后的数据直接写入，close 直接关闭文件
+    directory = tempfile.mkdtemp()
+    writer = AsyncWriter.AsyncWriter().start()
+    recorder = BinaryRecorder.BinaryRecorder(os.path.join(directory, "late.rec"), FIELDS, writer=writer)
+    recorder.append(0.0, samples[0, 0], samples[0, 1], samples[0, 2])
+    writer.stop()
+    recorder.append(1.0, samples[1, 0], samples[1, 1], samples[1, 2])
+    recorder.close()
+    assert recorder.file.closed
+    assert len(BinaryRecorder.load_record(os.path.join(directory, "late.rec"))[1]) == 2
+
+    # 传感器线程不再等待 flush
+    assert results["AsyncWriter"][0] < flush_stall / 10
+    assert results["AsyncWriter"][1] == 0
@@ -0,0 +1,85 @@
+"""
+ControlDriver 控制循环的吞吐和延迟，使用 Driver/SimulatedServoDriver.py 模拟的左右驱动器，不需要连接实物
+每种情况下以固定速度直行一段时间，里程计不限频率地读取，统计：
+每秒读取次数、相邻两个位姿的时间间隔 (p50/p99)、发送的转速指令数（设定值不变时只按 keep-alive 发送，应答丢失时下一次循环重发）、应答丢失的指令数、左右同时收发一次 (xfer) 的耗时 (p50/p99/max)、监控信息读取失败次数、丢失的回复数
+无故障时检查里程计算出的距离与模拟电机走过的距离一致
+"""
+import os, sys
+import io
+import math
+import time
+import threading
+import contextlib
+import numpy as np
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Driver import ControlOdometryDriver as CD
+from Driver import SimulatedServoDriver as SSD
+
+duration = 3.0
+speed = 0.3  # m/s
+
+"""(name, latency, jitter, loss)"""
+scenarios = [
+    ("no fault", 0.001, 0.0, 0.0),
+    ("latency 5ms", 0.005, 0.0, 0.0),
+    ("jitter 0~20ms", 0.001, 0.02, 0.0),
+    ("loss 1%", 0.001, 0.0, 0.01),
+    ("loss 5%", 0.001, 0.0, 0.05),
+    ("jitter + loss 5%", 0.002, 0.02, 0.05),
+]
+
+
+def run(latency, jitter, loss, seed=0):
+    ports = (SSD.SimulatedSerial(latency=latency, jitter=jitter, loss=loss, seed=seed),
+             SSD.SimulatedSerial(latency=latency, jitter=jitter, loss=loss, seed=seed + 1))
+    with contextlib.redirect_stdout(io.StringIO()):
+        cd = CD.ControlDriver(record_mode=False, left_right=0, ports=ports,
+                              pose_history=4096)
+        cd.speed = speed
+        cd.start()
+        time.sleep(duration)
+        cd.stop()
+        cd.join()
+        # 控制循环结束后 transport 已关闭，停电机在本线程中收发
+        cd.stopMotor()
+    return cd, ports
+
+
+def wheel_threads() -> int:
+    """transport 的收发线程，ControlDriver 结束后不能留下"""
+    deadline = time.monotonic() + 1.0
+    while True:
+        count = sum(thread.name.startswith("wheel") for thread in threading.enumerate())
+        if not count or time.monotonic() > deadline:
+            return count
+        time.sleep(0.01)
+
+
+if __name__ == "__main__":
+    print("%.1f s per scenario, speed %.2f m/s" % (duration, speed))
+    print("%-18s %8s %10s %10s %8s %8s %10s %10s %10s %7s %5s" %
+          ("scenario", "polls/s", "pose p50", "pose p99", "commands", "no ack", "xfer p50", "xfer p99", "xfer max",
+           "errors", "lost"))
+    for name, latency, jitter, loss in scenarios:
+        cd, ports = run(latency, jitter, loss)
+        cycle = cd.transport.cycle.summary()
+        timestamps = cd.pose.last(cd.pose.size - 1)[:, 0]
+        interval = np.diff(timestamps)
+        print("%-18s %8.1f %8.2fms %8.2fms %8d %8d %8.2fms %8.2fms %8.2fms %7d %5d" %
+              (name, cd.polls / duration, np.percentile(interval, 50) * 1e3, np.percentile(interval, 99) * 1e3,
+               cd.commands_sent, cd.command_errors,
+               cycle["p50"] * 1e3, cycle["p99"] * 1e3, cycle["max"] * 1e3,
+               cd.monitor_errors, sum(port.lost for port in ports)))
+        if loss == 0 and jitter == 0:
+            # 里程计的距离与模拟电机转过的距离一致
+            ticks = abs(ports[0].driver.position)
+            wheel_distance = ticks / SSD.TICKS_PER_REVOLUTION * 2 * math.pi * 0.085
+            odo_distance = math.hypot(cd.position[0], cd.position[1])
+            assert cd.monitor_errors == 0 and cd.command_errors == 0
+            assert cd.pose.latest()[2] == tuple(cd.position)
+            assert wheel_distance > 0.5 * speed * duration
+            assert abs(odo_distance - wheel_distance) < 0.05, (odo_distance, wheel_distance)
+        assert cd.transport.closed and not ports[0].driver.enabled and wheel_threads() == 0
@@ -0,0 +1,123 @@
+"""
+IR Camera 帧解码速度对比：
+原先的 hex 字符串 + 769次 int(..., 16) 解析 与 IRFrame.decode_frame
+原先逐字节查找帧头 与 IRFrameReader 成块读取+bytes.find
+"""
+import os, sys
+import io
+import time
+import numpy as np
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Sensors import IRFrame
+
+
+def legacy_decode(frame_data: bytes):
+    """IRCamera 原先的解码方式"""
+    ir_data = frame_data.hex()
+    temperature = []
+    for i in range(769):
+        t = (int(ir_data[i * 4 + 2:i * 4 + 4], 16) * 256 + int(ir_data[i * 4:i * 4 + 2], 16)) / 100
+        temperature.append(t)
+    temperature.pop()
+    for i in [183, 202, 303, 601]:
+        x = i % 32
+        y = i // 32
+        temp = (temperature[x - 1 + (y - 1) * 32] +
+                temperature[x + (y - 1) * 32] +
+                temperature[x + 1 + (y - 1) * 32] +
+                temperature[x - 1 + y * 32] +
+                temperature[x + 1 + y * 32] +
+                temperature[x - 1 + (y + 1) * 32] +
+                temperature[x + (y + 1) * 32] +
+                temperature[x + 1 + (y + 1) * 32]) / 8
+        temperature.insert(x + y * 32, temp)
+        temperature.pop(x + y * 32 + 1)
+    return temperature
+
+
+def make_frames(num: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(num):
+        pixels = rng.integers(1500, 3800, IRFrame.FRAME_DATA_SIZE // 2).astype('<u2')
+        frames.append(pixels.tobytes())
+    return frames
+
+
+def make_stream(frames, seed: int = 0):
+    """帧与帧之间随机插入一些无用字节，模拟失去同步"""
+    rng = np.random.default_rng(seed)
+    stream = bytearray()
+    garbage_num = 0
+    for frame in frames:
+        if rng.random() < 0.2:
+            garbage = rng.integers(0, 0x5A, rng.integers(1, 300)).astype(np.uint8).tobytes()
+            stream += garbage
+            garbage_num += len(garbage)
+        stream += IRFrame.FRAME_HEAD + frame
+    return bytes(stream), garbage_num
+
+
+def legacy_read_frames(source):
+    """IRCamera 原先的帧头查找方式：每次 read(1)"""
+    head = []
+    frames = []
+    read_calls = 0
+    while True:
+        s = source.read(1).hex()
+        read_calls += 1
+        if s == "":
+            return frames, read_calls
+        head.append(int(s, 16))
+        if len(head) == 4:
+            if bytes(head) == IRFrame.FRAME_HEAD:
+                frames.append(source.read(IRFrame.FRAME_DATA_SIZE))
+                read_calls += 1
+                head.clear()
+            else:
+                head.pop(0)
+
+
+def measure(decode, frames, repeat: int = 3):
+    best = float("inf")
+    for r in range(repeat):
+        start = time.perf_counter()
+        for frame in frames:
+            decode(frame)
+        best = min(best, time.perf_counter() - start)
+    return len(frames) / best
+
+
+if __name__ == "__main__":
+    frames = make_frames(2000)
+
+    """结果必须与原先逐位一致"""
+    for frame in frames[:200]:
+        assert IRFrame.decode_frame(frame, dtype=np.float64).ravel().tolist() == legacy_decode(frame)
+
+    out = np.zeros((IRFrame.FRAME_HEIGHT, IRFrame.FRAME_WIDTH), np.float32)
+    fps_legacy = measure(legacy_decode, frames)
+    fps_new = measure(IRFrame.decode_frame, frames)
+    fps_inplace = measure(lambda frame: IRFrame.decode_frame(frame, out=out), frames)
+    print("legacy hex/int decode: %10.1f frames/s" % fps_legacy)
+    print("decode_frame:          %10.1f frames/s  (x%.1f)" % (fps_new, fps_new / fps_legacy))
+    print("decode_frame(out=...): %10.1f frames/s  (x%.1f)" % (fps_inplace, fps_inplace / fps_legacy))
+
+    """回放录制的字节流，检查重新同步"""
+    stream, garbage_num = make_stream(frames)
+    reader = IRFrame.IRFrameReader(io.BytesIO(stream))
+    start = time.perf_counter()
+    replay = list(reader)
+    time_reader = time.perf_counter() - start
+    assert replay == frames
+    assert reader.dropped_bytes == garbage_num
+    start = time.perf_counter()
+    legacy_frames, legacy_calls = legacy_read_frames(io.BytesIO(stream))
+    time_legacy = time.perf_counter() - start
+    assert legacy_frames == frames
+    print("legacy read(1) resync: %10.1f frames/s, %d read calls" % (len(frames) / time_legacy, legacy_calls))
+    print("IRFrameReader:         %10.1f frames/s, %d read calls" % (len(frames) / time_reader, reader.read_calls))
+    print("reader counters:", reader.get_counters())
@@ -0,0 +1,64 @@
+"""
+IRFrame.decode_frame 与 IRCamera 原先逐字节 hex/int 解码的逐位一致检查，不计时，可以单独运行
+任何一帧不一致时 AssertionError 退出
+    随机帧：uint16 全范围，以及实际的 15°C ~ 38°C
+    边界帧：全 0、全 0xFFFF、坏点邻域取不同的值
+    dtype=float64、out=float64 数组 与原先的结果逐位相同；默认 float32 等于原先结果转换为 float32
+    decode_ambient 与第769个值一致；不足 769 个值（1538 字节）时 ValueError
+"""
+import os, sys
+import numpy as np
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Sensors import IRFrame
+from ir_camera_benchmark import legacy_decode, make_frames
+
+
+def legacy_ambient(frame_data: bytes) -> float:
+    ir_data = frame_data.hex()
+    i = IRFrame.PIXEL_NUM
+    return (int(ir_data[i * 4 + 2:i * 4 + 4], 16) * 256 + int(ir_data[i * 4:i * 4 + 2], 16)) / 100
+
+
+def edge_frames():
+    frames = [bytes(IRFrame.FRAME_DATA_SIZE), b"\xff" * IRFrame.FRAME_DATA_SIZE]
+    # 坏点的每个邻域像素取不同的值，相加顺序不同时结果会不同
+    pixels = np.zeros(IRFrame.FRAME_DATA_SIZE // 2, '<u2')
+    pixels[IRFrame.DEAD_PIXEL_NEIGHBOUR.ravel()] = np.arange(IRFrame.DEAD_PIXEL_NEIGHBOUR.size) * 997 + 1
+    frames.append(pixels.tobytes())
+    return frames
+
+
+def check_frame(frame: bytes, out: np.ndarray):
+    expected = np.array(legacy_decode(frame), dtype=np.float64)
+    decoded = IRFrame.decode_frame(frame, dtype=np.float64).ravel()
+    assert decoded.tobytes() == expected.tobytes(), \
+        "decode_frame differs at pixels %s" % np.flatnonzero(decoded != expected)[:10].tolist()
+    IRFrame.decode_frame(frame, out=out)
+    assert out.ravel().tobytes() == expected.tobytes(), "decode_frame(out=...) differs"
+    assert IRFrame.decode_frame(frame).ravel().tobytes() == expected.astype(np.float32).tobytes(), \
+        "float32 decode_frame differs"
+    assert IRFrame.decode_ambient(frame) == legacy_ambient(frame), "decode_ambient differs"
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(1)
+    full_range = [rng.integers(0, 1 << 16, IRFrame.FRAME_DATA_SIZE // 2).astype('<u2').tobytes()
+                  for _ in range(500)]
+    frames = make_frames(500) + full_range + edge_frames()
+    out = np.empty((IRFrame.FRAME_HEIGHT, IRFrame.FRAME_WIDTH), np.float64)
+    for frame in frames:
+        check_frame(frame, out)
+    # 只有前 769 个值参与解码，后面的字节不影响结果
+    check_frame(frames[0][:(IRFrame.PIXEL_NUM + 1) * 2], out)
+    check_frame(frames[0] + IRFrame.FRAME_HEAD, out)
+
+    try:
+        IRFrame.decode_frame(frames[0][:(IRFrame.PIXEL_NUM + 1) * 2 - 1])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("a short frame was decoded")
+    print("decode_frame is bit-identical to the legacy decode on %d frames" % len(frames))
@@ -0,0 +1,89 @@
+"""
+IR 采集循环每帧耗时对比：
+原先在采集循环里调用 demonstrate_data（list拷贝 + 逐像素二值化 + PIL放大 + cv2.imshow）
+与 采集循环只写入 IRFrameRing，由 IRViewer 线程限速显示
+没有 DISPLAY 时只做图像处理，不调用 cv2.imshow
+"""
+import os, sys
+import io
+import time
+import numpy as np
+import cv2
+from PIL import Image
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Sensors import IRFrame, IRViewer
+from benchmark.ir_camera_benchmark import make_frames, make_stream
+
+has_display = bool(os.environ.get("DISPLAY"))
+
+
+def legacy_demonstrate(temperature_list, scope=10):
+    """IRCamera.demonstrate_data 原先的实现"""
+    temperature = []
+    for i in temperature_list:
+        temperature.append(i)
+    for i in range(len(temperature)):
+        if temperature[i] <= 25:
+            temperature[i] = 0
+        else:
+            temperature[i] = 1
+    temperature = np.array(temperature, np.float32).reshape(24, 32)
+    im = Image.fromarray(temperature)
+    im = im.resize((32 * scope, 24 * scope), Image.BILINEAR)
+    im = np.array(im)
+    if has_display:
+        cv2.imshow("Foot", im)
+        cv2.waitKey(1)
+    return temperature
+
+
+class HeadlessViewer(IRViewer.IRViewer):
+    def show(self, frame):
+        img = self.render(frame)
+        if has_display:
+            cv2.imshow(self.window_name, img)
+            cv2.waitKey(1)
+
+
+def run_inline(stream):
+    latency = []
+    for ir_data in IRFrame.IRFrameReader(io.BytesIO(stream)):
+        start = time.perf_counter()
+        temperature = IRFrame.decode_frame(ir_data, dtype=np.float64).ravel().tolist()
+        legacy_demonstrate(temperature)
+        latency.append(time.perf_counter() - start)
+    return np.array(latency)
+
+
+def run_with_viewer(stream):
+    ring = IRFrame.IRFrameRing()
+    viewer = HeadlessViewer(ring, max_fps=10).start()
+    latency = []
+    for ir_data in IRFrame.IRFrameReader(io.BytesIO(stream)):
+        start = time.perf_counter()
+        IRFrame.decode_frame(ir_data, out=ring.write_slot())
+        ring.publish(time.time())
+        latency.append(time.perf_counter() - start)
+        # 模拟传感器帧率，给显示线程留出时间
+        time.sleep(0.001)
+    viewer.stop()
+    return np.array(latency), viewer
+
+
+def summary(name, latency):
+    print("%-22s mean %8.1f us  p99 %8.1f us" %
+          (name, latency.mean() * 1e6, np.percentile(latency, 99) * 1e6))
+
+
+if __name__ == "__main__":
+    stream, _ = make_stream(make_frames(1000))
+    inline = run_inline(stream)
+    threaded, viewer = run_with_viewer(stream)
+    summary("inline demonstrate", inline)
+    summary("IRViewer thread", threaded)
+    print("per frame latency gain: %.1f us (x%.1f)" %
+          ((inline.mean() - threaded.mean()) * 1e6, inline.mean() / threaded.mean()))
+    print("viewer shown %d frames, skipped %d" % (viewer.shown_frames, viewer.skipped_frames))
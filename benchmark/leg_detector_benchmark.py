@@ -0,0 +1,153 @@
+"""
+Leg_detector 每个scan的处理耗时，使用模拟的 RPLidar scan，不需要连接雷达
+turn_to_img: 原先逐点 math.cos/sin 的循环 与 向量化实现，结果必须逐位一致
+检测区域: 原先每个scan逐像素判断扇形 与 缓存的 mask，得到的腿部点必须相同
+腿部检测: 原先 图像 + 扇形循环 + sklearn KMeans 与 detect_leg_scan (点集 + 热启动 2-means)
+"""
+import os, sys
+import math
+import time
+import numpy as np
+from sklearn.cluster import KMeans
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Preprocessing import Leg_detector
+
+scan_sizes = [360, 1000, 2000, 4000, 8000]
+
+
+def legacy_turn_to_img(LD, original_list):
+    """Leg_detector.turn_to_img 原先的实现"""
+    img = np.zeros((LD.size, LD.size))
+    for i in range(len(original_list)):
+        theta = original_list[i][1]
+        theta = -theta / 180 * math.pi
+        distance = original_list[i][2] / 10  # unit: mm
+        index_x = int(distance * math.cos(theta) + LD.half_size)
+        index_y = int(distance * math.sin(theta) + LD.half_size)
+        index_x = min(max(index_x, 0), LD.size - 1)
+        index_y = min(max(index_y, 0), LD.size - 1)
+        img[index_x, index_y] = 1
+    return img
+
+
+def legacy_region(LD, img, theta: float = 160):
+    """Leg_detector.detect_leg 原先逐像素计算检测区域的部分"""
+    theta = theta / 180 * math.pi
+    tan_theta = math.tan(theta / 2)
+    im = np.copy(img)
+    im[0:LD.half_size, :] = 0
+    column_boundry = LD.column_boundry
+    im[:, 0:column_boundry] = 0
+    im[:, LD.size - column_boundry:LD.size] = 0
+    row_boundary = LD.bottom_boundary
+    im[LD.size - row_boundary:LD.size, :] = 0
+    for i in range(LD.half_size, LD.size):
+        for j in range(LD.size):
+            if (i - LD.half_size) * tan_theta < abs(j - LD.half_size):
+                im[i, j] = 0
+    return im
+
+
+def legacy_detect_leg(LD, kmeans, scan):
+    """原先每个scan的完整处理，返回 left_leg, right_leg"""
+    im = legacy_region(LD, legacy_turn_to_img(LD, scan))
+    if im.sum() >= 2:
+        index = np.where(im == 1)
+        sample = np.c_[index[0], index[1]]
+        kmeans.fit(sample)
+        center_1 = np.around(kmeans.cluster_centers_[0]).astype(int)
+        center_2 = np.around(kmeans.cluster_centers_[1]).astype(int)
+        if center_1[1] < center_2[1]:
+            return LD.center_point - center_1, LD.center_point - center_2
+        return LD.center_point - center_2, LD.center_point - center_1
+    infinite_far = np.array([-180, -180])
+    return infinite_far, infinite_far
+
+
+def make_walking_scans(num_scans: int, num: int, rng):
+    """两条腿交替前后摆动"""
+    scans = []
+    for k in range(num_scans):
+        phase = math.sin(k / 5)
+        legs = ((55 + 12 * phase, 12), (55 - 12 * phase, -12))
+        scans.append(make_roi_scan(num, rng, legs))
+    return scans
+
+
+def make_scan(num: int, rng, legs=((60, 10), (60, -12)), walls=(300, 6000)):
+    """
+    模拟一圈 RPLidar scan：(quality, angle, distance)，角度为 raw/64，距离为 raw/4 (mm)
+    背景为 0.3~6m 的随机墙面，前方加两条腿
+    :param walls: (nearest, farthest) distance of the background (mm)
+    """
+    angle = np.sort(rng.integers(0, 360 * 64, num)) / 64.
+    distance = rng.integers(walls[0] * 4, walls[1] * 4, num) / 4.
+    for leg_x, leg_y in legs:
+        leg_angle = (math.degrees(math.atan2(-leg_y, leg_x)) + 360) % 360
+        near = np.abs(angle - leg_angle) < 4
+        distance[near] = np.round(math.hypot(leg_x, leg_y) * 10 * 4 + rng.normal(0, 8, near.sum())) / 4.
+    quality = np.full(num, 15)
+    return list(zip(quality.tolist(), angle.tolist(), distance.tolist()))
+
+
+def make_roi_scan(num: int, rng, legs=((60, 10), (60, -12))):
+    """检测区域与腿部检测用的场景：背景在 1.5m 以外，检测区域中只有两条腿"""
+    return make_scan(num, rng, legs, walls=(1500, 6000))
+
+
+def measure(func, scans, repeat: int = 3):
+    best = float("inf")
+    for r in range(repeat):
+        start = time.perf_counter()
+        for scan in scans:
+            func(scan)
+        best = min(best, time.perf_counter() - start)
+    return best / len(scans)
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    LD = Leg_detector.Leg_detector(portal=None)
+
+    print("turn_to_img per scan")
+    for num in scan_sizes:
+        scans = [make_scan(num, rng) for i in range(20)]
+        for scan in scans:
+            assert np.array_equal(LD.turn_to_img(scan), legacy_turn_to_img(LD, scan))
+        time_legacy = measure(lambda scan: legacy_turn_to_img(LD, scan), scans)
+        time_new = measure(LD.turn_to_img, scans)
+        scan_arrays = [np.array(scan) for scan in scans]
+        time_array = measure(LD.turn_to_img, scan_arrays)
+        print("%5d points: legacy %9.1f us, vectorized %8.1f us (x%.1f), (N, 3) array input %8.1f us" %
+              (num, time_legacy * 1e6, time_new * 1e6, time_legacy / time_new, time_array * 1e6))
+
+    print("detect region per scan")
+    scans = [make_roi_scan(2000, rng) for i in range(10)]
+    imgs = [LD.turn_to_img(scan).copy() for scan in scans]
+    for img in imgs:
+        legacy_points = np.where(legacy_region(LD, img) == 1)
+        points = np.where(img * LD.get_roi_mask() == 1)
+        assert all(np.array_equal(a, b) for a, b in zip(points, legacy_points))
+    time_legacy = measure(lambda img: legacy_region(LD, img), imgs, repeat=1)
+    time_new = measure(lambda img: img * LD.get_roi_mask(), imgs)
+    print("legacy %9.1f us, cached mask %8.1f us (x%.1f)" %
+          (time_legacy * 1e6, time_new * 1e6, time_legacy / time_new))
+
+    print("detect leg per scan")
+    for num in scan_sizes:
+        scans = make_walking_scans(30, num, rng)
+        kmeans = KMeans(n_clusters=2)
+        legacy_legs = [legacy_detect_leg(LD, kmeans, scan) for scan in scans]
+        LD.kmeans = Leg_detector.LegClusterer()
+        same = 0
+        for scan, (left, right) in zip(scans, legacy_legs):
+            LD.detect_leg_scan(scan)
+            same += np.array_equal(LD.left_leg, left) and np.array_equal(LD.right_leg, right)
+        time_legacy = measure(lambda scan: legacy_detect_leg(LD, kmeans, scan), scans, repeat=1)
+        time_new = measure(LD.detect_leg_scan, scans)
+        print("%5d points: legacy %9.1f us, detect_leg_scan %8.1f us (x%.1f), same legs %d/%d" %
+              (num, time_legacy * 1e6, time_new * 1e6, time_legacy / time_new, same, len(scans)))
+        assert same == len(scans), "detect_leg_scan differs from the legacy detect_leg"
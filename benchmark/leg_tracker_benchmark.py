@@ -0,0 +1,119 @@
+"""
+LegTracker 在模拟的腿部轨迹上的行为，以及每个 scan 的更新耗时
+两条腿以 50cm/s 向前移动并左右摆动，10Hz 的检测带 1cm 噪声：
+    开始：只检测到一条腿时不开始跟踪
+    速度：跟踪 1s 后速度估计接近 50cm/s
+    丢失：一条腿丢失 0.3s (< max_dropout) 时继续预测，重新检测到后仍是同一条腿
+    gate：离预测位置很远的检测不关联
+    左右交换：检测的左右标反或腿交叉时按位置关联
+    max_dropout：一条腿丢失超过 max_dropout 后跟踪重置
+    get_legs：一次读到同一个 scan 的两条腿，按该 scan 的时间外推
+"""
+import os, sys
+import time
+import numpy as np
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Preprocessing import LegTracker
+
+rate = 10
+speed = 50.0  # cm/s
+noise = 1.0  # cm
+
+
+def true_legs(t):
+    """:return: (left, right) cm, the legs swing 10cm back and forth in opposite phase"""
+    swing = 10 * np.sin(2 * np.pi * t)
+    left = np.array([speed * t + swing, -15.0])
+    right = np.array([speed * t - swing, 15.0])
+    return left, right
+
+
+def detections(rng, t):
+    left, right = true_legs(t)
+    return left + rng.normal(0, noise, 2), right + rng.normal(0, noise, 2)
+
+
+def distance(a, b):
+    return float(np.linalg.norm(np.asarray(a) - np.asarray(b)))
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    far = LegTracker.infinite_far
+    tracker = LegTracker.LegTracker()
+    t = 0.0
+    dt = 1 / rate
+
+    # 只有一条腿时不开始
+    left, right = detections(rng, t)
+    tracker.update(left, far, t)
+    assert not tracker.is_valid and np.array_equal(tracker.get_legs()[0], far)
+    t += dt
+
+    # 跟踪 1s，速度接近 50cm/s（摆动的速度按左右平均抵消）
+    for _ in range(rate):
+        tracker.update(*detections(rng, t), t)
+        t += dt
+    assert tracker.is_valid
+    mean_velocity = (tracker.left_velocity + tracker.right_velocity) / 2
+    print("velocity after 1 s: %s cm/s" % np.round(mean_velocity, 1))
+    assert abs(mean_velocity[0] - speed) < 10 and abs(mean_velocity[1]) < 10
+
+    # 左腿丢失 0.3s：继续预测，误差不超过 gate
+    worst = 0.0
+    for _ in range(3):
+        left, right = detections(rng, t)
+        tracker.update(far, right, t)
+        worst = max(worst, distance(tracker.left_leg, true_legs(t)[0]))
+        t += dt
+    print("largest prediction error while the left leg was lost 0.3 s: %.1f cm" % worst)
+    assert tracker.is_valid and worst < tracker.gate
+    tracker.update(*detections(rng, t), t)
+    assert distance(tracker.left_leg, true_legs(t)[0]) < 5
+    t += dt
+
+    # gate：一个误检到 1m 以外，另一条腿没有检测到，误检不能拉走任何一条腿
+    before = tracker.get_legs(t)
+    tracker.update(true_legs(t)[0] + np.array([100.0, 0.0]), far, t)
+    assert distance(tracker.left_leg, before[0]) < 1e-9 and distance(tracker.right_leg, before[1]) < 1e-9
+    t += dt
+
+    # 左右标反：仍按位置关联到原来的腿
+    left, right = detections(rng, t)
+    tracker.update(right, left, t)
+    assert distance(tracker.left_leg, true_legs(t)[0]) < 5 and distance(tracker.right_leg, true_legs(t)[1]) < 5
+    t += dt
+    # 只有一个检测且靠近右腿：更新右腿
+    left, right = detections(rng, t)
+    tracker.update(right, far, t)
+    assert distance(tracker.right_leg, right) < 3 and distance(tracker.left_leg, true_legs(t)[0]) < 10
+    t += dt
+
+    # 外推按发布时的 scan 时间
+    scan_time = t - dt
+    legs = tracker.legs
+    extrapolated = tracker.get_legs(scan_time + 0.1)
+    assert legs[4] == scan_time
+    assert np.allclose(extrapolated[0], legs[0] + legs[2] * 0.1) and np.allclose(extrapolated[1], legs[1] + legs[3] * 0.1)
+
+    # 右腿丢失超过 max_dropout 后重置
+    lost_since = t
+    while t - lost_since <= tracker.max_dropout + dt:
+        tracker.update(detections(rng, t)[0], far, t)
+        t += dt
+    assert not tracker.is_valid and tracker.legs[4] is None
+    assert np.array_equal(tracker.left_leg, far) and np.array_equal(tracker.right_leg, far)
+    tracker.update(*detections(rng, t), t)
+    assert tracker.is_valid
+
+    # 每个 scan 的更新耗时
+    samples = 10000
+    times = t + dt * np.arange(1, samples + 1)
+    scans = [detections(rng, scan_time) for scan_time in times]
+    start = time.perf_counter()
+    for scan_time, (left, right) in zip(times, scans):
+        tracker.update(left, right, scan_time)
+    print("update: %.1f us per scan" % ((time.perf_counter() - start) / samples * 1e6))
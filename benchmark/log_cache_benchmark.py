@@ -0,0 +1,101 @@
+"""
+Utils/LogCache：第一次读取解析文本并写 .npy，之后直接 mmap
+比较 不用缓存、第一次（解析 + 写缓存）、文件没变、文件被 touch（重新计算 hash）的耗时
+文件内容改变、invalidate、超过 max_bytes 时缓存必须失效或被删除，cache_dir 中不是缓存的 .npy 不能被删除
+命中时不重写 index.json，save() 后才保存
+"""
+import os, sys
+import time
+import tempfile
+import numpy as np
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Utils import LogLoader
+from Utils import LogCache
+
+"""(name, frames, columns)"""
+logs = [("ir_data.txt", 20000, 769), ("IMU.txt", 100000, 10), ("driver.txt", 100000, 10), ("leg.txt", 20000, 5)]
+
+
+def write_log(path, frames, columns, rng):
+    data = np.round(rng.normal(25, 5, (frames, columns)), 2)
+    data[:, 0] = 1.6e9 + np.arange(frames) * 0.1
+    with open(path, "w") as f:
+        for row in data.tolist():
+            f.write(str(row) + "\n")
+    return data
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    directory = tempfile.mkdtemp()
+    cache = LogCache.LogCache(os.path.join(directory, "cache"))
+    # cache_dir 中其他的 .npy
+    other_npy = os.path.join(cache.cache_dir, "other.npy")
+    np.save(other_npy, np.arange(3))
+    paths = []
+    print("%-12s %10s %10s %10s %10s" % ("log", "parse s", "first s", "cached ms", "touched ms"))
+    for name, frames, columns in logs:
+        path = os.path.join(directory, name)
+        data = write_log(path, frames, columns, rng)
+        paths.append(path)
+        parsed, time_parse = timed(LogLoader.load_log, path)
+        first, time_first = timed(cache.load, path)
+        cached, time_cached = timed(cache.load, path)
+        os.utime(path, None)
+        touched, time_touched = timed(cache.load, path)
+        assert isinstance(cached, np.memmap) and not cached.flags.writeable
+        assert np.array_equal(parsed, data) and np.array_equal(first, data)
+        assert np.array_equal(cached, data) and np.array_equal(touched, data)
+        print("%-12s %10.2f %10.2f %10.2f %10.2f" % (name, time_parse, time_first, time_cached * 1e3,
+                                                     time_touched * 1e3))
+    assert cache.misses == len(logs) and cache.hits == 2 * len(logs)
+
+    # 命中时只标记 dirty，save() 时才写 index.json
+    index_mtime = os.stat(cache.index_path).st_mtime_ns
+    cache.load(paths[0])
+    assert cache.dirty and os.stat(cache.index_path).st_mtime_ns == index_mtime
+    cache.save()
+    assert not cache.dirty and LogCache.LogCache(cache.cache_dir).entries == cache.entries
+
+    # 内容改变后重新解析
+    with open(paths[-1], "a") as f:
+        f.write(str([2e9] + [1.0] * 4) + "\n")
+    old_npy = cache.entries[cache._key(paths[-1], {})]["npy"]
+    changed = cache.load(paths[-1])
+    assert changed.shape[0] == logs[-1][1] + 1 and cache.misses == len(logs) + 1
+    assert not os.path.exists(os.path.join(cache.cache_dir, old_npy))
+
+    # 不同的 loader 参数分开缓存
+    as_float32 = cache.load(paths[1], dtype=np.float32)
+    assert as_float32.dtype == np.float32 and cache.load(paths[1]).dtype == np.float64
+
+    cache.invalidate(paths[1])
+    assert all(entry["path"] != os.path.abspath(paths[1]) for entry in cache.entries.values())
+    cache.load(paths[1])
+
+    # 只能放下最近用过的一个 ir_data
+    cache.max_bytes = cache.entries[cache._key(paths[0], {})]["bytes"] + 1
+    cache.load(paths[0])
+    cache.evict()
+    assert [entry["path"] for entry in cache.entries.values()] == [os.path.abspath(paths[0])]
+    assert sorted(name for name in os.listdir(cache.cache_dir) if name.endswith(".npy")) == \
+        sorted([cache.entries[cache._key(paths[0], {})]["npy"], "other.npy"])
+
+    cache.invalidate()
+    assert not cache.entries and sorted(os.listdir(cache.cache_dir)) == ["index.json", "other.npy"]
+    cache.load(paths[0])
+
+    # 重新打开 index 仍然有效
+    reopened = LogCache.LogCache(cache.cache_dir)
+    reopened.load(paths[0])
+    assert reopened.hits == 1 and reopened.misses == 0
+    print(reopened.get_counters())
@@ -0,0 +1,106 @@
+"""
+文本记录的读取：原先的 get_data（np.array(字符串) 后逐个 float）与 Utils/LogLoader.load_log
+合成 100k 帧的 driver.txt（10 列）和 ir_data.txt（769 列），格式与 str(list) 相同
+原先的方法太慢，只在前 old_lines 行上计时，按行数换算；两种方法读出的数据必须相同
+最后一行不完整（程序中断）时 skip_bad=True 丢弃该行
+"""
+import os, sys
+import time
+import tempfile
+import tracemalloc
+import numpy as np
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Utils import LogLoader
+
+num_frames = 100000
+old_lines = 2000
+
+
+def get_data(direction):
+    """原先 data/combine_data_*.py 中的 get_data"""
+    file = open(direction)
+    list_ir_data = file.readlines()
+    lists = []
+    for lines in list_ir_data:
+        lines = lines.strip("\n")
+        lines = lines.strip('[')
+        lines = lines.strip(']')
+        lines = lines.split(", ")
+        lists.append(lines)
+    file.close()
+    array_data = np.array(lists)
+    rows_data = array_data.shape[0]
+    columns_data = array_data.shape[1]
+    data = np.zeros((rows_data, columns_data))
+    for i in range(rows_data):
+        for j in range(columns_data):
+            data[i][j] = float(array_data[i][j])
+    return data
+
+
+def write_log(path, rows):
+    with open(path, "w") as f:
+        for row in rows:
+            f.write(str(row) + "\n")
+
+
+def make_rows(rng, columns):
+    timestamps = 1.6e9 + np.cumsum(rng.uniform(0.05, 0.15, num_frames))
+    if columns == 769:
+        values = np.round(rng.uniform(20, 36, (num_frames, 768)), 2)
+    else:
+        values = rng.normal(0, 1, (num_frames, columns - 1))
+    for t, row in zip(timestamps.tolist(), values.tolist()):
+        yield [t] + row
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    directory = tempfile.mkdtemp()
+    print("%d frames" % num_frames)
+    print("%-10s %10s %12s %12s %10s %12s" % ("log", "MB", "get_data s", "load_log s", "speedup", "peak MB"))
+    for name, columns in (("driver", 10), ("ir_data", 769)):
+        path = os.path.join(directory, name + ".txt")
+        write_log(path, make_rows(rng, columns))
+        head_path = os.path.join(directory, name + "_head.txt")
+        with open(path) as f, open(head_path, "w") as head:
+            for i, line in zip(range(old_lines), f):
+                head.write(line)
+
+        start = time.perf_counter()
+        old = get_data(head_path)
+        time_old = (time.perf_counter() - start) * num_frames / old_lines
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        new = LogLoader.load_log(path)
+        time_new = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        assert new.shape == (num_frames, columns)
+        assert np.array_equal(new[:old_lines], old)
+        size = os.path.getsize(path)
+        print("%-10s %10.1f %12.1f %12.2f %10.0f %12.1f" % (name, size / 1e6, time_old, time_new,
+                                                          time_old / time_new, peak / 1e6))
+        # 结果数组之外只多用一块文本的内存
+        assert peak < new.nbytes + 8 * (1 << 22)
+
+        # 中断时最后一行不完整，可能断在一个数的中间（"2.5e" 不是数）
+        complete = os.path.getsize(path)
+        for tail in ("[1.0, 2.0", "[1.0, 2.5e", "[1.0, 2.5e-"):
+            with open(path, "a") as f:
+                f.write(tail)
+            try:
+                LogLoader.load_log(path)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError("incomplete line not detected")
+            assert np.array_equal(LogLoader.load_log(path, skip_bad=True), new)
+            with open(path, "r+") as f:
+                f.truncate(complete)
+        os.remove(path)
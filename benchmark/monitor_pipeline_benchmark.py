@@ -0,0 +1,127 @@
+"""
+驱动器监控信息的读取速度，使用 Driver/SimulatedServoDriver.py 模拟的左右驱动器
+逐个请求: DualWheelTransport.monitor()，每次等回复读完才发下一个请求
+流水线: PipelinedMonitor.poll()，每个串口保持 depth 个未回复的请求
+两种方式解码出的 encoder 位置都必须随电机转动单调增加
+
+丢字节、丢回复时电机匀速转动，比较接受的每个回复的位置与请求时间对应的位置：
+错位的回复（丢字节）校验不通过，一个都不能被接受；
+整个回复丢失后，之后的回复会对应到前一个请求的时间（位置差约一个周期），
+这样的回复在窗口确认时被发现并整个窗口丢弃，也一个都不能被接受
+"""
+import os, sys
+import time
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Driver import DriverTransport as DT
+from Driver import DriverMonitor as DM
+from Driver import SimulatedServoDriver as SSD
+
+duration = 2.0
+"""(name, latency, loss)"""
+scenarios = [
+    ("latency 1ms", 0.001, 0.0),
+    ("latency 5ms", 0.005, 0.0),
+    ("latency 10ms", 0.010, 0.0),
+    ("latency 5ms, loss 1%", 0.005, 0.01),
+]
+depths = [0, 2, 3]
+"""(name, byte_loss, loss)"""
+faults = [
+    ("byte loss 0.1%", 0.001, 0.0),
+    ("reply loss 2%", 0.0, 0.02),
+    ("both", 0.001, 0.02),
+]
+
+
+def make_transport(latency, loss, byte_loss=0.0):
+    ports = [SSD.SimulatedSerial(latency=latency, seed=seed) for seed in (0, 1)]
+    transport = DT.DualWheelTransport(*ports)
+    transport.command(DT.START, DT.START)
+    transport.command(DT.rpm_frame(60), DT.rpm_frame(60))
+    for port in ports:
+        port.loss = loss
+        port.byte_loss = byte_loss
+    return transport
+
+
+def run(latency, loss, depth):
+    """:return: (samples per second, timeouts)"""
+    transport = make_transport(latency, loss)
+    monitor = DM.DriverMonitor()
+    if depth:
+        pipeline = transport.enable_pipeline(depth)
+        read = lambda: pipeline.poll()[0]
+    else:
+        read = lambda: transport.monitor()[0]
+    samples = 0
+    errors = 0
+    previous = -1
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        try:
+            position = monitor.processData(read())['FeedbackPosition']
+        except IndexError:
+            errors += 1
+            if not depth:
+                transport.reset_input_buffer()
+            continue
+        assert position >= previous, (position, previous)
+        previous = position
+        samples += 1
+    transport.close()
+    return samples / duration, errors
+
+
+def run_faults(byte_loss, loss, depth=3):
+    """:return: (samples, errors, accepted replies off by a cycle or more, largest error (ticks), lost bytes, lost replies, pipeline)"""
+    transport = make_transport(0.005, loss, byte_loss)
+    # 等电机到达匀速
+    time.sleep(0.5)
+    pipeline = transport.enable_pipeline(depth)
+    monitor = DM.DriverMonitor()
+    # rpm_frame(60) 的转速不是正好 60rpm
+    ticks_per_second = transport.left.ser.driver.target_rpm / 60 * SSD.TICKS_PER_REVOLUTION
+    offsets = []
+    errors = 0
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        try:
+            reply_l, reply_r, request_time = pipeline.poll()
+        except IndexError:
+            errors += 1
+            continue
+        for reply in (reply_l, reply_r):
+            offsets.append(monitor.processData(reply)['FeedbackPosition'] - ticks_per_second * request_time)
+    transport.close()
+    median = sorted(offsets)[len(offsets) // 2]
+    shifted = sum(abs(offset - median) >= 10 for offset in offsets)
+    worst = max(abs(offset - median) for offset in offsets)
+    lost_bytes = transport.left.ser.lost_bytes + transport.right.ser.lost_bytes
+    lost = transport.left.ser.lost + transport.right.ser.lost
+    return len(offsets) // 2, errors, shifted, worst, lost_bytes, lost, pipeline
+
+if __name__ == "__main__":
+    print("samples/s (errors) of %.1f s" % duration)
+    print("%-22s%s" % ("scenario", "".join("%16s" % ("depth %d" % depth) for depth in depths)))
+    for name, latency, loss in scenarios:
+        results = [run(latency, loss, depth) for depth in depths]
+        print("%-22s%s" % (name, "".join("%9.1f (%3d)" % result for result in results)))
+        if loss == 0:
+            # 流水线至少不比逐个请求慢
+            assert results[1][0] > results[0][0]
+
+    print("\ndepth 3 with faults, accepted replies off by a cycle (about 25 ticks) or more")
+    print("%-18s%10s%8s%10s%10s%12s%12s%10s%14s" % ("fault", "samples", "errors", "shifted", "max err",
+                                                     "lost bytes", "lost reply", "dropped", "age p50 (ms)"))
+    for name, byte_loss, loss in faults:
+        samples, errors, shifted, worst, lost_bytes, lost, pipeline = run_faults(byte_loss, loss)
+        print("%-18s%10d%8d%10d%10.1f%12d%12d%10d%14.1f" % (name, samples, errors, shifted, worst, lost_bytes, lost,
+                                                           pipeline.dropped, pipeline.latency.summary()["p50"] * 1e3))
+        assert lost_bytes + lost > 0 and pipeline.resyncs > 0
+        if not loss:
+            assert pipeline.misframed > 0, pipeline.get_counters()
+        # 错位或对应到其它请求时间的回复都没有被接受
+        assert shifted == 0, pipeline.get_counters()
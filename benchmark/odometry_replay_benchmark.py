@@ -0,0 +1,63 @@
+"""
+Odometry.updatePose 逐个样本计算 与 OdometryReplay.replay 整段向量化计算 的耗时
+模拟的 encoder 数据包含直行、转弯、原地转向、静止和后退，两者每一步的结果必须一致
+"""
+import os, sys
+import time
+import numpy as np
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Driver import Odometry
+from Driver import OdometryReplay
+
+sample_sizes = [1000, 10000, 100000]
+"""(left ticks per sample, right ticks per sample)"""
+motions = [(20, 20), (25, 15), (15, 25), (-20, -20), (-25, -15), (-15, -25), (12, -12), (-12, 12), (0, 0), (0, 8)]
+
+
+def make_ticks(num: int, rng):
+    """每段随机选一种运动，时间间隔约 8ms，带随机的抖动和偶尔重复的时间戳"""
+    steps = np.zeros((num, 2))
+    start = 0
+    while start < num:
+        length = int(rng.integers(20, 200))
+        steps[start:start + length] = motions[rng.integers(len(motions))]
+        start += length
+    steps += rng.integers(-2, 3, steps.shape) * (steps != 0)
+    ticks = 50000 + np.cumsum(steps, axis=0)
+    dt = rng.normal(0.008, 0.002, num).clip(0, None)
+    dt[rng.random(num) < 0.01] = 0
+    timestamps = 1.6e9 + np.cumsum(dt)
+    return timestamps, ticks[:, 0], ticks[:, 1]
+
+
+def legacy_replay(timestamps, odo_l, odo_r):
+    odo = Odometry.Odometry()
+    odo._previous_time = timestamps[0]
+    result = np.zeros((len(timestamps), 12))
+    for i, (t, l, r) in enumerate(zip(timestamps.tolist(), odo_l.tolist(), odo_r.tolist())):
+        pose = odo.updatePose(l, r, timestamp=t)
+        result[i, :9] = pose
+        result[i, 9:] = odo.V, odo.OMEGA, odo.Radius
+    return result
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    keys = ["X", "Y", "THETA", "d_l", "d_r", "dX", "dY", "dx", "dy", "V", "OMEGA", "Radius"]
+    for num in sample_sizes:
+        timestamps, odo_l, odo_r = make_ticks(num, rng)
+
+        start = time.perf_counter()
+        legacy = legacy_replay(timestamps, odo_l, odo_r)
+        time_legacy = time.perf_counter() - start
+        start = time.perf_counter()
+        result = OdometryReplay.replay(timestamps, odo_l, odo_r)
+        time_new = time.perf_counter() - start
+
+        error = max(np.max(np.abs(result[key] - legacy[:, k])) for k, key in enumerate(keys))
+        assert error < 1e-9, error
+        print("%6d samples: updatePose %9.2f ms, replay %7.2f ms (x%.0f), max difference %.1e" %
+              (num, time_legacy * 1e3, time_new * 1e3, time_legacy / time_new, error))
@@ -0,0 +1,83 @@
+"""
+PoseFusion.YawFusion 的航向误差，使用模拟的行走：速度 0.5m/s，左右来回转弯
+里程计：左轮在部分路段打滑（测得的位移比实际大），d_theta 积分的航向误差不断累积
+陀螺仪：w[2] 带 0.2deg/s 的零偏和噪声，积分的航向线性漂移
+IMU 航向 Angle[2]：不漂移，但每个样本带 2deg 的噪声
+融合后的航向误差必须小于只用里程计、只用陀螺仪积分的误差
+"""
+import os, sys
+import math
+import numpy as np
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Driver import PoseFusion
+
+duration = 120.0
+imu_rate = 100
+odometry_rate = 50
+wheel_base = 0.54  # Odometry._wheel_base
+speed = 0.5
+gyro_bias = 0.2  # deg/s
+gyro_noise = 0.2  # deg/s
+angle_noise = 2.0  # deg
+slip = 0.02  # 打滑时左轮多测的比例
+
+
+def true_motion(t):
+    """:return: (yaw, omega) rad, rad/s"""
+    omega = 0.3 * np.sin(2 * math.pi * t / 20)
+    yaw = 0.3 * 20 / (2 * math.pi) * (1 - np.cos(2 * math.pi * t / 20))
+    return yaw, omega
+
+
+def wrap(angle):
+    return (angle + np.pi) % (2 * np.pi) - np.pi
+
+
+def simulate(rng):
+    """:return: (encoder times, true yaw, odometry yaw, gyro yaw, fused yaw) at every encoder poll"""
+    imu_times = np.arange(0, duration, 1 / imu_rate)
+    odometry_times = np.arange(0, duration, 1 / odometry_rate) + 0.3 / imu_rate
+    imu_yaw, imu_omega = true_motion(imu_times)
+    gyro = np.degrees(imu_omega) + gyro_bias + rng.normal(0, gyro_noise, imu_times.shape)
+    angle = np.degrees(wrap(imu_yaw)) + rng.normal(0, angle_noise, imu_times.shape)
+
+    # 两次读取之间的实际位移，左轮在每 30s 中的前 10s 打滑
+    yaw, _ = true_motion(odometry_times)
+    d_theta_true = np.diff(yaw, prepend=0.0)
+    d_center = np.full(odometry_times.shape, speed / odometry_rate)
+    d_l = d_center - d_theta_true * wheel_base / 2
+    d_r = d_center + d_theta_true * wheel_base / 2
+    d_l = d_l * np.where(odometry_times % 30 < 10, 1 + slip, 1.0)
+    d_theta = (d_r - d_l) / wheel_base
+
+    fusion = PoseFusion.YawFusion()
+    fused = np.empty(odometry_times.shape)
+    i = 0
+    for k, timestamp in enumerate(odometry_times):
+        while i < imu_times.shape[0] and imu_times[i] <= timestamp:
+            fusion.imu_listener(imu_times[i], (0.0, 0.0, 1.0), (0.0, 0.0, gyro[i]), (0.0, 0.0, angle[i]))
+            i += 1
+        fusion.update_odometry(timestamp, d_l[k], d_r[k], d_theta[k])
+        fused[k] = fusion.latest_pose[3]
+
+    odometry_yaw = np.cumsum(d_theta)
+    gyro_yaw = np.interp(odometry_times, imu_times, np.cumsum(np.radians(gyro)) / imu_rate)
+    return odometry_times, yaw, odometry_yaw, gyro_yaw, fused
+
+
+if __name__ == "__main__":
+    times, yaw, odometry_yaw, gyro_yaw, fused = simulate(np.random.default_rng(0))
+    print("%.0f s walk, yaw error (deg)" % duration)
+    print("%-16s%10s%10s%10s" % ("source", "rms", "max", "final"))
+    errors = {}
+    for name, estimate in (("odometry", odometry_yaw), ("gyro", gyro_yaw), ("fusion", fused)):
+        error = np.degrees(np.abs(wrap(estimate - yaw)))
+        errors[name] = np.sqrt(np.mean(error ** 2))
+        print("%-16s%10.2f%10.2f%10.2f" % (name, errors[name], error.max(), error[-1]))
+
+    assert errors["fusion"] < errors["odometry"] and errors["fusion"] < errors["gyro"]
+    # 零偏的稳态误差约为 gyro_bias * time_constant，加上 IMU 航向的噪声
+    assert errors["fusion"] < 3.0
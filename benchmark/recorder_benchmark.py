@@ -0,0 +1,76 @@
+"""
+传感器记录：原先每个样本 str(list) + "\n" 写入文本并 flush 与 Utils/BinaryRecorder
+比较每个样本的耗时和文件大小，读回的数据必须与写入的相同（IR 温度以 float32 保存）
+"""
+import os, sys
+import time
+import tempfile
+import numpy as np
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Utils import BinaryRecorder
+
+num_samples = 2000
+
+
+def make_streams(rng):
+    """(name, fields, samples)，每个样本为 (timestamp, values...)"""
+    timestamps = 1.6e9 + np.cumsum(rng.uniform(0.005, 0.015, num_samples))
+    ir = np.round(rng.uniform(20, 36, (num_samples, 24, 32)) * 100) / 100
+    imu = rng.normal(0, 1, (num_samples, 3, 3))
+    skin = rng.integers(-5, 250, (num_samples, 32))
+    driver = rng.normal(0, 1, (num_samples, 9))
+    return [
+        ("IR camera", [("temperature", "<f4", (24, 32))],
+         [(t, frame) for t, frame in zip(timestamps, ir)]),
+        ("IMU", [("a", "<f8", (3,)), ("w", "<f8", (3,)), ("Angle", "<f8", (3,))],
+         [(t, a, w, angle) for t, (a, w, angle) in zip(timestamps, imu)]),
+        ("soft skin", [("pressure", "<i2", (32,))],
+         [(t, pressure) for t, pressure in zip(timestamps, skin)]),
+        ("driver", [("p%d" % i, "<f8") for i in range(9)],
+         [(t,) + tuple(pose) for t, pose in zip(timestamps, driver.tolist())]),
+    ]
+
+
+def write_text(path, samples):
+    """原先的写法：每个样本拼成 list 转成字符串，写入后 flush"""
+    with open(path, "w") as f:
+        for sample in samples:
+            row = [sample[0]]
+            for value in sample[1:]:
+                row += np.asarray(value).ravel().tolist()
+            f.write(str(row) + "\n")
+            f.flush()
+
+
+def write_binary(path, fields, samples):
+    with BinaryRecorder.BinaryRecorder(path, fields) as recorder:
+        for sample in samples:
+            recorder.append(*sample)
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    directory = tempfile.mkdtemp()
+    print("%-10s %14s %14s %14s %14s" % ("stream", "text us", "binary us", "text bytes", "binary bytes"))
+    for name, fields, samples in make_streams(rng):
+        text_path = os.path.join(directory, "stream.txt")
+        binary_path = os.path.join(directory, "stream.rec")
+        start = time.perf_counter()
+        write_text(text_path, samples)
+        time_text = (time.perf_counter() - start) / num_samples
+        start = time.perf_counter()
+        write_binary(binary_path, fields, samples)
+        time_binary = (time.perf_counter() - start) / num_samples
+
+        header, records = BinaryRecorder.load_record(binary_path)
+        rows = BinaryRecorder.to_rows(records)
+        expected = np.array([np.concatenate([np.asarray(value, dtype=np.float64).ravel() for value in sample])
+                             for sample in samples])
+        assert rows.shape == expected.shape
+        assert np.allclose(rows, expected, rtol=1e-6, atol=0)
+        size_text = os.path.getsize(text_path) / num_samples
+        size_binary = os.path.getsize(binary_path) / num_samples
+        print("%-10s %14.1f %14.1f %14.0f %14.0f" % (name, time_text * 1e6, time_binary * 1e6, size_text, size_binary))
@@ -0,0 +1,90 @@
+"""
+Leg_detector.scan_procedure 的退出，使用模拟的 RPLidar，不需要连接雷达
+stop()、读取线程异常 两种情况下都要：读取线程先退出 iter_scans，之后才停止电机、断开雷达；
+读取线程的异常在 scan_procedure 中抛出；处理不过来时只处理最新的 scan
+"""
+import os, sys
+import threading
+import time
+import numpy as np
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Preprocessing import Leg_detector
+
+
+class FakeLidar(object):
+    """RPLidar 的替代，每 period 秒给出一个 scan，给出 fail_after 个 scan 后抛出异常"""
+
+    def __init__(self, period: float = 0.01, fail_after: int = None):
+        self.period = period
+        self.fail_after = fail_after
+        self.reading = False
+        self.calls = []
+
+    def get_info(self):
+        return {}
+
+    def get_health(self):
+        return ("Good", 0)
+
+    def iter_scans(self, max_buf_meas=500):
+        rng = np.random.default_rng(0)
+        count = 0
+        self.reading = True
+        try:
+            while True:
+                time.sleep(self.period)
+                if self.fail_after is not None and count >= self.fail_after:
+                    raise IOError("Wrong body size")
+                angles = np.sort(rng.uniform(0, 360, 360))
+                yield [(15, angle, distance) for angle, distance in zip(angles, rng.uniform(300, 3000, 360))]
+                count += 1
+        finally:
+            self.reading = False
+
+    def _call(self, name):
+        # 读取线程还在 iter_scans 中时不能操作雷达
+        assert not self.reading, name
+        self.calls.append(name)
+
+    def stop(self):
+        self._call("stop")
+
+    def stop_motor(self):
+        self._call("stop_motor")
+
+    def disconnect(self):
+        self._call("disconnect")
+
+
+def make_detector(lidar):
+    detector = Leg_detector.Leg_detector(portal=None)
+    detector.rplidar = lidar
+    return detector
+
+
+if __name__ == "__main__":
+    # 另一个线程 stop()
+    lidar = FakeLidar()
+    detector = make_detector(lidar)
+    threading.Timer(0.5, detector.stop).start()
+    start = time.perf_counter()
+    detector.scan_procedure()
+    counters = detector.pipeline.get_counters()
+    print("stop(): returned after %.2f s, %s" % (time.perf_counter() - start, counters))
+    assert lidar.calls == ["stop", "stop_motor", "disconnect"]
+    assert counters["processed"] > 0 and not detector.pipeline.reader_thread.is_alive()
+
+    # 读取线程异常：先处理完之前的 scan，异常在这里抛出，雷达仍然停止
+    lidar = FakeLidar(fail_after=5)
+    detector = make_detector(lidar)
+    try:
+        detector.scan_procedure()
+    except IOError as e:
+        print("reader error: %r, %s" % (e, detector.pipeline.get_counters()))
+    else:
+        raise AssertionError("the reader exception was not raised")
+    assert lidar.calls == ["stop", "stop_motor", "disconnect"]
+    assert detector.pipeline.received == 5
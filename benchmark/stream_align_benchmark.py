@@ -0,0 +1,117 @@
+"""
+多个记录对齐到 ir_data 的时间戳：
+原先: combine_data_from_two_dataset + select_data 两两合并三次，每次重新分配整个合并数组
+StreamAlign.align: 每个记录一次 searchsorted，写入一次分配的输出
+nearest/previous 与逐个 argmin 的结果比较，linear 与 np.interp 比较；
+原先的 select_data 取的是最近样本之后的样本（最后一个样本除外）
+"""
+import os, sys
+import time
+import numpy as np
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Utils import StreamAlign
+
+duration = 3000.0
+"""(name, rate Hz, columns)"""
+rates = [("ir_data", 8, 769), ("IMU", 100, 10), ("leg", 10, 5), ("driver", 50, 10)]
+
+
+def select_data(ir_data, target_data):
+    """原先 data/combine_data_*.py 中的 select_data"""
+    remain_data = np.zeros((ir_data.shape[0],target_data.shape[1]-1))
+    j = 0
+    for i in range(ir_data.shape[0]):
+        time_error = 100
+        while abs(ir_data[i,0] - target_data[j,0]) < time_error:
+            time_error = abs(ir_data[i,0] - target_data[j,0])
+            j += 1
+            if j >= target_data.shape[0]:
+                j -= 1
+                break
+        remain_data[i, :] = target_data[j,1:target_data.shape[1]]
+    return remain_data
+
+
+def combine_data_from_two_dataset(data1,data2):
+    row_1, col_1 = data1.shape
+    row_2, col_2 = data2.shape
+    data_combine = np.zeros((row_1,col_1+col_2-1))
+    data_combine[:,0:col_1] = data1
+    data_combine[:,col_1:col_1+col_2-1] = select_data(data1,data2)
+    return data_combine
+
+
+def make_stream(rng, rate, columns):
+    times = 1.6e9 + np.cumsum(rng.uniform(0.5, 1.5, int(duration * rate)) / rate)
+    stream = rng.normal(0, 1, (times.shape[0], columns))
+    stream[:, 0] = times
+    return stream
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    streams = [make_stream(rng, rate, columns) for name, rate, columns in rates]
+    ir_data = streams[0]
+    reference = ir_data[:, 0]
+    print("%.0f s session, %s" % (duration, ", ".join("%s %d" % (name, len(s)) for (name, _, _), s in zip(rates, streams))))
+
+    start = time.perf_counter()
+    data_combine = ir_data
+    for stream in streams[1:]:
+        data_combine = combine_data_from_two_dataset(data_combine, stream)
+    time_old = time.perf_counter() - start
+
+    out = np.empty((reference.shape[0], 1 + sum(s.shape[1] - 1 for s in streams)))
+    start = time.perf_counter()
+    aligned, valid = StreamAlign.align(reference, streams, mode="nearest", out=out)
+    time_new = time.perf_counter() - start
+    assert aligned is out and valid.all()
+    print("pairwise select_data %.3f s, align %.3f s, %.0fx" % (time_old, time_new, time_old / time_new))
+
+    columns = StreamAlign.output_columns(streams)
+    later = checked = 0
+    assert np.array_equal(aligned[:, columns[0][0]:columns[0][1]], ir_data[:, 1:])
+    for stream, (first, last) in zip(streams[1:], columns[1:]):
+        times = stream[:, 0]
+        for i in rng.integers(0, reference.shape[0], 200):
+            nearest = np.argmin(np.abs(times - reference[i]))
+            assert np.array_equal(aligned[i, first:last], stream[nearest, 1:])
+            # 原先的结果总是在最近样本之后（没有更后的样本时除外）
+            old_index = np.nonzero(stream[:, 1] == data_combine[i, first])[0][0]
+            assert old_index >= min(nearest + 1, len(times) - 1)
+            later += old_index > nearest
+            checked += 1
+
+    print("select_data picked a sample after the nearest one in %d of %d checked rows" % (later, checked))
+
+    # float32 的记录（load_log(dtype=np.float32)）与 float64 的结果相同
+    as_float32 = [stream.astype(np.float32) for stream in streams[1:]]
+    for mode in StreamAlign.MODES:
+        aligned32, valid32 = StreamAlign.align(reference, as_float32, mode=mode)
+        expected, _ = StreamAlign.align(reference, [s.astype(np.float64) for s in as_float32], mode=mode)
+        assert valid32.all() and np.array_equal(aligned32, expected)
+
+    # previous 与 linear
+    imu = streams[1]
+    previous, valid = StreamAlign.align(reference, [imu], mode="previous")
+    linear, _ = StreamAlign.align(reference, [imu], mode="linear")
+    for i in rng.integers(0, reference.shape[0], 200):
+        before = np.searchsorted(imu[:, 0], reference[i], side="right") - 1
+        assert (before >= 0) == valid[i, 0]
+        if before >= 0:
+            assert np.array_equal(previous[i, 1:], imu[before, 1:])
+    for column in range(1, imu.shape[1]):
+        assert np.allclose(linear[:, column], np.interp(reference, imu[:, 0], imu[:, column]))
+
+    # 记录中间断了 5 s，超过 max_staleness 的行无效
+    gap = (imu[:, 0] < reference[1000]) | (imu[:, 0] > reference[1000] + 5)
+    aligned, valid = StreamAlign.align(reference, [imu[gap]], mode="previous", max_staleness=0.1)
+    inside = (reference > reference[1000] + 0.1) & (reference < reference[1000] + 5)
+    assert inside.sum() > 30 and not valid[inside, 0].any() and np.isnan(aligned[inside, 1:]).all()
+    kept = imu[gap, 0]
+    before = np.searchsorted(kept, reference, side="right") - 1
+    expected = (before >= 0) & (reference - kept[np.maximum(before, 0)] <= 0.1)
+    assert np.array_equal(valid[:, 0], expected)
@@ -0,0 +1,77 @@
+"""
+ControlDriver 轨迹记录：原先的 plot_x / plot_y 列表 与 TrajectoryStore
+append: 每个里程计样本一次，原先 math.sqrt 与最后一个点比较后追加到列表
+nearest: 网格索引 与 对所有点逐个计算距离，结果必须相同
+环形缓冲区写满以后点数不再增加
+"""
+import os, sys
+import math
+import time
+import numpy as np
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Driver import TrajectoryStore
+
+num_samples = 1000000
+store_size = 10000
+
+
+def make_walk(num: int, rng):
+    """约 1cm 一步的随机行走"""
+    heading = np.cumsum(rng.normal(0, 0.05, num))
+    x = np.cumsum(-0.01 * np.sin(heading))
+    y = np.cumsum(0.01 * np.cos(heading))
+    return np.arange(num) * 0.008, x, y
+
+
+def legacy_append(timestamps, xs, ys):
+    plot_x = [0.0]
+    plot_y = [0.0]
+    for x, y in zip(xs, ys):
+        if math.sqrt((x - plot_x[-1]) ** 2 + (y - plot_y[-1]) ** 2) > 0.1:
+            plot_x.append(x)
+            plot_y.append(y)
+    return plot_x, plot_y
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    timestamps, xs, ys = make_walk(num_samples, rng)
+    timestamps, xs, ys = timestamps.tolist(), xs.tolist(), ys.tolist()
+
+    start = time.perf_counter()
+    plot_x, plot_y = legacy_append(timestamps, xs, ys)
+    time_legacy = time.perf_counter() - start
+
+    store = TrajectoryStore.TrajectoryStore(size=store_size, min_distance=0.1)
+    store.append(0.0, 0.0, 0.0)
+    start = time.perf_counter()
+    for t, x, y in zip(timestamps, xs, ys):
+        store.append(t, x, y)
+    time_new = time.perf_counter() - start
+
+    # 同样的抽取规则，保存的点相同，只是只保留最近的 store_size 个
+    assert store.count == len(plot_x)
+    assert store.plot_x == plot_x[-store_size:] and store.plot_y == plot_y[-store_size:]
+    assert len(store) == store_size and sum(len(slots) for slots in store.grid.values()) == store_size
+    print("append %d samples: lists %.1f ms (%d points kept), TrajectoryStore %.1f ms (%d of %d points kept)" %
+          (num_samples, time_legacy * 1e3, len(plot_x), time_new * 1e3, len(store), store.count))
+
+    start = time.perf_counter()
+    for i in range(100):
+        array = store.to_array()
+    print("to_array %.1f us" % ((time.perf_counter() - start) / 100 * 1e6))
+
+    points = array[:, 1:]
+    queries = points[rng.integers(len(points), size=200)] + rng.normal(0, 1.0, (200, 2))
+    start = time.perf_counter()
+    brute = [np.min(np.hypot(*(points - q).T)) for q in queries]
+    time_brute = time.perf_counter() - start
+    start = time.perf_counter()
+    found = [store.nearest(*q)[3] for q in queries]
+    time_grid = time.perf_counter() - start
+    assert np.allclose(found, brute)
+    print("nearest: all points %.1f us, grid %.1f us" %
+          (time_brute / len(queries) * 1e6, time_grid / len(queries) * 1e6))
@@ -8,63 +8,20 @@ import cv2
 from Preprocessing import PositionalProcessing as cc
 import numpy as np
 from scipy import signal
+from Utils import LogCache
+from Utils import StreamAlign
 
-def get_data(direction):
-    # 原始信息获取
-    file = open(direction)
-    list_ir_data = file.readlines()
-    lists = []
-    for lines in list_ir_data:
-        lines = lines.strip("\n")
-        lines = lines.strip('[')
-        lines = lines.strip(']')
-        lines = lines.split(", ")
-        lists.append(lines)
-    file.close()
-    array_data = np.array(lists)
-    rows_data = array_data.shape[0]
-    columns_data = array_data.shape[1]
-    data = np.zeros((rows_data, columns_data))
-    for i in range(rows_data):
-        for j in range(columns_data):
-            data[i][j] = float(array_data[i][j])
-    return data
-
-"""load the data"""
-direction_ir_data = "./Record_data/data/ir_data.txt"
-ir_data = get_data(direction_ir_data)
+"""load the data, 以前的 .txt 记录没有 .rec 时也可以读取 (LogLoader.find_record)"""
+direction_ir_data = "./Record_data/data/ir_data.rec"
+ir_data = LogCache.load_cached(direction_ir_data)
 print(ir_data.shape)
 
-direction_driver = "./Record_data/data/driver.txt"
-driver_data = get_data(direction_driver)
+direction_driver = "./Record_data/data/Driver.rec"
+driver_data = LogCache.load_cached(direction_driver)
 print(driver_data.shape)
 
-"""以最低更新频率的irdata为基准，用时间帧对准其它数据"""
-def select_data(ir_data, target_data):
-    remain_data = np.zeros((ir_data.shape[0],target_data.shape[1]-1))
-    j = 0
-    for i in range(ir_data.shape[0]):
-        time_error = 100
-        while abs(ir_data[i,0] - target_data[j,0]) < time_error:
-            time_error = abs(ir_data[i,0] - target_data[j,0])
-            j += 1
-            if j >= target_data.shape[0]:
-                j -= 1
-                break
-            # print(time_error,i,j)
-        remain_data[i, :] = target_data[j,1:target_data.shape[1]]
-    return remain_data
-
-"""合并两个数据集"""
-def combine_data_from_two_dataset(data1,data2):
-    row_1, col_1 = data1.shape
-    row_2, col_2 = data2.shape
-    data_combine = np.zeros((row_1,col_1+col_2-1))
-    data_combine[:,0:col_1] = data1
-    data_combine[:,col_1:col_1+col_2-1] = select_data(data1,data2)
-    return data_combine
-
-data_combine = combine_data_from_two_dataset(ir_data,driver_data)
+"""以最低更新频率的irdata为基准，用时间帧对准其它数据（取时间最近的样本）"""
+data_combine, data_valid = StreamAlign.align(ir_data[:, 0], [ir_data, driver_data], mode="nearest")
 print(data_combine.shape)
 
 
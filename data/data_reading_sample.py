@@ -1,21 +1,11 @@
-import numpy as np
+import os, sys
+
+pwd = os.path.abspath(os.path.abspath(__file__))
+father_path = os.path.abspath(os.path.dirname(pwd) + os.path.sep + "..")
+sys.path.append(father_path)
+from Utils import LogLoader
+
 
 def get_data(file_path):
-    file = open(file_path)
-    list_ir_data = file.readlines()
-    lists = []
-    for lines in list_ir_data:
-        lines = lines.strip("\n")
-        lines = lines.strip('[')
-        lines = lines.strip(']')
-        lines = lines.split(", ")
-        lists.append(lines)
-    file.close()
-    array_data = np.array(lists)
-    rows_data = array_data.shape[0]
-    columns_data = array_data.shape[1]
-    data = np.zeros((rows_data, columns_data))
-    for i in range(rows_data):
-        for j in range(columns_data):
-            data[i][j] = float(array_data[i][j])
-    return data
\ No newline at end of file
+    """text record (one str(list) per line) or binary *.rec record -> (N, columns) array"""
+    return LogLoader.load_log(file_path)